@@ -10,3 +10,6 @@ from .rcv import tabulate
 from .with_json import tabulate as tabulate_with_json
 from .status import Status
 
+
+if sys.version_info >= (3, 7):
+  from .aio import tabulate_async, tabulate_with_json_async
@@ -0,0 +1,162 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Tabulate RCV contests from asyncio coroutines
+
+This module requires Python 3.7 or later.
+
+The CPU-bound work of a tabulation is run in an executor, so that the
+event loop is not blocked.  With a thread pool executor, or with the
+event loop's default executor, each round is run as a separate job, so
+a cancelled tabulation stops after the round in progress.  With a
+process pool executor, the whole tabulation is one job in a worker
+process; cancelling it before it starts prevents it, but once started,
+it runs to completion and its results are discarded.
+
+Files are read and written in the event loop's default executor.
+
+"""
+
+from sb1288 import rcv
+from sb1288 import with_json
+
+import asyncio
+import concurrent.futures
+import functools
+
+async def iter_rounds_async(nbr_seats_to_fill, candidates, ballots,
+      max_ranking_levels, tie_breaker, options={}, *, executor=None,
+      tabulation=None, **kwargs):
+  """
+  Tabulate, producing a summary of each round as it finishes
+
+  Arguments
+  ---------
+  The same as for rcv.Tabulation(), plus:
+
+  executor
+    A concurrent.futures executor that runs the validation and each
+    round.  A process pool executor is not supported here.  If None,
+    the event loop's default executor is used.
+    Default value: None
+
+  tabulation
+    If not None, a list to which the rcv.Tabulation object is appended
+    once the arguments are validated, so that its results can be
+    obtained after the last round.
+    Default value: None
+
+  Returns
+  -------
+  An asynchronous generator of rcv.RoundResult values.
+
+  Raises
+  ------
+  The same as rcv.Tabulation().iter_rounds().
+
+  """
+  loop = asyncio.get_running_loop()
+  this_tabulation = await loop.run_in_executor(executor,
+        functools.partial(rcv.Tabulation, nbr_seats_to_fill, candidates,
+        ballots, max_ranking_levels, tie_breaker, options, **kwargs))
+  if tabulation is not None:
+    tabulation.append(this_tabulation)
+  rounds = this_tabulation.iter_rounds()
+  while True:
+    round_result = await loop.run_in_executor(executor, next, rounds, None)
+    if round_result is None:
+      break
+    yield round_result
+
+async def tabulate_async(nbr_seats_to_fill, candidates, ballots,
+      max_ranking_levels, tie_breaker, options={}, *, executor=None,
+      **kwargs):
+  """
+  Tabulate an RCV contest without blocking the event loop
+
+  Arguments
+  ---------
+  The same as for rcv.tabulate(), plus:
+
+  executor
+    A concurrent.futures executor in which the tabulation is run.  If
+    None, the event loop's default executor is used.
+    Default value: None
+
+  Returns
+  -------
+  The same as rcv.tabulate().
+
+  Raises
+  ------
+  The same as rcv.tabulate(), plus asyncio.CancelledError if cancelled.
+
+  """
+  args = (nbr_seats_to_fill, candidates, ballots, max_ranking_levels,
+        tie_breaker, options)
+  loop = asyncio.get_running_loop()
+  if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+    return await loop.run_in_executor(executor,
+          functools.partial(rcv.tabulate, *args, **kwargs))
+  tabulation = []
+  async for round_result in iter_rounds_async(*args, executor=executor,
+        tabulation=tabulation, **kwargs):
+    pass
+  return (tabulation[0].elected(), tabulation[0].status,
+        tabulation[0].tallies)
+
+async def tabulate_with_json_async(input_json='', output_json='',
+      default_json=None, *, executor=None):
+  """
+  Tabulate an RCV contest using JSON files, without blocking the loop
+
+  Arguments
+  ---------
+  The same as for with_json.tabulate(), plus:
+
+  executor
+    As for tabulate_async().
+    Default value: None
+
+  Returns
+  -------
+  The same as with_json.tabulate().
+
+  Raises
+  ------
+  The same as with_json.tabulate(), plus asyncio.CancelledError if
+  cancelled.
+
+  """
+  loop = asyncio.get_running_loop()
+  tabulate_args, tabulation_spec = await loop.run_in_executor(None,
+        with_json.build_tabulate_args, input_json, default_json)
+  description = tabulation_spec.get('description')
+  if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+    elected, status, tally, json_str = await loop.run_in_executor(executor,
+          functools.partial(_tabulate_to_json, tabulate_args, description))
+  else:
+    tabulation = []
+    async for round_result in iter_rounds_async(*tabulate_args,
+          executor=executor, tabulation=tabulation):
+      pass
+    elected, status, tally = (tabulation[0].elected(), tabulation[0].status,
+          tabulation[0].tallies)
+    json_str = with_json.results_to_json(elected, status, tally,
+          description, tabulation[0].precinct_tally)
+  await loop.run_in_executor(None, with_json.write_file, output_json,
+        with_json.s2u(json_str))
+  return elected, status, tally, tabulation_spec
+
+def _tabulate_to_json(tabulate_args, description):
+  """
+  Tabulate in a worker process, with the JSON of the results
+
+  The JSON is made in the worker process, where the tabulation's
+  precinct_tally is available.
+
+  """
+  tabulation = rcv.Tabulation(*tabulate_args)
+  elected, status, tally = tabulation.tabulate()
+  return elected, status, tally, with_json.results_to_json(elected,
+        status, tally, description, tabulation.precinct_tally)
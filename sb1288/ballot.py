@@ -16,8 +16,10 @@ class Ballot(object):
   _rankings = tuple()
   _transfer_value = K.ONE
   _current_index = 0
+  _precinct = None
+  _ranking_depth = None
 
-  def __init__(self, multiple, rankings):
+  def __init__(self, multiple, rankings, precinct=None, ranking_depth=None):
     """
     Initialize an RCV tabulation ballot
 
@@ -37,10 +39,21 @@ class Ballot(object):
     rankings
       The candidate rankings for the ballot group.
 
+    precinct
+      The precinct or other batch key of the ballot group, or None.
+      Default value: None
+
+    ranking_depth
+      The number of rankings that are counted, or None if all rankings
+      are counted.  See set_ranking_depth().
+      Default value: None
+
     """
 
     self._multiple = multiple
     self._rankings = rankings
+    self._precinct = precinct
+    self._ranking_depth = ranking_depth
 
   def get_hrcc(self,
         continuing_candidates, max_ranking_levels):
@@ -68,9 +81,15 @@ class Ballot(object):
     continuing candidates is a subset of the collection given in any previous
     calls.
 
+    If the ballot group has a ranking depth, rankings after that depth
+    are not counted, and the ballot group is an abstention if fewer
+    candidates than the lesser of the ranking depth and
+    max_ranking_levels are ranked within that depth.
+
     """
 
-    for ix, ranking_code in enumerate(self._rankings[self._current_index:]):
+    for ix, ranking_code in enumerate(
+          self._rankings[self._current_index:self._ranking_depth]):
       if ranking_code == K.RANKING_CODE_OVERVOTE:
         self._current_index = ix
         return K.LABEL_OVERVOTES
@@ -79,14 +98,35 @@ class Ballot(object):
         return ranking_code
     else:
       self._current_index = len(self._rankings)
+      if self._ranking_depth is not None and (max_ranking_levels is None or
+            self._ranking_depth < max_ranking_levels):
+        max_ranking_levels = self._ranking_depth
       if max_ranking_levels > len(set(
-            [ranking_code for ranking_code in self._rankings
+            [ranking_code
+            for ranking_code in self._rankings[:self._ranking_depth]
             if ranking_code != K.RANKING_CODE_SKIPPED and
             ranking_code != K.RANKING_CODE_OVERVOTE])):
         return K.LABEL_ABSTENTIONS
       else:
         return K.LABEL_OTHER_EXHAUSTED
 
+  def peek_hrcc(self, continuing_candidates, max_ranking_levels):
+    """
+    Get the highest-ranked continuing candidate, without changing state
+
+    Unlike get_hrcc(), the rankings are searched from the first, so the
+    continuing candidates need not be a subset of those given in any
+    previous calls.  The arguments and return value are the same as for
+    get_hrcc().
+
+    """
+    saved_index = self._current_index
+    self._current_index = 0
+    try:
+      return self.get_hrcc(continuing_candidates, max_ranking_levels)
+    finally:
+      self._current_index = saved_index
+
   def total_votes(self):
     """Get the number of total votes for this ballot group"""
     return self.get_transfer_value() * self.get_multiple()
@@ -95,6 +135,35 @@ class Ballot(object):
     """Get the number of ballots in this ballot group"""
     return self._multiple
 
+  def get_rankings(self):
+    """Get the rankings of this ballot group, as a tuple"""
+    return self._rankings
+
+  def get_precinct(self):
+    """Get the precinct of this ballot group, possibly None"""
+    return self._precinct
+
+  def get_ranking_depth(self):
+    """Get the number of rankings that are counted, possibly None"""
+    return self._ranking_depth
+
+  def set_ranking_depth(self, ranking_depth):
+    """
+    Set the number of rankings that are counted
+
+    A ranking depth is a view of the rankings that truncates them
+    without copying them:  get_hrcc() never looks past that many
+    rankings, and classifies an exhausted ballot group against the
+    truncated rankings.
+
+    Arguments
+    ---------
+    ranking_depth
+      A positive int, or None to count all rankings.
+
+    """
+    self._ranking_depth = ranking_depth
+
   def get_transfer_value(self):
     """Get the current transfer value"""
     return self._transfer_value
@@ -136,6 +205,36 @@ class Ballot(object):
     result = (self._multiple, self._transfer_value, self._rankings)
     return result
 
+  def get_state(self):
+    """
+    Get the tabulation state of this ballot group
+
+    Returns
+    -------
+    A tuple of the current ranking index and the current transfer
+    value, which can be restored with set_state().
+
+    """
+    return (self._current_index, self._transfer_value)
+
+  def set_state(self, state):
+    """
+    Restore a tabulation state returned by get_state()
+    """
+    self._current_index, self._transfer_value = state
+
+  def copy(self):
+    """
+    Get a copy of this ballot group with a fresh tabulation state
+
+    The copy has the same multiple, rankings, precinct, and ranking
+    depth, but its transfer value and current ranking index are as they
+    were before any tabulation.
+
+    """
+    return Ballot(self._multiple, self._rankings, self._precinct,
+          self._ranking_depth)
+
   def __eq__(self, other):
     """
     Is self equal to other?
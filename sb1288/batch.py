@@ -0,0 +1,286 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Tabulate many RCV contests across a pool of processes
+
+The contests are given by a directory of JSON tabulation specifications
+or by a JSON manifest listing them.  Each contest is tabulated as by
+with_json.tabulate(), writing its own results file.  A failure of one
+contest does not stop the others; the outcome of each contest is
+recorded in a summary index.  The largest contests are started first,
+so that a long contest does not start last and extend the total time.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import errors
+from sb1288 import observe
+from sb1288 import parallel
+from sb1288 import with_json
+
+import argparse
+import collections
+import json
+import os
+import os.path
+
+INDEX_FILE_NAME = 'index.json'
+
+OUTCOME_TABULATED = 'tabulated'
+OUTCOME_INVALID = 'invalid'
+OUTCOME_IMPLEMENTATION_ERROR = 'implementation_error'
+OUTCOME_ERROR = 'error'
+OUTCOME_LIST = [
+      OUTCOME_TABULATED,
+      OUTCOME_INVALID,
+      OUTCOME_IMPLEMENTATION_ERROR,
+      OUTCOME_ERROR,
+      ]
+
+Contest = collections.namedtuple('Contest', [
+      'name', 'input_json', 'output_json', 'size'])
+Contest.__doc__ = """
+A contest to be tabulated in a batch
+
+Attributes
+----------
+name
+  A name for the contest, unique within the batch.
+
+input_json
+  The name of the JSON tabulation specification file, or a dict that is
+  the tabulation specification.
+
+output_json
+  The name of the JSON results file.
+
+size
+  An estimate of the work of the tabulation, used to schedule larger
+  contests first.  It is the size in bytes of the input file.
+
+"""
+
+ContestResult = collections.namedtuple('ContestResult', [
+      'name', 'input_json', 'output_json', 'outcome', 'elected', 'error',
+      'elapsed'])
+ContestResult.__doc__ = """
+The outcome of tabulating one contest of a batch
+
+Attributes
+----------
+name, output_json
+  As for the Contest.
+
+input_json
+  As for the Contest, or None if the Contest's value is a dict.
+
+outcome
+  One of:
+
+    'tabulated'
+      The results file was written.
+
+    'invalid'
+      An RcvValueError was raised, for invalid tabulation arguments.
+
+    'implementation_error'
+      An RcvImplementationError was raised.
+
+    'error'
+      Some other exception was raised, for example, for an unreadable
+      or malformed input file.
+
+elected
+  A list of the elected candidates, or None if not tabulated.
+
+error
+  A description of the exception, or None if tabulated.
+
+elapsed
+  The seconds used by the tabulation, including reading and writing
+  files.
+
+"""
+
+def find_contests(source, output_dir):
+  """
+  Find the contests of a batch
+
+  Arguments
+  ---------
+  source
+    Either a directory, in which each file with a .json extension is a
+    tabulation specification, or a JSON manifest file.
+
+    A manifest is a JSON object with a "contests" array.  Each item is
+    either the file name of a tabulation specification or an object
+    with an "input" file name and optionally a "name" and an "output"
+    file name.  Relative file names are relative to the directory of
+    the manifest.
+
+  output_dir
+    The directory for results files that are not named by a manifest.
+    A contest's default results file has the same name as its input
+    file.
+
+  Returns
+  -------
+  A list of Contest values, in the order of the directory's sorted file
+  names or the manifest.
+
+  Raises
+  ------
+  RcvValueError
+    If two contests have the same name or the same results file, or if
+    a results file is the same as an input file.
+
+  """
+  items = []
+  if os.path.isdir(source):
+    for file_name in sorted(os.listdir(source)):
+      if file_name.endswith('.json'):
+        items.append({'input': os.path.join(source, file_name)})
+  else:
+    manifest_dir = os.path.dirname(source)
+    for item in with_json.read_json(source)['contests']:
+      if not isinstance(item, dict):
+        item = {'input': item}
+      item = dict(item)
+      for name in ('input', 'output'):
+        if name in item:
+          item[name] = os.path.join(manifest_dir, with_json.u2s(item[name]))
+      items.append(item)
+  contests = []
+  names = set()
+  output_names = set()
+  for item in items:
+    input_json = item['input']
+    base_name = os.path.basename(input_json)
+    name = with_json.u2s(item.get('name', os.path.splitext(base_name)[0]))
+    output_json = item.get('output', os.path.join(output_dir, base_name))
+    if os.path.abspath(output_json) == os.path.abspath(input_json):
+      raise errors.RcvValueError('Batch results would replace input:', (
+            ('name', name),
+            ('input_json', input_json),
+            ))
+    if name in names or output_json in output_names:
+      raise errors.RcvValueError('Duplicate contest in batch:', (
+            ('name', name),
+            ('output_json', output_json),
+            ))
+    names.add(name)
+    output_names.add(output_json)
+    size = os.path.getsize(input_json) if os.path.isfile(input_json) else 0
+    contests.append(Contest(name, input_json, output_json, size))
+  return contests
+
+def tabulate_batch(contests, nbr_processes=None):
+  """
+  Tabulate the contests of a batch
+
+  Arguments
+  ---------
+  contests
+    A list of Contest values, as from find_contests().
+
+  nbr_processes
+    The number of worker processes, as for parallel.map_tasks().
+    Default value: None, for the number of CPUs
+
+  Returns
+  -------
+  A list of ContestResult values, in the same order as the contests.
+
+  """
+  tasks = sorted(contests, key=lambda contest: -contest.size)
+  results = {}
+  for result in parallel.map_tasks(_tabulate_task, tasks, nbr_processes,
+        ordered=False):
+    results[result.name] = result
+  return [results[contest.name] for contest in contests]
+
+def _tabulate_task(contest):
+  """Tabulate one contest, converting any exception into its outcome"""
+  start_time = observe.clock()
+  elected = None
+  error = None
+  try:
+    elected, status, tally, tabulation_spec = with_json.tabulate(
+          contest.input_json, contest.output_json)
+    outcome = OUTCOME_TABULATED
+    elected = [with_json.s2u(candidate) for candidate in elected]
+  except errors.RcvValueError as exc:
+    outcome = OUTCOME_INVALID
+    error = str(exc)
+  except errors.RcvImplementationError as exc:
+    outcome = OUTCOME_IMPLEMENTATION_ERROR
+    error = str(exc)
+  except Exception as exc:
+    outcome = OUTCOME_ERROR
+    error = '{}: {}'.format(type(exc).__name__, exc)
+  input_json = contest.input_json
+  if isinstance(input_json, dict):
+    input_json = None
+  return ContestResult(contest.name, input_json,
+        contest.output_json, outcome, elected, error,
+        observe.clock() - start_time)
+
+def batch_to_json(results):
+  """
+  Convert batch results to a JSON summary index
+
+  Returns
+  -------
+  A str of a JSON object with a "contests" array of objects, one for
+  each contest, and a "counts" object of the number of contests for
+  each outcome.
+
+  """
+  counts = collections.OrderedDict([(outcome, 0)
+        for outcome in OUTCOME_LIST])
+  contests = []
+  for result in results:
+    counts[result.outcome] += 1
+    contest = collections.OrderedDict([('name', result.name)])
+    if result.input_json is not None:
+      contest['input'] = result.input_json
+    contest['output'] = result.output_json
+    contest['outcome'] = result.outcome
+    contest['elapsed'] = result.elapsed
+    if result.elected is not None:
+      contest['elected'] = result.elected
+    if result.error is not None:
+      contest['error'] = result.error
+    contests.append(contest)
+  summary = collections.OrderedDict([
+        ('contests', contests),
+        ('counts', counts),
+        ])
+  return json.dumps(summary, indent=2) + '\n'
+
+def main(argv=None):
+  """Tabulate a batch of contests from the command line"""
+  parser = argparse.ArgumentParser(prog='python -m sb1288.batch',
+        description='Tabulate many RCV contests using JSON files.')
+  parser.add_argument('source',
+        help='directory of JSON tabulation specifications, or a JSON '
+              'manifest of contests')
+  parser.add_argument('output_dir',
+        help='directory for results files and the summary index')
+  parser.add_argument('--processes', type=int, default=None,
+        help='number of worker processes; default is the number of CPUs')
+  parser.add_argument('--index', default=INDEX_FILE_NAME,
+        help='file name of the summary index in the output directory; '
+              'default is index.json')
+  args = parser.parse_args(argv)
+  if not os.path.isdir(args.output_dir):
+    os.makedirs(args.output_dir)
+  contests = find_contests(args.source, args.output_dir)
+  results = tabulate_batch(contests, args.processes)
+  with_json.write_file(os.path.join(args.output_dir, args.index),
+        with_json.s2u(batch_to_json(results)))
+  return results
+
+if __name__ == '__main__':
+  main()
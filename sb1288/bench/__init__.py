@@ -0,0 +1,14 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""
+Benchmarks of RCV tabulations with synthetic elections
+
+The generate module builds deterministic, seeded synthetic contests.
+The harness module times the phases of tabulations of those contests
+across a matrix of sizes, records peak memory, and compares results
+with a stored baseline.  The benchmarks can be run from the command
+line with:
+
+  python -m sb1288.bench --help
+"""
@@ -0,0 +1,11 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Run benchmarks with:  python -m sb1288.bench"""
+
+from sb1288.bench import harness
+
+import sys
+
+if __name__ == '__main__':
+  sys.exit(1 if harness.main() else 0)
@@ -0,0 +1,513 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Check that an alternate engine matches rcv.Tabulation exactly
+
+Seeded random contests are tabulated by a reference engine and by
+another engine, in a pool of processes.  Besides contests of random
+sizes and preference models, the contests include adversarial kinds:
+many small ballot groups with equal multiples, so that ties are
+common, and deep rankings with many seats, so that STV surplus
+transfers chain through several rounds.  Skipped rankings, overvotes,
+and the tabulation options are also varied.
+
+When the engines disagree, the contest is shrunk, by removing ballot
+groups, candidates, seats, options, and rankings, and by reducing
+multiples, for as long as the engines still disagree.  The shrunk
+contest can be written as a test spec file in the same format as the
+files of the tests/test_* directories, with the reference engine's
+results as the expected results.
+
+Differential checks can be run from the command line with:
+
+  python -m sb1288.bench.differential --help
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import constants as K
+from sb1288 import distributed
+from sb1288 import errors
+from sb1288 import incremental
+from sb1288 import parallel
+from sb1288 import rcv
+from sb1288 import with_json
+from sb1288.bench import generate
+
+import argparse
+import collections
+import json
+import os.path
+import random
+import sys
+
+ENGINE_RCV = 'rcv'
+ENGINE_SHARDS = 'shards'
+ENGINE_INCREMENTAL = 'incremental'
+ENGINE_RESUME = 'resume'
+
+KIND_RANDOM = 'random'
+KIND_TIES = 'ties'
+KIND_SURPLUS = 'surplus'
+KIND_LIST = [KIND_RANDOM, KIND_TIES, KIND_SURPLUS]
+
+# The default limit on the number of smaller contests tried when
+#   shrinking a mismatch
+MAX_SHRINK_ATTEMPTS = 2000
+
+Mismatch = collections.namedtuple('Mismatch', [
+      'seed', 'tabulation_spec', 'reference_outcome', 'engine_outcome',
+      'file_name'])
+Mismatch.__doc__ = """
+A contest for which two engines disagree
+
+Attributes
+----------
+seed
+  The seed of the contest, as given to make_contest().
+
+tabulation_spec
+  The shrunk tabulation specification, as for with_json.tabulate().
+
+reference_outcome
+  The outcome of the reference engine for the shrunk contest, as from
+  get_outcome().
+
+engine_outcome
+  The outcome of the other engine for the shrunk contest.
+
+file_name
+  The name of the test spec file that was written, or None.
+
+"""
+
+def tabulate_rcv(tabulation_spec):
+  """Tabulate with an rcv.Tabulation, the reference engine"""
+  return rcv.Tabulation(*generate.tabulate_args(tabulation_spec)).tabulate()
+
+def tabulate_shards(tabulation_spec):
+  """
+  Tabulate with a DistributedTabulation of three in-process shards
+
+  Messages to the shards are converted to and from JSON, as they are
+  for shard workers reached through sockets.
+
+  """
+  tabulation = _LoopbackTabulation(*generate.tabulate_args(tabulation_spec),
+        workers=['shard 1', 'shard 2', 'shard 3'])
+  try:
+    return tabulation.tabulate()
+  finally:
+    tabulation.close()
+
+def tabulate_incremental(tabulation_spec):
+  """
+  Tabulate with an IncrementalTabulation, adding three batches of
+  ballot groups and tabulating after each
+  """
+  (nbr_seats_to_fill, candidates, ballots, max_ranking_levels,
+        tie_breaker, options) = generate.tabulate_args(tabulation_spec)
+  tabulation = incremental.IncrementalTabulation(nbr_seats_to_fill,
+        candidates, max_ranking_levels, tie_breaker, options)
+  for ix in range(3):
+    tabulation.add_batch(ix, ballots[ix::3])
+    results = tabulation.tabulate()
+  return results
+
+def tabulate_resume(tabulation_spec):
+  """
+  Tabulate with an rcv.Tabulation stopped after its first round, and
+  resumed from that round state by another rcv.Tabulation
+  """
+  args = generate.tabulate_args(tabulation_spec)
+  stopped = rcv.Tabulation(*args)
+  results = stopped.tabulate(stop_at_end=1)
+  if stopped.continuing():
+    results = rcv.Tabulation(*args).resume(stopped.get_round_state())
+  return results
+
+ENGINES = {
+      ENGINE_RCV: tabulate_rcv,
+      ENGINE_SHARDS: tabulate_shards,
+      ENGINE_INCREMENTAL: tabulate_incremental,
+      ENGINE_RESUME: tabulate_resume,
+      }
+
+def get_engine(engine):
+  """
+  Get the function of an engine
+
+  Arguments
+  ---------
+  engine
+    A name from ENGINES, or a function that takes a tabulation spec
+    and returns the same results as rcv.tabulate().  To be used in a
+    pool of processes, the function must be defined at module level.
+
+  Raises
+  ------
+  RcvValueError
+    If the engine is not a callable or a name from ENGINES.
+
+  """
+  if callable(engine):
+    return engine
+  try:
+    return ENGINES[engine]
+  except (KeyError, TypeError):
+    raise errors.RcvValueError('Unsupported differential engine:', (
+          ('engine', engine),
+          ))
+
+def get_outcome(engine, tabulation_spec):
+  """
+  Get the outcome of tabulating a contest with an engine
+
+  Returns
+  -------
+  The (elected, status, tally) results, with elected as a set, or if
+  an exception is raised, a pair of the name of the exception class
+  and the exception's message.
+
+  """
+  try:
+    elected, status, tally = get_engine(engine)(tabulation_spec)
+  except Exception as exc:
+    return (type(exc).__name__, str(getattr(exc, 'message', exc)))
+  return set(elected), status, tally
+
+def is_mismatch(tabulation_spec, engine, reference=ENGINE_RCV):
+  """Do two engines have different outcomes for a contest?"""
+  return (get_outcome(engine, tabulation_spec) !=
+        get_outcome(reference, tabulation_spec))
+
+def make_contest(seed):
+  """
+  Make a seeded random contest for a differential check
+
+  The kind of contest, from KIND_LIST, cycles with the seed.
+
+  Returns
+  -------
+  A dict that is a tabulation specification, as from
+  generate.generate_contest().
+
+  """
+  rng = random.Random(seed)
+  kind = KIND_LIST[seed % len(KIND_LIST)]
+  options = {}
+  if rng.random() < 0.5:
+    options[K.OPTION_ALTERNATIVE_DEFEATS] = K.OPTION_ALTERNATIVE_DEFEATS_YES
+  if rng.random() < 0.2:
+    options[K.OPTION_STOP_AT_MAJORITY] = True
+  rates = [0.0, 0.02, 0.2]
+  if kind == KIND_TIES:
+    nbr_candidates = rng.randint(3, 8)
+    params = {
+          'nbr_ballots': rng.randint(nbr_candidates, 3 * nbr_candidates),
+          'nbr_candidates': nbr_candidates,
+          'nbr_seats_to_fill': rng.randint(1, 3),
+          'model': generate.MODEL_UNIFORM,
+          'ranking_depth': rng.randint(3, 5),
+          'overvote_rate': rng.choice(rates),
+          }
+  elif kind == KIND_SURPLUS:
+    nbr_candidates = rng.randint(6, 12)
+    params = {
+          'nbr_ballots': rng.randint(200, 800),
+          'nbr_candidates': nbr_candidates,
+          'nbr_seats_to_fill': rng.randint(3, nbr_candidates // 2),
+          'model': generate.MODEL_PLACKETT_LUCE,
+          'ranking_depth': nbr_candidates,
+          }
+  else:
+    nbr_candidates = rng.randint(1, 10)
+    params = {
+          'nbr_ballots': rng.randint(1, 400),
+          'nbr_candidates': nbr_candidates,
+          'nbr_seats_to_fill': rng.randint(1, min(nbr_candidates, 4)),
+          'model': rng.choice(sorted(generate.MODEL_SET)),
+          'ranking_depth': rng.randint(3, 6),
+          'skip_rate': rng.choice(rates),
+          'overvote_rate': rng.choice(rates),
+          'truncation_rate': rng.choice(rates),
+          }
+  tabulation_spec = generate.generate_contest(seed=seed, options=options,
+        **params)
+  if kind == KIND_TIES:
+    for ballot in tabulation_spec['ballots']:
+      ballot[0] = 1
+  tabulation_spec['description'] = 'Differential contest: {}, seed {}'.format(
+        kind, seed)
+  return tabulation_spec
+
+def shrink(tabulation_spec, engine, reference=ENGINE_RCV,
+      max_attempts=MAX_SHRINK_ATTEMPTS):
+  """
+  Shrink a contest for which two engines disagree
+
+  Smaller contests are tried, and the first one for which the engines
+  still disagree replaces the contest, until no smaller contest is
+  found or max_attempts smaller contests have been tried.
+
+  Returns
+  -------
+  The shrunk tabulation specification.
+
+  """
+  nbr_attempts = 0
+  is_shrinking = True
+  while is_shrinking:
+    is_shrinking = False
+    for smaller_spec in _smaller_specs(tabulation_spec):
+      nbr_attempts += 1
+      if nbr_attempts > max_attempts:
+        return tabulation_spec
+      if is_mismatch(smaller_spec, engine, reference):
+        tabulation_spec = smaller_spec
+        is_shrinking = True
+        break
+  return tabulation_spec
+
+def check_contests(engine, nbr_contests=100, first_seed=0,
+      reference=ENGINE_RCV, nbr_processes=None, output_dir=None,
+      max_attempts=MAX_SHRINK_ATTEMPTS):
+  """
+  Check an engine against a reference engine with random contests
+
+  Arguments
+  ---------
+  engine
+    The engine to check, as for get_engine().
+
+  nbr_contests
+    The number of contests, with consecutive seeds.
+    Default value: 100
+
+  first_seed
+    The seed of the first contest.
+    Default value: 0
+
+  reference
+    The reference engine, as for get_engine().
+    Default value: 'rcv'
+
+  nbr_processes
+    As for parallel.map_tasks().  Contests are checked and shrunk in
+    the worker processes.
+    Default value: None
+
+  output_dir
+    If not None, the directory in which a test spec file is written for
+    each mismatch, named diff-<seed>.json.
+    Default value: None
+
+  max_attempts
+    As for shrink().
+    Default value: MAX_SHRINK_ATTEMPTS
+
+  Returns
+  -------
+  A list of Mismatch values, in order by seed.
+
+  """
+  mismatches = [mismatch for mismatch in parallel.map_tasks(_check_seed,
+        [(engine, reference, seed, max_attempts)
+        for seed in range(first_seed, first_seed + nbr_contests)],
+        nbr_processes, ordered=False) if mismatch is not None]
+  mismatches.sort(key=lambda mismatch: mismatch.seed)
+  if output_dir is not None:
+    mismatches = [mismatch._replace(file_name=write_test_spec(
+          os.path.join(output_dir, 'diff-{}.json'.format(mismatch.seed)),
+          mismatch.tabulation_spec, reference))
+          for mismatch in mismatches]
+  return mismatches
+
+def write_test_spec(file_name, tabulation_spec, reference=ENGINE_RCV):
+  """
+  Write a contest as a test spec file, as in the tests/test_* directories
+
+  The expected results are those of the reference engine:  elected,
+  status_codes, and tally, or an exception.
+
+  Returns
+  -------
+  The file name.
+
+  """
+  test_spec = collections.OrderedDict()
+  test_spec['description'] = tabulation_spec.get('description', '')
+  test_spec['nbr_seats_to_fill'] = tabulation_spec['nbr_seats_to_fill']
+  test_spec['candidates'] = _delimited(tabulation_spec['candidates'])
+  test_spec['ballots'] = [[multiple, _delimited(rankings)]
+        for multiple, rankings in tabulation_spec['ballots']]
+  test_spec['max_ranking_levels'] = tabulation_spec['max_ranking_levels']
+  test_spec['tie_breaker'] = _delimited(tabulation_spec['tie_breaker'])
+  test_spec['options'] = tabulation_spec['options']
+  outcome = get_outcome(reference, tabulation_spec)
+  if len(outcome) == 2:
+    test_spec['exception'] = list(outcome)
+  else:
+    elected, status, tally = outcome
+    test_spec['elected'] = sorted(elected)
+    test_spec['status_codes'] = [list(cstatus.as_tuple(as_float=True))
+          for candidate, cstatus in sorted(status.items(), key=lambda item:
+          with_json.get_tally_sort_key(item[0], status))]
+    test_spec['tally'] = collections.OrderedDict([(code,
+          [with_json.json_votes(votes) for votes in votes_by_round])
+          for code, votes_by_round in sorted(tally.items(), key=lambda item:
+          with_json.get_tally_sort_key(item[0], status))])
+  lines = []
+  for name, value in test_spec.items():
+    if isinstance(value, list) and value and isinstance(value[0], list):
+      value_str = '[\n' + ',\n'.join(['        ' + json.dumps(item)
+            for item in value]) + '\n        ]'
+    elif isinstance(value, dict) and value:
+      value_str = '{\n' + ',\n'.join(['        ' + json.dumps(key) + ': ' +
+            json.dumps(item) for key, item in value.items()]) + '\n        }'
+    else:
+      value_str = json.dumps(value)
+    lines.append(json.dumps(name) + ': ' + value_str)
+  with_json.write_file(file_name, with_json.s2u(
+        '{\n  ' + '\n  ,'.join(lines) + '\n}\n'))
+  return file_name
+
+def _delimited(names):
+  """Get a space-delimited string of names, as in test spec files"""
+  if isinstance(names, str):
+    return names
+  return ''.join([' ' + name for name in names])
+
+def _check_seed(task):
+  """
+  Check one contest, shrinking it if the engines disagree
+
+  This function is for internal use only.
+
+  """
+  engine, reference, seed, max_attempts = task
+  tabulation_spec = make_contest(seed)
+  if not is_mismatch(tabulation_spec, engine, reference):
+    return None
+  tabulation_spec = shrink(tabulation_spec, engine, reference, max_attempts)
+  return Mismatch(seed, tabulation_spec,
+        get_outcome(reference, tabulation_spec),
+        get_outcome(engine, tabulation_spec), None)
+
+def _smaller_specs(tabulation_spec):
+  """
+  Generate smaller variants of a tabulation spec, roughly largest first
+
+  This function is for internal use only.
+
+  """
+  def variant(**changes):
+    result = dict(tabulation_spec)
+    result.update(changes)
+    return result
+  ballots = [[multiple, list(rankings)]
+        for multiple, rankings in tabulation_spec['ballots']]
+  candidates = list(_names(tabulation_spec['candidates']))
+  tie_breaker = list(_names(tabulation_spec['tie_breaker']))
+  chunk_size = max(len(ballots) // 2, 1) if ballots else 0
+  while chunk_size >= 1:
+    for start in range(0, len(ballots), chunk_size):
+      yield variant(ballots=ballots[:start] + ballots[start + chunk_size:])
+    chunk_size //= 2
+  if tabulation_spec['nbr_seats_to_fill'] > 1:
+    yield variant(nbr_seats_to_fill=tabulation_spec['nbr_seats_to_fill'] - 1)
+  for name in sorted(tabulation_spec['options']):
+    options = dict(tabulation_spec['options'])
+    del options[name]
+    yield variant(options=options)
+  for candidate in candidates:
+    yield variant(
+          candidates=[name for name in candidates if name != candidate],
+          tie_breaker=[name for name in tie_breaker if name != candidate],
+          ballots=[[multiple, [K.RANKING_CODE_SKIPPED if name == candidate
+                else name for name in rankings]]
+                for multiple, rankings in ballots])
+  for ix, (multiple, rankings) in enumerate(ballots):
+    if multiple > 1:
+      for smaller_multiple in (1, multiple // 2, multiple - 1):
+        yield variant(ballots=ballots[:ix] +
+              [[smaller_multiple, rankings]] + ballots[ix + 1:])
+    if rankings:
+      yield variant(ballots=ballots[:ix] + [[multiple, rankings[:-1]]] +
+            ballots[ix + 1:])
+  longest = max([len(rankings) for multiple, rankings in ballots] + [0])
+  if tabulation_spec['max_ranking_levels'] > max(longest,
+        K.MIN_RANKINGS_SUPPORTED):
+    yield variant(max_ranking_levels=max(longest, K.MIN_RANKINGS_SUPPORTED))
+
+def _names(names):
+  """Get a tuple of names from a delimited str or a sequence of names"""
+  return tuple(names[1:].split(names[0]) if isinstance(names, str) and names
+        else names)
+
+
+class _LoopbackTabulation(distributed.DistributedTabulation):
+  """A DistributedTabulation with its shards in the current process"""
+
+  def open_connections(self):
+    return [_LoopbackConnection() for worker in self.workers]
+
+
+class _LoopbackConnection(object):
+  """Exchange messages with an in-process Shard, by way of JSON"""
+
+  def __init__(self):
+    self.shard = distributed.Shard()
+    self.reply = None
+
+  def send(self, message):
+    self.reply = json.loads(json.dumps(self.shard.handle(
+          json.loads(json.dumps(message)))))
+
+  def receive(self):
+    return self.reply
+
+  def close(self):
+    self.shard = None
+
+def main(argv=None):
+  """
+  Run differential checks from the command line
+
+  Returns
+  -------
+  The list of Mismatch values.
+
+  """
+  parser = argparse.ArgumentParser(prog='python -m sb1288.bench.differential',
+        description='Check an RCV engine against rcv.Tabulation with '
+              'random contests.')
+  parser.add_argument('--engine', default=ENGINE_SHARDS,
+        choices=sorted(ENGINES),
+        help='engine to check; default is shards')
+  parser.add_argument('--reference', default=ENGINE_RCV,
+        choices=sorted(ENGINES),
+        help='reference engine; default is rcv')
+  parser.add_argument('--contests', type=int, default=100,
+        help='number of random contests; default 100')
+  parser.add_argument('--seed', type=int, default=0,
+        help='seed of the first contest; default 0')
+  parser.add_argument('--processes', type=int, default=None,
+        help='number of worker processes; default is the number of CPUs')
+  parser.add_argument('--output-dir',
+        help='directory for a test spec file of each shrunk mismatch')
+  args = parser.parse_args(argv)
+  mismatches = check_contests(args.engine, args.contests, args.seed,
+        args.reference, args.processes, args.output_dir)
+  for mismatch in mismatches:
+    sys.stderr.write('Mismatch for seed {}: {} ballot groups{}\n'.format(
+          mismatch.seed, len(mismatch.tabulation_spec['ballots']),
+          '' if mismatch.file_name is None
+          else ', written to ' + mismatch.file_name))
+  sys.stderr.write('{} contests, {} mismatches\n'.format(args.contests,
+        len(mismatches)))
+  return mismatches
+
+if __name__ == '__main__':
+  sys.exit(1 if main() else 0)
@@ -0,0 +1,193 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Generate deterministic, seeded synthetic RCV contests"""
+
+from __future__ import print_function
+
+from sb1288 import constants as K
+from sb1288 import errors
+
+import math
+import random
+
+MODEL_PLACKETT_LUCE = 'plackett_luce'
+MODEL_SPATIAL = 'spatial'
+MODEL_UNIFORM = 'uniform'
+MODEL_SET = set([
+      MODEL_PLACKETT_LUCE,
+      MODEL_SPATIAL,
+      MODEL_UNIFORM,
+      ])
+
+def generate_contest(nbr_ballots, nbr_candidates, ranking_depth=3,
+      nbr_seats_to_fill=1, model=MODEL_PLACKETT_LUCE, seed=0,
+      skip_rate=0.0, overvote_rate=0.0, truncation_rate=0.0,
+      dimensions=2, options={}):
+  """
+  Generate a synthetic RCV contest
+
+  Arguments
+  ---------
+  nbr_ballots
+    The number of individual ballots.  Ballots with the same rankings
+    are combined into ballot groups.
+
+  nbr_candidates
+    The number of candidates, named C01, C02, and so on.
+
+  ranking_depth
+    The maximum number of rankings on a ballot, also used as the value
+    of max_ranking_levels.  It is at least three.
+    Default value: 3
+
+  nbr_seats_to_fill
+    The number of seats to fill.
+    Default value: 1
+
+  model
+    The preference model used to rank candidates:
+
+      'plackett_luce'
+        Each candidate has a seeded random weight, and each ranking
+        chooses among the remaining candidates with probability
+        proportional to their weights.
+
+      'spatial'
+        Voters and candidates have seeded random positions in a space
+        of the given number of dimensions, and each voter ranks
+        candidates by increasing distance.
+
+      'uniform'
+        Each ranking is a uniformly random permutation.
+
+    Default value: 'plackett_luce'
+
+  seed
+    The seed for the random number generator.  The same arguments
+    always produce the same contest.
+    Default value: 0
+
+  skip_rate
+    The probability that a ranking is left blank, i.e. skipped.
+    Default value: 0.0
+
+  overvote_rate
+    The probability that a ranking is an overvote.
+    Default value: 0.0
+
+  truncation_rate
+    The probability that a voter stops ranking after each ranking
+    that is made.
+    Default value: 0.0
+
+  dimensions
+    The number of dimensions for the spatial model.
+    Default value: 2
+
+  options
+    Tabulation options for the contest.
+    Default value: an empty dict
+
+  Returns
+  -------
+  A dict that is a tabulation specification, with the same names as
+  are used for the input to with_json.tabulate().
+
+  Raises
+  ------
+  RcvValueError
+    If the model is not supported or the ranking depth is too small.
+
+  """
+  if model not in MODEL_SET:
+    raise errors.RcvValueError('Unsupported preference model:', (
+          ('model', model),
+          ))
+  if ranking_depth < K.MIN_RANKINGS_SUPPORTED:
+    raise errors.RcvValueError('ranking_depth is less than {}:'.
+          format(K.MIN_RANKINGS_SUPPORTED), (
+          ('ranking_depth', ranking_depth),
+          ))
+  rng = random.Random(seed)
+  candidates = ['C{:02d}'.format(ix + 1) for ix in range(nbr_candidates)]
+  if model == MODEL_PLACKETT_LUCE:
+    weights = [rng.paretovariate(1.5) for candidate in candidates]
+    rank_candidates = lambda: _plackett_luce_ranking(rng, candidates,
+          weights, ranking_depth)
+  elif model == MODEL_SPATIAL:
+    positions = [[rng.random() for ix in range(dimensions)]
+          for candidate in candidates]
+    rank_candidates = lambda: _spatial_ranking(rng, candidates, positions,
+          dimensions, ranking_depth)
+  else:
+    rank_candidates = lambda: rng.sample(candidates,
+          min(ranking_depth, len(candidates)))
+  ballot_counts = {}
+  for ix in range(nbr_ballots):
+    ranked = rank_candidates()
+    rankings = []
+    for candidate in ranked:
+      if rankings and rng.random() < truncation_rate:
+        break
+      if rng.random() < skip_rate:
+        rankings.append(K.RANKING_CODE_SKIPPED)
+      elif rng.random() < overvote_rate:
+        rankings.append(K.RANKING_CODE_OVERVOTE)
+      else:
+        rankings.append(candidate)
+    rankings = tuple(rankings[:ranking_depth])
+    while rankings and rankings[-1] == K.RANKING_CODE_SKIPPED:
+      rankings = rankings[:-1]
+    ballot_counts[rankings] = ballot_counts.get(rankings, 0) + 1
+  ballots = [[multiple, list(rankings)]
+        for rankings, multiple in sorted(ballot_counts.items())]
+  tie_breaker = list(candidates)
+  rng.shuffle(tie_breaker)
+  tabulation_spec = {
+        'description': 'Synthetic contest: {} ballots, {} candidates, '
+              '{} seats, {} model, seed {}'.format(nbr_ballots,
+              nbr_candidates, nbr_seats_to_fill, model, seed),
+        'nbr_seats_to_fill': nbr_seats_to_fill,
+        'candidates': candidates,
+        'ballots': ballots,
+        'max_ranking_levels': ranking_depth,
+        'tie_breaker': tie_breaker,
+        'options': dict(options),
+        }
+  return tabulation_spec
+
+def tabulate_args(tabulation_spec):
+  """
+  Get the arguments for rcv.tabulate() from a tabulation specification
+  """
+  return (tabulation_spec['nbr_seats_to_fill'],
+        tabulation_spec['candidates'],
+        tabulation_spec['ballots'],
+        tabulation_spec['max_ranking_levels'],
+        tabulation_spec['tie_breaker'],
+        tabulation_spec['options'])
+
+def _plackett_luce_ranking(rng, candidates, weights, ranking_depth):
+  """Rank candidates by sequential choice proportional to weights"""
+  remaining = list(range(len(candidates)))
+  remaining_weights = list(weights)
+  ranked = []
+  while remaining and len(ranked) < ranking_depth:
+    target = rng.random() * sum(remaining_weights)
+    for ix, weight in enumerate(remaining_weights):
+      target -= weight
+      if target < 0:
+        break
+    ranked.append(candidates[remaining.pop(ix)])
+    remaining_weights.pop(ix)
+  return ranked
+
+def _spatial_ranking(rng, candidates, positions, dimensions, ranking_depth):
+  """Rank candidates by distance from a random voter position"""
+  voter = [rng.random() for ix in range(dimensions)]
+  distances = [(math.sqrt(sum([(voter[ix] - position[ix]) ** 2
+        for ix in range(dimensions)])), candidate)
+        for candidate, position in zip(candidates, positions)]
+  ranked = [candidate for distance, candidate in sorted(distances)]
+  return ranked[:ranking_depth]
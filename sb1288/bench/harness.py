@@ -0,0 +1,365 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Time and measure RCV tabulations of synthetic contests"""
+
+from __future__ import print_function
+
+from sb1288 import rcv
+from sb1288 import errors
+from sb1288 import observe
+from sb1288 import with_json
+from sb1288.bench import generate
+
+import argparse
+import collections
+import json
+import os
+import os.path
+import platform
+import shutil
+import sys
+import tempfile
+
+try:
+  import tracemalloc
+except ImportError:
+  # Python 2 has no tracemalloc, so peak memory is not measured
+  tracemalloc = None
+
+ENGINE_RCV = 'rcv'
+ENGINE_WITH_JSON = 'with_json'
+ENGINE_LIST = [ENGINE_RCV, ENGINE_WITH_JSON]
+
+RESULTS_FORMAT = 'sb1288-bench-1'
+
+# The default fraction by which a measure may exceed its baseline value
+REGRESSION_THRESHOLD = 0.10
+
+QUICK_MATRIX = [
+      {'name': 'irv-pl-2k', 'nbr_ballots': 2000, 'nbr_candidates': 6,
+            'ranking_depth': 3},
+      {'name': 'stv-spatial-2k', 'nbr_ballots': 2000, 'nbr_candidates': 8,
+            'ranking_depth': 5, 'nbr_seats_to_fill': 3, 'model': 'spatial',
+            'skip_rate': 0.02, 'overvote_rate': 0.01},
+      ]
+
+DEFAULT_MATRIX = [
+      {'name': 'irv-pl-10k', 'nbr_ballots': 10000, 'nbr_candidates': 8,
+            'ranking_depth': 3},
+      {'name': 'irv-pl-100k', 'nbr_ballots': 100000, 'nbr_candidates': 12,
+            'ranking_depth': 5, 'skip_rate': 0.02, 'overvote_rate': 0.01,
+            'truncation_rate': 0.1},
+      {'name': 'irv-spatial-100k', 'nbr_ballots': 100000,
+            'nbr_candidates': 20, 'ranking_depth': 10, 'model': 'spatial',
+            'truncation_rate': 0.2},
+      {'name': 'stv-pl-10k', 'nbr_ballots': 10000, 'nbr_candidates': 12,
+            'ranking_depth': 6, 'nbr_seats_to_fill': 3},
+      {'name': 'stv-spatial-100k', 'nbr_ballots': 100000,
+            'nbr_candidates': 20, 'ranking_depth': 10, 'nbr_seats_to_fill': 5,
+            'model': 'spatial', 'skip_rate': 0.02, 'overvote_rate': 0.01},
+      {'name': 'irv-pl-1m', 'nbr_ballots': 1000000, 'nbr_candidates': 10,
+            'ranking_depth': 5, 'truncation_rate': 0.1},
+      ]
+
+Regression = collections.namedtuple('Regression', [
+      'case', 'engine', 'measure', 'baseline', 'current', 'ratio'])
+Regression.__doc__ = """
+A measure that exceeds its baseline value by more than the threshold
+
+Attributes
+----------
+case
+  The name of the benchmark case.
+
+engine
+  The name of the engine, one of ENGINE_LIST.
+
+measure
+  'elapsed' for seconds elapsed or 'peak_memory' for peak bytes
+  allocated.
+
+baseline
+  The baseline value.
+
+current
+  The current value.
+
+ratio
+  The current value divided by the baseline value.
+
+"""
+
+def run_benchmarks(matrix=DEFAULT_MATRIX, engines=ENGINE_LIST, repeat=1,
+      measure_memory=True):
+  """
+  Run benchmark cases
+
+  Arguments
+  ---------
+  matrix
+    A list of benchmark cases, each a dict with a 'name' and the keyword
+    arguments for generate.generate_contest().
+    Default value: DEFAULT_MATRIX
+
+  engines
+    A list of the engines to time, from ENGINE_LIST:
+
+      'rcv'
+        An rcv.Tabulation, from its Python arguments.
+
+      'with_json'
+        with_json.tabulate(), from a JSON file to a JSON file.
+
+    Default value: ENGINE_LIST
+
+  repeat
+    The number of times each engine is timed for each case.  The
+    fastest run is reported.
+    Default value: 1
+
+  measure_memory
+    If this evaluates to True and tracemalloc is available, each engine
+    is run one more time, while tracing memory allocations, to measure
+    the peak memory used.  That run is not timed, since tracing is slow.
+    Default value: True
+
+  Returns
+  -------
+  A dict of the results, suitable for conversion to JSON.
+
+  """
+  results = {
+        'format': RESULTS_FORMAT,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'cases': [run_case(case, engines, repeat, measure_memory)
+              for case in matrix],
+        }
+  return results
+
+def run_case(case, engines=ENGINE_LIST, repeat=1, measure_memory=True):
+  """
+  Run one benchmark case
+
+  Arguments
+  ---------
+  The case is one item of the matrix argument of run_benchmarks(), and
+  the other arguments are as for run_benchmarks().
+
+  Returns
+  -------
+  A dict of the results for the case, with the names:
+
+    name
+      The name of the case.
+
+    params
+      The arguments used to generate the contest.
+
+    nbr_ballot_groups
+      The number of ballot groups in the generated contest.
+
+    generate_elapsed
+      The seconds used to generate the contest.
+
+    engines
+      A dict keyed by engine name of dicts with 'elapsed', 'phases',
+      'rounds', 'elected', and 'peak_memory' values.  The peak memory is
+      None if it was not measured.
+
+  """
+  params = {name: value for name, value in case.items() if name != 'name'}
+  start_time = observe.clock()
+  tabulation_spec = generate.generate_contest(**params)
+  generate_elapsed = observe.clock() - start_time
+  case_results = {
+        'name': case.get('name', ''),
+        'params': params,
+        'nbr_ballot_groups': len(tabulation_spec['ballots']),
+        'generate_elapsed': generate_elapsed,
+        'engines': {},
+        }
+  temp_dir = tempfile.mkdtemp(prefix='sb1288-bench-')
+  try:
+    input_json = os.path.join(temp_dir, 'input.json')
+    with_json.write_file(input_json,
+          with_json.s2u(json.dumps(tabulation_spec)))
+    for engine in engines:
+      case_results['engines'][engine] = _measure_engine(engine,
+            tabulation_spec, temp_dir, repeat, measure_memory)
+  finally:
+    shutil.rmtree(temp_dir, ignore_errors=True)
+  return case_results
+
+def _measure_engine(engine, tabulation_spec, temp_dir, repeat,
+      measure_memory):
+  """Time an engine, keeping its fastest run, and measure its memory"""
+  best = None
+  for ix in range(max(repeat, 1)):
+    engine_results = _run_engine(engine, tabulation_spec, temp_dir)
+    if best is None or engine_results['elapsed'] < best['elapsed']:
+      best = engine_results
+  best['peak_memory'] = None
+  if measure_memory and tracemalloc is not None:
+    tracemalloc.start()
+    try:
+      _run_engine(engine, tabulation_spec, temp_dir)
+      best['peak_memory'] = tracemalloc.get_traced_memory()[1]
+    finally:
+      tracemalloc.stop()
+  return best
+
+def _run_engine(engine, tabulation_spec, temp_dir):
+  """Tabulate once with an engine, timing each phase"""
+  phase_timer = observe.PhaseTimer()
+  if engine == ENGINE_RCV:
+    start_time = observe.clock()
+    tabulation = rcv.Tabulation(*generate.tabulate_args(tabulation_spec),
+          observer=phase_timer)
+    elected, status, tally = tabulation.tabulate()
+    elapsed = observe.clock() - start_time
+  elif engine == ENGINE_WITH_JSON:
+    start_time = observe.clock()
+    elected, status, tally, spec = with_json.tabulate(
+          os.path.join(temp_dir, 'input.json'),
+          os.path.join(temp_dir, 'output.json'), observer=phase_timer)
+    elapsed = observe.clock() - start_time
+  else:
+    raise errors.RcvValueError('Unsupported benchmark engine:', (
+          ('engine', engine),
+          ))
+  engine_results = phase_timer.as_dict()
+  engine_results['elapsed'] = elapsed
+  engine_results['elected'] = [str(candidate) for candidate in elected]
+  return engine_results
+
+def compare_results(results, baseline, threshold=REGRESSION_THRESHOLD,
+      memory_threshold=None):
+  """
+  Compare benchmark results with baseline results
+
+  Only cases and engines that are in both the results and the baseline
+  are compared.
+
+  Arguments
+  ---------
+  results
+    A dict of results from run_benchmarks().
+
+  baseline
+    A dict of baseline results, from an earlier run_benchmarks().
+
+  threshold
+    The fraction by which the elapsed time of an engine for a case may
+    exceed its baseline value before it is reported as a regression.
+    Default value: REGRESSION_THRESHOLD
+
+  memory_threshold
+    The same, for peak memory.  If None, the threshold value is used.
+    Default value: None
+
+  Returns
+  -------
+  A list of Regression values, in the order of the cases and engines.
+
+  """
+  if memory_threshold is None:
+    memory_threshold = threshold
+  baseline_cases = {case['name']: case for case in baseline['cases']}
+  regressions = []
+  for case in results['cases']:
+    if case['name'] not in baseline_cases:
+      continue
+    baseline_engines = baseline_cases[case['name']]['engines']
+    for engine in ENGINE_LIST:
+      if engine not in case['engines'] or engine not in baseline_engines:
+        continue
+      for measure, measure_threshold in (('elapsed', threshold),
+            ('peak_memory', memory_threshold)):
+        current = case['engines'][engine].get(measure)
+        base_value = baseline_engines[engine].get(measure)
+        if not current or not base_value:
+          continue
+        ratio = float(current) / base_value
+        if ratio > 1 + measure_threshold:
+          regressions.append(Regression(case['name'], engine, measure,
+                base_value, current, ratio))
+  return regressions
+
+def format_summary(results, regressions=()):
+  """
+  Format a plain text summary of benchmark results
+
+  Returns
+  -------
+  A str of lines, one for each case and engine, followed by a line for
+  each regression.
+
+  """
+  lines = ['{:<20} {:<10} {:>8} {:>10} {:>10}'.format('case', 'engine',
+        'groups', 'seconds', 'peak MB')]
+  for case in results['cases']:
+    for engine in ENGINE_LIST:
+      if engine not in case['engines']:
+        continue
+      engine_results = case['engines'][engine]
+      peak_memory = engine_results['peak_memory']
+      lines.append('{:<20} {:<10} {:>8} {:>10.3f} {:>10}'.format(
+            case['name'], engine, case['nbr_ballot_groups'],
+            engine_results['elapsed'], '-' if peak_memory is None
+            else '{:.1f}'.format(peak_memory / 1e6)))
+  for regression in regressions:
+    lines.append('REGRESSION: {} {} {}: {} -> {} ({:.0%})'.format(
+          regression.case, regression.engine, regression.measure,
+          regression.baseline, regression.current, regression.ratio - 1))
+  return '\n'.join(lines) + '\n'
+
+def main(argv=None):
+  """
+  Run benchmarks from the command line
+
+  Returns
+  -------
+  A list of Regression values, which is empty if there is no baseline.
+
+  """
+  parser = argparse.ArgumentParser(prog='python -m sb1288.bench',
+        description='Benchmark RCV tabulations of synthetic contests.')
+  parser.add_argument('output_json', nargs='?', default='',
+        help='file for the JSON results; default is standard output')
+  parser.add_argument('--matrix',
+        help='JSON file with an array of benchmark cases')
+  parser.add_argument('--quick', action='store_true',
+        help='run only a few small cases')
+  parser.add_argument('--engine', action='append', choices=ENGINE_LIST,
+        help='engine to benchmark; may be repeated; default is all')
+  parser.add_argument('--repeat', type=int, default=1,
+        help='number of timed runs of each engine, keeping the fastest')
+  parser.add_argument('--no-memory', action='store_true',
+        help='do not measure peak memory')
+  parser.add_argument('--baseline',
+        help='JSON file of earlier results to compare with')
+  parser.add_argument('--threshold', type=float,
+        default=REGRESSION_THRESHOLD,
+        help='allowed fractional increase over the baseline; default 0.10')
+  parser.add_argument('--memory-threshold', type=float, default=None,
+        help='allowed fractional increase in peak memory; '
+              'default is the --threshold value')
+  args = parser.parse_args(argv)
+  if args.matrix:
+    matrix = with_json.read_json(args.matrix)
+  elif args.quick:
+    matrix = QUICK_MATRIX
+  else:
+    matrix = DEFAULT_MATRIX
+  results = run_benchmarks(matrix, args.engine or ENGINE_LIST,
+        args.repeat, not args.no_memory)
+  regressions = []
+  if args.baseline:
+    regressions = compare_results(results, with_json.read_json(args.baseline),
+          args.threshold, args.memory_threshold)
+  json_str = json.dumps(results, indent=2, sort_keys=True) + '\n'
+  with_json.write_file(args.output_json, with_json.s2u(json_str))
+  sys.stderr.write(format_summary(results, regressions))
+  return regressions
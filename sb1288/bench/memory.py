@@ -0,0 +1,234 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""
+Report the memory used by a tabulation, by data structure
+
+The peak memory is measured with tracemalloc, where it is available.
+The memory retained by each data structure is measured after the
+tabulation by walking its objects, counting each object only once, in
+the order of STRUCTURE_LIST.  Decimal5 instances are counted separately
+from the structures that refer to them.
+
+The report can be made from the command line with:
+
+  python -m sb1288.bench.memory input.json [report.json]
+"""
+
+from __future__ import print_function
+
+from sb1288 import constants as K
+from sb1288 import rcv
+from sb1288 import with_json
+
+import argparse
+import json
+import sys
+
+try:
+  import tracemalloc
+except ImportError:
+  # Python 2 has no tracemalloc, so peak memory is not measured
+  tracemalloc = None
+
+STRUCTURE_SPEC = 'spec'
+STRUCTURE_BALLOTS = 'ballots'
+STRUCTURE_PILES = 'piles'
+STRUCTURE_TALLIES = 'tallies'
+STRUCTURE_STATUSES = 'statuses'
+STRUCTURE_DECIMALS = 'decimals'
+STRUCTURE_LIST = [
+      STRUCTURE_SPEC,
+      STRUCTURE_BALLOTS,
+      STRUCTURE_PILES,
+      STRUCTURE_TALLIES,
+      STRUCTURE_STATUSES,
+      STRUCTURE_DECIMALS,
+      ]
+
+def memory_report(input_json='', default_json=None):
+  """
+  Tabulate a contest specified with JSON files and report its memory use
+
+  Arguments
+  ---------
+  input_json, default_json
+    As for with_json.tabulate().  Alternatively, input_json may be a
+    dict that is a tabulation specification, with default_json None.
+
+  Returns
+  -------
+  A dict suitable for conversion to JSON, with the names:
+
+    nbr_ballot_groups
+      The number of validated ballot groups.
+
+    peak_memory
+      The peak bytes allocated while reading the specification,
+      validating, and tabulating, or None if tracemalloc is not
+      available.
+
+    stages
+      A dict of the bytes allocated, net of any released, by the stages
+      'read_spec' and 'validate', and the peak bytes above the
+      validated data while tabulating, 'tabulate'.  The values are None
+      if tracemalloc is not available.
+
+    structures
+      A dict of the bytes retained, after the tabulation, by each item of
+      STRUCTURE_LIST:  the raw specification from JSON, the validated
+      Ballot objects, the ballots_for piles, the tallies, the Status
+      objects, and all Decimal5 instances.
+
+    bytes_per_ballot_group
+      The peak memory divided by the number of ballot groups, or if the
+      peak memory is not available, the total of the structures divided
+      by the number of ballot groups.  This can be used to estimate the
+      memory needed for contests of other sizes.
+
+  """
+  is_tracing = tracemalloc is not None and not tracemalloc.is_tracing()
+  if is_tracing:
+    tracemalloc.start()
+  try:
+    stages = {'read_spec': None, 'validate': None, 'tabulate': None}
+    peak_memory = None
+    start_memory = _traced_memory()
+    if isinstance(input_json, dict):
+      tabulation_spec = input_json
+      tabulate_args = (tabulation_spec['nbr_seats_to_fill'],
+            tabulation_spec['candidates'], tabulation_spec['ballots'],
+            tabulation_spec['max_ranking_levels'],
+            tabulation_spec['tie_breaker'],
+            tabulation_spec.get('options', {}))
+    else:
+      tabulate_args, tabulation_spec = with_json.build_tabulate_args(
+            input_json, default_json)
+    spec_memory = _traced_memory()
+    tabulation = rcv.Tabulation(*tabulate_args)
+    validated_memory = _traced_memory()
+    if tracemalloc is not None and hasattr(tracemalloc, 'reset_peak'):
+      tracemalloc.reset_peak()
+    tabulation.tabulate()
+    if tracemalloc is not None:
+      tabulate_peak = tracemalloc.get_traced_memory()[1]
+      stages['read_spec'] = spec_memory - start_memory
+      stages['validate'] = validated_memory - spec_memory
+      stages['tabulate'] = max(tabulate_peak - validated_memory, 0)
+      peak_memory = tabulate_peak - start_memory
+  finally:
+    if is_tracing:
+      tracemalloc.stop()
+  structures = structure_sizes(tabulation_spec, tabulation)
+  nbr_ballot_groups = len(tabulation.ballots)
+  total = peak_memory
+  if total is None:
+    total = sum(structures.values())
+  report = {
+        'nbr_ballot_groups': nbr_ballot_groups,
+        'peak_memory': peak_memory,
+        'stages': stages,
+        'structures': structures,
+        'bytes_per_ballot_group': (float(total) / nbr_ballot_groups
+              if nbr_ballot_groups else None),
+        }
+  return report
+
+def structure_sizes(tabulation_spec, tabulation):
+  """
+  Get the bytes retained by each data structure of a tabulation
+
+  Arguments
+  ---------
+  tabulation_spec
+    The raw tabulation specification, as read from JSON.
+
+  tabulation
+    An rcv.Tabulation object, typically after it has tabulated.
+
+  Returns
+  -------
+  A dict keyed by the values of STRUCTURE_LIST.
+
+  """
+  seen = set()
+  decimals = []
+  structures = {}
+  for structure, value in (
+        (STRUCTURE_SPEC, tabulation_spec),
+        (STRUCTURE_BALLOTS, tabulation.ballots),
+        (STRUCTURE_PILES, getattr(tabulation, 'ballots_for', {})),
+        (STRUCTURE_TALLIES, getattr(tabulation, 'tallies', {})),
+        (STRUCTURE_STATUSES, getattr(tabulation, 'status', {})),
+        ):
+    structures[structure] = deep_size(value, seen, decimals)
+  structures[STRUCTURE_DECIMALS] = sum([sys.getsizeof(decimal) +
+        deep_size(decimal.__dict__, seen) for decimal in decimals])
+  return structures
+
+def deep_size(value, seen, decimals=None):
+  """
+  Get the bytes used by a value and the objects it refers to
+
+  Arguments
+  ---------
+  value
+    Any value.
+
+  seen
+    A set of the ids of objects already counted, which is updated.
+    Objects in it are not counted again.
+
+  decimals
+    If not None, a list to which Decimal5 instances are appended,
+    instead of being counted.
+    Default value: None
+
+  Returns
+  -------
+  An int number of bytes.
+
+  """
+  total = 0
+  stack = [value]
+  while stack:
+    item = stack.pop()
+    if id(item) in seen:
+      continue
+    if decimals is not None and isinstance(item, K.Decimal):
+      seen.add(id(item))
+      decimals.append(item)
+      continue
+    seen.add(id(item))
+    total += sys.getsizeof(item)
+    if isinstance(item, dict):
+      stack.extend(item.keys())
+      stack.extend(item.values())
+    elif isinstance(item, (list, tuple, set, frozenset)):
+      stack.extend(item)
+    elif hasattr(item, '__dict__'):
+      stack.append(item.__dict__)
+  return total
+
+def _traced_memory():
+  """Get the bytes currently allocated, or 0 if not tracing"""
+  if tracemalloc is None:
+    return 0
+  return tracemalloc.get_traced_memory()[0]
+
+def main(argv=None):
+  """Report the memory use of a tabulation from the command line"""
+  parser = argparse.ArgumentParser(prog='python -m sb1288.bench.memory',
+        description='Report the memory used by an RCV tabulation.')
+  parser.add_argument('input_json',
+        help='JSON file with the tabulation specification')
+  parser.add_argument('output_json', nargs='?', default='',
+        help='file for the JSON report; default is standard output')
+  args = parser.parse_args(argv)
+  report = memory_report(args.input_json)
+  json_str = json.dumps(report, indent=2, sort_keys=True) + '\n'
+  with_json.write_file(args.output_json, with_json.s2u(json_str))
+  return report
+
+if __name__ == '__main__':
+  main()
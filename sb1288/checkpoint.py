@@ -0,0 +1,184 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Save and restore tabulation round states in checkpoint files
+
+A checkpoint file is a gzip-compressed JSON object holding a RoundState
+of an rcv.Tabulation, along with a fingerprint of the validated
+tabulation arguments, so that a checkpoint can not be used to resume a
+different tabulation.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import decimal5
+from sb1288 import errors
+
+import gzip
+import hashlib
+import json
+import os
+import os.path
+
+CHECKPOINT_FORMAT = 'sb1288-checkpoint-1'
+
+def fingerprint(tabulation):
+  """
+  Get a fingerprint of the validated arguments of a tabulation
+
+  Arguments
+  ---------
+  tabulation
+    An rcv.Tabulation object.
+
+  Returns
+  -------
+  A str of hexadecimal digits.
+
+  """
+  digest = hashlib.sha1()
+  digest.update(repr((tabulation.nbr_seats_to_fill, tabulation.candidates,
+        tabulation.max_ranking_levels,
+        sorted(tabulation.tie_breaker.items()),
+        sorted(tabulation.options.items()))).encode('utf-8'))
+  for ballot in tabulation.ballots:
+    digest.update(repr((ballot.get_multiple(), ballot.get_rankings())).
+          encode('utf-8'))
+  return digest.hexdigest()
+
+def write_checkpoint(file_name, tabulation):
+  """
+  Write a checkpoint of a tabulation's current round state
+
+  The checkpoint is first written to a temporary file, which then
+  replaces any existing file, so an interrupted write does not lose an
+  earlier checkpoint.
+
+  Arguments
+  ---------
+  file_name
+    The name of the checkpoint file.
+
+  tabulation
+    An rcv.Tabulation object, between rounds.
+
+  Returns
+  -------
+  The round state that was written, as from get_round_state().
+
+  """
+  round_state = tabulation.get_round_state()
+  cursors = []
+  transfer_values = []
+  for current_index, transfer_value in round_state.ballot_states:
+    cursors.append(current_index)
+    transfer_values.append(decimal5.votes_to_json(transfer_value))
+  checkpoint = {
+        'format': CHECKPOINT_FORMAT,
+        'fingerprint': fingerprint(tabulation),
+        'nbr_round': round_state.nbr_round,
+        'cursors': cursors,
+        'transfer_values': transfer_values,
+        'piles': [[tab_code, list(indexes)]
+              for tab_code, indexes in round_state.piles],
+        'tallies': [[tab_code, [decimal5.votes_to_json(votes)
+              for votes in tally]]
+              for tab_code, tally in round_state.tallies],
+        'statuses': [[candidate, cstatus, nbr_round,
+              decimal5.votes_to_json(votes)]
+              for candidate, cstatus, nbr_round, votes
+              in round_state.statuses],
+        'threshold': (None if round_state.threshold is None
+              else decimal5.votes_to_json(round_state.threshold)),
+        'residual_surplus': decimal5.votes_to_json(
+              round_state.residual_surplus),
+        }
+  json_bytes = json.dumps(checkpoint, separators=(',', ':')).encode('utf-8')
+  temp_file_name = file_name + '.tmp'
+  with gzip.open(temp_file_name, 'wb') as temp_file:
+    temp_file.write(json_bytes)
+  replace_file(temp_file_name, file_name)
+  return round_state
+
+def read_checkpoint(file_name, tabulation):
+  """
+  Read a checkpoint for a tabulation
+
+  Arguments
+  ---------
+  file_name
+    The name of a checkpoint file written by write_checkpoint().
+
+  tabulation
+    The rcv.Tabulation object that is to be resumed.
+
+  Returns
+  -------
+  A tuple of the values for the fields of an rcv.RoundState, in order.
+
+  Raises
+  ------
+  RcvValueError
+    If the file can not be read, is not a checkpoint, for example, is
+    not gzip-compressed or is truncated, or is a checkpoint for a
+    tabulation with different arguments.
+
+  """
+  try:
+    with gzip.open(file_name, 'rb') as checkpoint_file:
+      json_bytes = checkpoint_file.read()
+    checkpoint = json.loads(json_bytes.decode('utf-8'))
+    checkpoint_format = checkpoint['format']
+  except (IOError, OSError, EOFError, ValueError, KeyError,
+        TypeError) as exc:
+    raise errors.RcvValueError('Invalid checkpoint file:', (
+          ('file_name', file_name),
+          ), exc)
+  if checkpoint_format != CHECKPOINT_FORMAT:
+    raise errors.RcvValueError('Unsupported checkpoint format:', (
+          ('file_name', file_name),
+          ('format', checkpoint_format),
+          ))
+  if checkpoint['fingerprint'] != fingerprint(tabulation):
+    raise errors.RcvValueError('Checkpoint does not match the tabulation:', (
+          ('file_name', file_name),
+          ('nbr_round', checkpoint['nbr_round']),
+          ))
+  is_irv = tabulation.is_irv()
+  round_state = (
+        checkpoint['nbr_round'],
+        tuple([(current_index, decimal5.decimal_from_json(transfer_value))
+              for current_index, transfer_value in
+              zip(checkpoint['cursors'], checkpoint['transfer_values'])]),
+        tuple([(_u2s(tab_code), tuple(indexes))
+              for tab_code, indexes in checkpoint['piles']]),
+        tuple([(_u2s(tab_code), tuple([decimal5.votes_from_json(votes,
+              is_irv)
+              for votes in tally]))
+              for tab_code, tally in checkpoint['tallies']]),
+        tuple([(_u2s(candidate), _u2s(cstatus), nbr_round,
+              decimal5.votes_from_json(votes, is_irv))
+              for candidate, cstatus, nbr_round, votes
+              in checkpoint['statuses']]),
+        (None if checkpoint['threshold'] is None
+              else decimal5.decimal_from_json(checkpoint['threshold'])),
+        decimal5.votes_from_json(checkpoint['residual_surplus'],
+              is_irv))
+  return round_state
+
+def _u2s(value):
+  """Convert a unicode value from JSON to a str, for Python 2"""
+  if type(value) != str:
+    value = value.encode('utf-8')
+  return value
+
+def replace_file(source_name, target_name):
+  """Rename a file, replacing any existing target file"""
+  try:
+    os.replace(source_name, target_name)
+  except AttributeError:
+    # Python 2 has no os.replace
+    if os.path.exists(target_name):
+      os.remove(target_name)
+    os.rename(source_name, target_name)
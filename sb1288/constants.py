@@ -27,9 +27,11 @@ OTHER_LABELS_LIST = [
 
 OPTION_STOP_AT_MAJORITY = 'stop_at_majority'
 OPTION_ALTERNATIVE_DEFEATS = 'alternative_defeats'
+OPTION_RANKING_DEPTH = 'ranking_depth'
 OPTION_KEY_SET = set([
       OPTION_STOP_AT_MAJORITY,
       OPTION_ALTERNATIVE_DEFEATS,
+      OPTION_RANKING_DEPTH,
       ])
 OPTION_ALTERNATIVE_DEFEATS_YES = 'Y'
 OPTION_ALTERNATIVE_DEFEATS_NEVER = 'N'
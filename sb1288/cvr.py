@@ -0,0 +1,259 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Tabulate RCV contests from a multi-contest cast vote record file
+
+A cast vote record (CVR) file is a CSV file with a header row and then
+one row per ballot, with columns for the rankings of every contest on
+the ballot.  The file is read once, and the rankings of each ballot are
+aggregated into ballot groups for each contest.  The contests are then
+tabulated across a pool of processes, as for a batch.
+
+The contests are described by a JSON manifest, with the names:
+
+  cvr
+    The name of the CVR file.  A relative name is relative to the
+    directory of the manifest.
+
+  overvote_codes
+    An array of the cell values that mean an overvote.
+    Default value: ["#"]
+
+  skipped_codes
+    An array of the cell values that mean a skipped ranking.  An empty
+    cell is always a skipped ranking.
+    Default value: [""]
+
+  contests
+    An array of objects, one for each contest, each with a unique
+    "name" that is used as a file name without any directory part, a
+    "columns" array of the CVR column names of the rankings, in order,
+    and the names of a tabulation specification for with_json, other
+    than "ballots".  A contest may not be named "index", the name of
+    the summary index file.  The "max_ranking_levels" value defaults to the
+    number of columns.  If "omit_blank_ballots" is true, ballots with
+    no rankings for the contest are omitted rather than being counted
+    as abstentions, as for ballot styles without the contest.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import batch
+from sb1288 import constants as K
+from sb1288 import errors
+from sb1288 import with_json
+
+import argparse
+import csv
+import io
+import json
+import os
+import os.path
+import sys
+
+# Names of a manifest contest that are not part of its tabulation spec
+CONTEST_ONLY_KEY_SET = set(['name', 'columns', 'omit_blank_ballots'])
+
+def read_cvr(manifest, cvr_file=None):
+  """
+  Read a CVR file once, building a tabulation spec for each contest
+
+  Arguments
+  ---------
+  manifest
+    A dict of the manifest, as described for this module, or the name
+    of a JSON manifest file.
+
+  cvr_file
+    If not None, the name of the CVR file, instead of the manifest's
+    "cvr" value.
+    Default value: None
+
+  Returns
+  -------
+  A list of (name, tabulation_spec) pairs, in the order of the
+  manifest's contests.  Each tabulation_spec is a dict that can be
+  given to with_json.tabulate(), with ballot groups sorted by their
+  rankings.
+
+  Raises
+  ------
+  RcvValueError
+    If a contest name is not a plain file name, is the name of the
+    summary index file, or is the name of another contest, or if the
+    manifest names a column that is not in the CVR file.
+
+  """
+  manifest_dir = ''
+  if not isinstance(manifest, dict):
+    manifest_dir = os.path.dirname(manifest)
+    manifest = with_json.read_json(manifest)
+  if cvr_file is None:
+    cvr_file = os.path.join(manifest_dir, with_json.u2s(manifest['cvr']))
+  overvote_codes = set(manifest.get('overvote_codes',
+        [K.RANKING_CODE_OVERVOTE]))
+  skipped_codes = set(manifest.get('skipped_codes', [K.RANKING_CODE_SKIPPED]))
+  skipped_codes.add(K.RANKING_CODE_SKIPPED)
+  contests = manifest['contests']
+  names = set()
+  for contest in contests:
+    name = _check_contest_name(contest['name'])
+    if name in names:
+      raise errors.RcvValueError('Duplicate contest name:', (
+            ('name', name),
+            ))
+    names.add(name)
+  ballot_counts = [{} for contest in contests]
+  with _open_csv(cvr_file) as csv_file:
+    reader = csv.reader(csv_file)
+    header = [_cell(value) for value in next(reader)]
+    column_indexes = []
+    for contest, counts in zip(contests, ballot_counts):
+      indexes = []
+      for column in contest['columns']:
+        column = with_json.u2s(column)
+        if column not in header:
+          raise errors.RcvValueError('CVR column not found:', (
+                ('contest', contest['name']),
+                ('column', column),
+                ('cvr_file', cvr_file),
+                ))
+        indexes.append(header.index(column))
+      column_indexes.append((indexes,
+            bool(contest.get('omit_blank_ballots', False)), counts))
+    for row in reader:
+      if not row:
+        continue
+      for indexes, omit_blank_ballots, counts in column_indexes:
+        rankings = []
+        for ix in indexes:
+          value = _cell(row[ix]) if ix < len(row) else ''
+          if value in overvote_codes:
+            value = K.RANKING_CODE_OVERVOTE
+          elif value in skipped_codes:
+            value = K.RANKING_CODE_SKIPPED
+          rankings.append(value)
+        while rankings and rankings[-1] == K.RANKING_CODE_SKIPPED:
+          rankings.pop()
+        if not rankings and omit_blank_ballots:
+          continue
+        rankings = tuple(rankings)
+        counts[rankings] = counts.get(rankings, 0) + 1
+  named_specs = []
+  for contest, counts in zip(contests, ballot_counts):
+    tabulation_spec = {name: value for name, value in contest.items()
+          if name not in CONTEST_ONLY_KEY_SET}
+    tabulation_spec.setdefault('max_ranking_levels',
+          len(contest['columns']))
+    tabulation_spec.setdefault('options', {})
+    tabulation_spec['ballots'] = [[multiple, list(rankings)]
+          for rankings, multiple in sorted(counts.items())]
+    named_specs.append((with_json.u2s(contest['name']), tabulation_spec))
+  return named_specs
+
+def tabulate_cvr(manifest, output_dir, cvr_file=None, nbr_processes=None,
+      specs_dir=None):
+  """
+  Tabulate every contest of a CVR file
+
+  Arguments
+  ---------
+  manifest, cvr_file
+    As for read_cvr().
+
+  output_dir
+    The directory for the results file of each contest, named for the
+    contest with a .json extension.
+
+  nbr_processes
+    The number of worker processes, as for parallel.map_tasks().
+    Default value: None, for the number of CPUs
+
+  specs_dir
+    If not None, a directory to which the tabulation spec of each
+    contest is written, named for the contest with a .json extension,
+    so that the contest can also be tabulated by with_json.
+    Default value: None
+
+  Returns
+  -------
+  A list of batch.ContestResult values, in the order of the manifest's
+  contests.
+
+  """
+  contests = []
+  for name, tabulation_spec in read_cvr(manifest, cvr_file):
+    if specs_dir is not None:
+      with_json.write_file(os.path.join(specs_dir, name + '.json'),
+            with_json.s2u(json.dumps(tabulation_spec, indent=2) + '\n'))
+    contests.append(batch.Contest(name, tabulation_spec,
+          os.path.join(output_dir, name + '.json'),
+          len(tabulation_spec['ballots'])))
+  return batch.tabulate_batch(contests, nbr_processes)
+
+def _check_contest_name(name):
+  """
+  Check that a contest name can be used as a file name in a directory
+
+  Returns
+  -------
+  The name, as a str.
+
+  Raises
+  ------
+  RcvValueError
+    If the name is empty, is a relative directory name, or has a
+    directory separator or a null character, so that a file named for
+    the contest could be outside of its directory, or if a file named
+    for the contest would be the summary index file.
+
+  """
+  name = with_json.u2s(name)
+  if (name in ('', '.', '..') or
+        any([separator in name for separator in ('/', '\\', '\0')]) or
+        name + '.json' == batch.INDEX_FILE_NAME):
+    raise errors.RcvValueError('Invalid contest name:', (
+          ('name', name),
+          ))
+  return name
+
+def _open_csv(file_name):
+  """Open a CSV file for reading, as the csv module requires"""
+  if sys.version_info[0] < 3:
+    return open(file_name, 'rb')
+  return io.open(file_name, 'r', encoding='utf-8', newline='')
+
+def _cell(value):
+  """Get a cell value as a stripped str"""
+  if type(value) != str:
+    value = value.encode('utf-8')
+  return value.strip()
+
+def main(argv=None):
+  """Tabulate the contests of a CVR file from the command line"""
+  parser = argparse.ArgumentParser(prog='python -m sb1288.cvr',
+        description='Tabulate RCV contests from a multi-contest CVR file.')
+  parser.add_argument('manifest_json',
+        help='JSON manifest of the CVR file and its contests')
+  parser.add_argument('output_dir',
+        help='directory for results files and the summary index')
+  parser.add_argument('--cvr',
+        help='CVR file to read instead of the one named by the manifest')
+  parser.add_argument('--processes', type=int, default=None,
+        help='number of worker processes; default is the number of CPUs')
+  parser.add_argument('--specs-dir',
+        help='directory in which to write the tabulation spec of each '
+              'contest')
+  args = parser.parse_args(argv)
+  for directory in (args.output_dir, args.specs_dir):
+    if directory is not None and not os.path.isdir(directory):
+      os.makedirs(directory)
+  results = tabulate_cvr(args.manifest_json, args.output_dir, args.cvr,
+        args.processes, args.specs_dir)
+  with_json.write_file(os.path.join(args.output_dir, batch.INDEX_FILE_NAME),
+        with_json.s2u(batch.batch_to_json(results)))
+  return results
+
+if __name__ == '__main__':
+  main()
@@ -230,6 +230,22 @@ class Decimal5Total(Decimal5):
     return self
 
 
+def votes_to_json(votes):
+  """Convert votes to an int, using the internal value of a Decimal5"""
+  if isinstance(votes, Decimal5):
+    return votes._get_value()
+  return votes
+
+def decimal_from_json(value):
+  """Convert an internal Decimal5 value from JSON to a Decimal5"""
+  result = Decimal5()
+  result._value_as_integer = value
+  return result
+
+def votes_from_json(value, is_irv):
+  """Convert votes from JSON, according to the kind of tabulation"""
+  return value if is_irv else decimal_from_json(value)
+
 def _confirm_types(value, *required_types):
   """Raise an Decimal5Error if value is not an instance of the
   required type
@@ -0,0 +1,662 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Tabulate an RCV contest with its ballot groups sharded across workers
+
+The ballot groups of a contest are divided among shard workers, each of
+which keeps the piles of its own ballot groups.  A coordinator, a
+DistributedTabulation, runs the usual rounds of an rcv.Tabulation: in
+each round it asks every worker for the partial vote totals of its
+piles, adds them, makes the elect, defeat, and surplus decisions with
+the usual rules, and sends the decisions back to the workers, which
+then transfer their own ballots.  The ballot groups are sent to the
+workers once, when the tabulation starts; after that, only per-round
+totals and decisions are exchanged.  Vote totals are added exactly, so
+the results are the same as those of an rcv.Tabulation.
+
+Workers are reached through TCP sockets and exchange one line of JSON
+per message.  A worker is run with:
+
+  python -m sb1288.distributed --host 0.0.0.0 --port 8289
+
+For testing, LocalWorkers starts workers in local processes.
+
+On a single host with several CPUs, a ShardedTabulation runs its
+workers in child processes, reached through pipes, so that assigning
+and transferring ballots uses all of the CPUs.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import ballot
+from sb1288 import constants as K
+from sb1288 import decimal5
+from sb1288 import errors
+from sb1288 import rcv
+
+import argparse
+import json
+import multiprocessing
+import socket
+
+try:
+  from socketserver import StreamRequestHandler, ThreadingTCPServer
+except ImportError:
+  # Python 2
+  from SocketServer import StreamRequestHandler, ThreadingTCPServer
+
+DEFAULT_PORT = 8289
+
+OP_LOAD = 'load'
+OP_ASSIGN = 'assign'
+OP_TALLY = 'tally'
+OP_TRANSFER_DEFEATED = 'transfer_defeated'
+OP_TRANSFER_SURPLUS = 'transfer_surplus'
+OP_GET_STATE = 'get_state'
+OP_SET_STATE = 'set_state'
+OP_LIST = [
+      OP_LOAD,
+      OP_ASSIGN,
+      OP_TALLY,
+      OP_TRANSFER_DEFEATED,
+      OP_TRANSFER_SURPLUS,
+      OP_GET_STATE,
+      OP_SET_STATE,
+      ]
+
+
+def tabulate(nbr_seats_to_fill, candidates, ballots,
+      max_ranking_levels, tie_breaker, options={}, observer=None,
+      workers=()):
+  """
+  Tabulate an RCV contest with shard workers
+
+  Arguments
+  ---------
+  The same as for DistributedTabulation().
+
+  Returns
+  -------
+  The same as rcv.tabulate().
+
+  """
+  tabulation = DistributedTabulation(nbr_seats_to_fill, candidates,
+        ballots, max_ranking_levels, tie_breaker, options, observer, workers)
+  try:
+    return tabulation.tabulate()
+  finally:
+    tabulation.close()
+
+
+class DistributedTabulation(rcv.Tabulation):
+  """
+  A tabulation that coordinates shard workers
+
+  The tabulate(), resume(), and iter_rounds() methods, and their
+  keyword arguments, are the same as for rcv.Tabulation.  The
+  connections to the workers are made when a tabulation starts and are
+  kept until the close() method is called.
+
+  """
+
+  def __init__(self, nbr_seats_to_fill, candidates, ballots,
+        max_ranking_levels, tie_breaker, options={}, observer=None,
+        workers=()):
+    """
+    Initialize a tabulation with shard workers
+
+    Arguments
+    ---------
+    The same as for rcv.Tabulation(), plus:
+
+    workers
+      A list of (host, port) addresses of shard workers.  The ballot
+      groups are divided evenly among them.
+
+    Raises
+    ------
+    The same as for rcv.Tabulation(), plus RcvValueError if there are
+    no workers or if ballot groups have precincts, which are not
+    supported.
+
+    """
+    rcv.Tabulation.__init__(self, nbr_seats_to_fill, candidates, ballots,
+          max_ranking_levels, tie_breaker, options, observer)
+    self.workers = list(workers)
+    if not self.workers:
+      raise errors.RcvValueError('No shard workers:', (
+            ('workers', workers),
+            ))
+    if self.precincts is not None:
+      raise errors.RcvValueError(
+            'Precincts are not supported with shard workers:', (
+            ('len(precincts)', len(self.precincts)),
+            ))
+    self.connections = None
+
+  def open_connections(self):
+    """Get a connection to each worker"""
+    return [connect(address) for address in self.workers]
+
+  def close(self):
+    """Close any connections to the workers"""
+    if self.connections is not None:
+      for connection in self.connections:
+        connection.close()
+      self.connections = None
+
+  def exchange(self, messages):
+    """
+    Send a message to each worker, then get a reply from each
+
+    Arguments
+    ---------
+    messages
+      A list of messages, one for each worker, in order.
+
+    Returns
+    -------
+    A list of the replies, in the same order.
+
+    Raises
+    ------
+    RcvImplementationError
+      If a worker reports an error or closes its connection.
+
+    """
+    for connection, message in zip(self.connections, messages):
+      connection.send(message)
+    replies = []
+    for ix, (connection, message) in enumerate(
+          zip(self.connections, messages)):
+      reply = connection.receive()
+      if reply is None or 'error' in reply:
+        raise errors.RcvImplementationError('Shard worker error:', (
+              ('worker', self.workers[ix]),
+              ('op', message['op']),
+              ('error', 'connection closed' if reply is None
+                    else reply['error']),
+              ))
+      replies.append(reply)
+    return replies
+
+  def broadcast(self, message):
+    """Send the same message to each worker and get their replies"""
+    return self.exchange([message] * len(self.connections))
+
+  def _tabulate_setup(self):
+    """
+    Create instance values, and load each worker's ballot groups
+    """
+    rcv.Tabulation._tabulate_setup(self)
+    if self.connections is None:
+      self.connections = self.open_connections()
+    nbr_shards = len(self.connections)
+    self.exchange([{
+          'op': OP_LOAD,
+          'is_irv': self.is_irv(),
+          'max_ranking_levels': self.max_ranking_levels,
+          'ranking_depth': self.options.get(K.OPTION_RANKING_DEPTH),
+          'tab_codes': list(self.tallies),
+          'first_index': ix,
+          'index_step': nbr_shards,
+          'ballots': [[ballot_group.get_multiple(),
+                list(ballot_group.get_rankings())]
+                for ballot_group in self.ballots[ix::nbr_shards]],
+          } for ix in range(nbr_shards)])
+
+  def assign_ballots(self, ballot_list):
+    """
+    Have each worker assign all of its ballot groups
+
+    Ballots are otherwise assigned by the workers as part of a transfer,
+    so only the initial assignment of all ballots is supported here.
+
+    """
+    if ballot_list is not self.ballots:
+      raise errors.RcvImplementationError(
+            'Only all ballots can be assigned by a coordinator.', (
+            ('round', self.nbr_round),
+            ))
+    self.broadcast({'op': OP_ASSIGN, 'continuing': list(self.continuing())})
+
+  def tally_piles(self, tab_codes):
+    """
+    Add the workers' vote totals for tabulation codes
+    """
+    tab_codes = list(tab_codes)
+    result = {tab_code: self.zero_votes() for tab_code in tab_codes}
+    for reply in self.broadcast({'op': OP_TALLY, 'tab_codes': tab_codes}):
+      for tab_code in tab_codes:
+        result[tab_code] += decimal5.votes_from_json(
+              reply['votes'][tab_code], self.is_irv())
+    return result
+
+  def transfer_from_defeated(self, defeated):
+    """
+    Have the workers transfer ballots from defeated candidates
+    """
+    self.broadcast({'op': OP_TRANSFER_DEFEATED, 'defeated': list(defeated),
+          'continuing': list(self.continuing())})
+
+  def transfer_pile_surplus(self, candidate, surplus_factor):
+    """
+    Have the workers transfer an elected candidate's ballots
+
+    Returns
+    -------
+    The total votes of the transferred ballots, at their new values.
+
+    """
+    transferred_votes = K.ZERO
+    for reply in self.broadcast({'op': OP_TRANSFER_SURPLUS,
+          'candidate': candidate,
+          'surplus_factor': decimal5.votes_to_json(surplus_factor),
+          'continuing': list(self.continuing())}):
+      transferred_votes += decimal5.decimal_from_json(reply['votes'])
+    return transferred_votes
+
+  def get_round_state(self):
+    """
+    Get an immutable RoundState of the tabulation from the workers
+
+    The ballot states and piles of all workers are collected, so this
+    is relatively slow.
+
+    """
+    ballot_states = [None] * len(self.ballots)
+    piles = {tab_code: [] for tab_code in self.tallies}
+    for reply in self.broadcast({'op': OP_GET_STATE}):
+      for ix, current_index, transfer_value in reply['ballot_states']:
+        ballot_states[ix] = (current_index,
+              decimal5.decimal_from_json(transfer_value))
+      for tab_code in piles:
+        piles[tab_code].extend(reply['piles'][tab_code])
+    round_state = rcv.RoundState(
+          self.nbr_round,
+          tuple(ballot_states),
+          tuple([(tab_code, tuple(piles[tab_code]))
+                for tab_code in self.tallies]),
+          tuple([(tab_code, tuple(votes))
+                for tab_code, votes in self.tallies.items()]),
+          tuple([(candidate, cstatus.status, cstatus.nbr_round,
+                cstatus.votes)
+                for candidate, cstatus in self.status.items()]),
+          self.threshold,
+          self.total_residual_surplus)
+    return round_state
+
+  def set_round_state(self, round_state):
+    """
+    Restore a RoundState, sending each worker its part of the state
+    """
+    rcv.Tabulation.set_round_state(self, round_state)
+    self.ballots_for = {tab_code: [] for tab_code in self.tallies}
+    nbr_shards = len(self.connections)
+    self.exchange([{
+          'op': OP_SET_STATE,
+          'ballot_states': [[current_index,
+                decimal5.votes_to_json(transfer_value)]
+                for current_index, transfer_value
+                in round_state.ballot_states[ix::nbr_shards]],
+          'piles': {tab_code: [index for index in indexes
+                if index % nbr_shards == ix]
+                for tab_code, indexes in round_state.piles},
+          } for ix in range(nbr_shards)])
+
+
+def tabulate_sharded(nbr_seats_to_fill, candidates, ballots,
+      max_ranking_levels, tie_breaker, options={}, observer=None,
+      nbr_processes=None):
+  """
+  Tabulate an RCV contest with shards in local worker processes
+
+  Arguments
+  ---------
+  The same as for ShardedTabulation().
+
+  Returns
+  -------
+  The same as rcv.tabulate().
+
+  """
+  tabulation = ShardedTabulation(nbr_seats_to_fill, candidates, ballots,
+        max_ranking_levels, tie_breaker, options, observer, nbr_processes)
+  try:
+    return tabulation.tabulate()
+  finally:
+    tabulation.close()
+
+
+class ShardedTabulation(DistributedTabulation):
+  """
+  A tabulation with shards in local worker processes
+
+  The worker processes are started when a tabulation starts and are
+  stopped by the close() method.  Messages to them are sent through
+  pipes, without conversion to JSON.
+
+  """
+
+  def __init__(self, nbr_seats_to_fill, candidates, ballots,
+        max_ranking_levels, tie_breaker, options={}, observer=None,
+        nbr_processes=None):
+    """
+    Initialize a tabulation with shards in local worker processes
+
+    Arguments
+    ---------
+    The same as for rcv.Tabulation(), plus:
+
+    nbr_processes
+      The number of worker processes.  If None, the number of CPUs.
+      Default value: None
+
+    Raises
+    ------
+    The same as for rcv.Tabulation(), plus RcvValueError if the number
+    of processes is less than one.
+
+    """
+    if nbr_processes is None:
+      nbr_processes = multiprocessing.cpu_count()
+    DistributedTabulation.__init__(self, nbr_seats_to_fill, candidates,
+          ballots, max_ranking_levels, tie_breaker, options, observer,
+          ['process {}'.format(ix + 1) for ix in range(nbr_processes)])
+    self.processes = []
+
+  def open_connections(self):
+    """Start the worker processes and get a pipe to each"""
+    connections = []
+    for worker in self.workers:
+      parent_end, child_end = multiprocessing.Pipe()
+      process = multiprocessing.Process(target=_run_pipe_worker,
+            args=(child_end,))
+      process.daemon = True
+      process.start()
+      child_end.close()
+      self.processes.append(process)
+      connections.append(PipeConnection(parent_end))
+    return connections
+
+  def close(self):
+    """Close the pipes and stop the worker processes"""
+    DistributedTabulation.close(self)
+    for process in self.processes:
+      process.terminate()
+    for process in self.processes:
+      process.join()
+    self.processes = []
+
+
+class Shard(object):
+  """
+  The ballot groups and piles of one shard of a tabulation
+
+  A shard handles the messages from a DistributedTabulation.  Ballot
+  groups are identified to the coordinator by their index in the whole
+  tabulation: the shard's ballot groups are those with indexes of
+  first_index, first_index + index_step, and so on.
+
+  """
+
+  def __init__(self):
+    self.is_irv = True
+    self.max_ranking_levels = None
+    self.first_index = 0
+    self.index_step = 1
+    self.ballots = []
+    self.piles = {}
+
+  def handle(self, message):
+    """
+    Handle a message from the coordinator
+
+    Returns
+    -------
+    A reply message, which has an 'error' value if the message could
+    not be handled.
+
+    """
+    try:
+      op = message['op']
+      if op not in OP_LIST:
+        raise ValueError('Unknown op: {}'.format(op))
+      return getattr(self, 'op_' + op)(message)
+    except Exception as exc:
+      return {'error': '{}: {}'.format(type(exc).__name__, exc)}
+
+  def op_load(self, message):
+    """Replace the shard's ballot groups"""
+    self.is_irv = message['is_irv']
+    self.max_ranking_levels = message['max_ranking_levels']
+    self.first_index = message['first_index']
+    self.index_step = message['index_step']
+    self.ballots = [ballot.Ballot(multiple, tuple(rankings),
+          ranking_depth=message.get('ranking_depth'))
+          for multiple, rankings in message['ballots']]
+    self.piles = {tab_code: [] for tab_code in message['tab_codes']}
+    return {}
+
+  def op_assign(self, message):
+    """Assign all ballot groups to their highest ranked candidates"""
+    self.assign(self.ballots, set(message['continuing']))
+    return {}
+
+  def op_tally(self, message):
+    """Get the vote totals of piles"""
+    zero_votes = 0 if self.is_irv else K.ZERO
+    return {'votes': {tab_code: decimal5.votes_to_json(sum([
+          self.ballot_votes(ballot_group)
+          for ballot_group in self.piles[tab_code]], zero_votes))
+          for tab_code in message['tab_codes']}}
+
+  def op_transfer_defeated(self, message):
+    """Transfer the ballot groups of defeated candidates"""
+    continuing = set(message['continuing'])
+    for candidate in message['defeated']:
+      self.assign(self.piles[candidate], continuing)
+      self.piles[candidate] = []
+    return {}
+
+  def op_transfer_surplus(self, message):
+    """Transfer an elected candidate's ballot groups at reduced value"""
+    candidate = message['candidate']
+    surplus_factor = decimal5.decimal_from_json(message['surplus_factor'])
+    transferred_votes = K.ZERO
+    for ballot_group in self.piles[candidate]:
+      ballot_group.update_transfer_value(surplus_factor)
+      transferred_votes += ballot_group.total_votes()
+    self.assign(self.piles[candidate], set(message['continuing']))
+    self.piles[candidate] = []
+    return {'votes': decimal5.votes_to_json(transferred_votes)}
+
+  def op_get_state(self, message):
+    """Get the states of the ballot groups and the piles"""
+    indexes = {id(ballot_group): self.first_index + ix * self.index_step
+          for ix, ballot_group in enumerate(self.ballots)}
+    ballot_states = []
+    for ballot_group in self.ballots:
+      current_index, transfer_value = ballot_group.get_state()
+      ballot_states.append([indexes[id(ballot_group)], current_index,
+            decimal5.votes_to_json(transfer_value)])
+    return {
+          'ballot_states': ballot_states,
+          'piles': {tab_code: [indexes[id(ballot_group)]
+                for ballot_group in pile]
+                for tab_code, pile in self.piles.items()},
+          }
+
+  def op_set_state(self, message):
+    """Restore the states of the ballot groups and the piles"""
+    for ballot_group, (current_index, transfer_value) in zip(self.ballots,
+          message['ballot_states']):
+      ballot_group.set_state((current_index,
+            decimal5.decimal_from_json(transfer_value)))
+    self.piles = {tab_code: [self.ballots[
+          (index - self.first_index) // self.index_step]
+          for index in indexes]
+          for tab_code, indexes in message['piles'].items()}
+    return {}
+
+  def assign(self, ballot_list, continuing):
+    """Assign ballot groups to their highest ranked continuing candidate"""
+    for ballot_group in ballot_list:
+      self.piles[ballot_group.get_hrcc(continuing,
+            self.max_ranking_levels)].append(ballot_group)
+
+  def ballot_votes(self, ballot_group):
+    return (ballot_group.get_multiple() if self.is_irv
+          else ballot_group.total_votes())
+
+
+class SocketConnection(object):
+  """Exchange JSON messages, one per line, through a socket"""
+
+  def __init__(self, sock):
+    self.socket = sock
+    self.reader = sock.makefile('rb')
+
+  def send(self, message):
+    self.socket.sendall(json.dumps(message, separators=(',', ':')).
+          encode('utf-8') + b'\n')
+
+  def receive(self):
+    """Get the next message, or None if the connection is closed"""
+    line = self.reader.readline()
+    if not line:
+      return None
+    return json.loads(line.decode('utf-8'))
+
+  def close(self):
+    self.reader.close()
+    self.socket.close()
+
+class PipeConnection(object):
+  """Exchange messages through a multiprocessing pipe"""
+
+  def __init__(self, pipe_end):
+    self.pipe_end = pipe_end
+
+  def send(self, message):
+    self.pipe_end.send(message)
+
+  def receive(self):
+    """Get the next message, or None if the connection is closed"""
+    try:
+      return self.pipe_end.recv()
+    except EOFError:
+      return None
+
+  def close(self):
+    self.pipe_end.close()
+
+def connect(address):
+  """Get a SocketConnection to the worker at a (host, port) address"""
+  sock = socket.create_connection(tuple(address))
+  sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+  return SocketConnection(sock)
+
+def serve_connection(connection):
+  """Handle messages for a new Shard until the connection is closed"""
+  shard = Shard()
+  while True:
+    message = connection.receive()
+    if message is None:
+      break
+    connection.send(shard.handle(message))
+
+
+class ShardServer(ThreadingTCPServer):
+  """A TCP server with a separate shard for each connection"""
+  allow_reuse_address = True
+  daemon_threads = True
+
+
+class ShardHandler(StreamRequestHandler):
+  """Serve the shard of one coordinator's connection"""
+
+  def handle(self):
+    self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    serve_connection(SocketConnection(self.request))
+
+
+def make_server(host='127.0.0.1', port=DEFAULT_PORT):
+  """
+  Make a shard worker server
+
+  Returns
+  -------
+  A ShardServer, which serves coordinators when its serve_forever()
+  method is called.  If the port is 0, a free port is chosen, which is
+  given by the server's server_address attribute.
+
+  """
+  return ShardServer((host, port), ShardHandler)
+
+
+class LocalWorkers(object):
+  """
+  Shard workers in local processes, for testing
+
+  Attributes
+  ----------
+  addresses
+    A list of the (host, port) addresses of the workers, for the
+    workers argument of a DistributedTabulation.
+
+  """
+
+  def __init__(self, nbr_workers):
+    """Start the worker processes, listening on the loopback address"""
+    self.processes = []
+    self.addresses = []
+    for ix in range(nbr_workers):
+      parent_end, child_end = multiprocessing.Pipe()
+      process = multiprocessing.Process(target=_run_local_worker,
+            args=(child_end,))
+      process.daemon = True
+      process.start()
+      self.processes.append(process)
+      self.addresses.append(('127.0.0.1', parent_end.recv()))
+      parent_end.close()
+
+  def close(self):
+    """Stop the worker processes"""
+    for process in self.processes:
+      process.terminate()
+    for process in self.processes:
+      process.join()
+    self.processes = []
+
+def _run_local_worker(pipe_end):
+  """Serve on a free loopback port, sending the port number to the pipe"""
+  server = make_server('127.0.0.1', 0)
+  pipe_end.send(server.server_address[1])
+  pipe_end.close()
+  server.serve_forever()
+
+def _run_pipe_worker(pipe_end):
+  """Serve a shard through a pipe until it is closed"""
+  serve_connection(PipeConnection(pipe_end))
+
+def main(argv=None):
+  """Run a shard worker from the command line"""
+  parser = argparse.ArgumentParser(prog='python -m sb1288.distributed',
+        description='Run a shard worker for distributed RCV tabulations.')
+  parser.add_argument('--host', default='127.0.0.1',
+        help='address to listen on; default is 127.0.0.1')
+  parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+        help='port to listen on; default is 8289')
+  args = parser.parse_args(argv)
+  server = make_server(args.host, args.port)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+
+if __name__ == '__main__':
+  main()
@@ -109,6 +109,42 @@ class RcvImplementationError(_RcvError):
     return str(self.base_exception_description)
 
 
+class RcvCancelledError(_RcvError):
+  """An exception for a tabulation stopped before it finished
+
+  Raised when a tabulation's cancellation token is set or its deadline
+  passes.  Neither RcvValueError nor RcvImplementationError is a base
+  class of this class.
+
+  """
+
+  def __init__(self, message, other_values=[], round_state=None,
+        nbr_round=0):
+    """Initialize with a base message, other values, a round state, and
+    the number of the last round that finished
+
+    See base class for a description of the message and other_values
+    arguments.
+
+    round_state
+    An rcv.RoundState from which the tabulation can be resumed, or None.
+    If the tabulation stopped between rounds, it is the state at the end
+    of the last round that finished.  If it stopped within a round, it
+    is the state of its latest checkpoint or of the round it was resumed
+    from, which can be an earlier round, or None if there is neither.
+    Default value: None
+
+    nbr_round
+    The number of the last round that finished, or 0 if none finished,
+    even if round_state is None or is for an earlier round.
+    Default value: 0
+
+    """
+    _RcvError.__init__(self, message, other_values)
+    self.round_state = round_state
+    self.nbr_round = nbr_round
+
+
 def describe_exc(exc):
   """Create a multi-line description of an exception and its traceback"""
   parts = []
@@ -0,0 +1,254 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Tabulate again, incrementally, as batches of ballots change
+
+During a canvass, batches of ballots are added day by day, and a batch
+is sometimes retracted to be rescanned.  An IncrementalTabulation keeps
+the ballot groups of each batch and the results of its last
+tabulation.  For IRV, when batches change, only the changed ballot
+groups are counted again: each is routed to its highest ranked
+continuing candidate in each earlier round, adjusting that round's
+tally.  The recorded elect and defeat decisions are then checked, round
+by round, against the adjusted tallies.  If every decision stands, the
+adjusted tallies are the new results.  Otherwise, the tabulation is
+resumed from the end of the round before the first decision that
+changes, using all of the ballots.
+
+For STV, transfer values depend on every ballot in a pile, so each
+tabulation counts all of the ballots again.
+
+Either way, the results are the same as those of rcv.tabulate() with
+the ballot groups of all current batches.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import constants as K
+from sb1288 import errors
+from sb1288 import rcv
+from sb1288 import validate
+
+import collections
+
+
+class IncrementalTabulation(object):
+  """
+  A tabulation of batches of ballots that can be added or retracted
+
+  Attributes
+  ----------
+  batches
+    An OrderedDict of the validated ballot groups of each batch, keyed
+    by batch ID, in the order the batches were added.
+
+  recount_round
+    After the tabulate() method, None if the last tabulation only
+    counted changed ballot groups, otherwise the number of the first
+    round in which all ballots were counted.
+
+  """
+
+  def __init__(self, nbr_seats_to_fill, candidates, max_ranking_levels,
+        tie_breaker, options={}):
+    """
+    Initialize an incremental tabulation without any batches
+
+    Arguments
+    ---------
+    The same as for rcv.Tabulation(), without ballots or an observer.
+
+    Raises
+    ------
+    RcvValueError
+      If an argument does not pass validation checks.
+
+    """
+    self.args = (nbr_seats_to_fill, candidates, max_ranking_levels,
+          tie_breaker, options)
+    validated = rcv.Tabulation(nbr_seats_to_fill, candidates, (),
+          max_ranking_levels, tie_breaker, options)
+    self.candidates = validated.candidates
+    self.max_ranking_levels = validated.max_ranking_levels
+    self.ranking_depth = validated.options.get(K.OPTION_RANKING_DEPTH)
+    self.is_irv = validated.is_irv()
+    self.batches = collections.OrderedDict()
+    self.changes = []
+    self.results = None
+    self.recount_round = None
+
+  def add_batch(self, batch_id, ballots):
+    """
+    Add a batch of ballot groups
+
+    Arguments
+    ---------
+    batch_id
+      A key that identifies the batch.
+
+    ballots
+      The ballot groups of the batch, as for rcv.Tabulation().
+
+    Raises
+    ------
+    RcvValueError
+      If a batch with the same ID has already been added, or if the
+      ballots do not pass validation checks.
+
+    """
+    if batch_id in self.batches:
+      raise errors.RcvValueError('Ballot batch already added:', (
+            ('batch_id', batch_id),
+            ))
+    ballot_groups = validate.ballots(ballots, self.candidates,
+          self.max_ranking_levels)
+    for ballot_group in ballot_groups:
+      ballot_group.set_ranking_depth(self.ranking_depth)
+    self.batches[batch_id] = ballot_groups
+    self.changes.append((1, ballot_groups))
+
+  def retract_batch(self, batch_id):
+    """
+    Retract a batch of ballot groups that was added
+
+    Raises
+    ------
+    RcvValueError
+      If there is no batch with the ID.
+
+    """
+    if batch_id not in self.batches:
+      raise errors.RcvValueError('Unknown ballot batch:', (
+            ('batch_id', batch_id),
+            ))
+    self.changes.append((-1, self.batches.pop(batch_id)))
+
+  def ballots(self):
+    """Get a tuple of the ballot groups of all batches"""
+    return tuple([ballot_group for ballot_groups in self.batches.values()
+          for ballot_group in ballot_groups])
+
+  def new_tabulation(self):
+    """Get an rcv.Tabulation of the ballot groups of all batches"""
+    (nbr_seats_to_fill, candidates, max_ranking_levels, tie_breaker,
+          options) = self.args
+    return rcv.Tabulation(nbr_seats_to_fill, candidates, self.ballots(),
+          max_ranking_levels, tie_breaker, options)
+
+  def tabulate(self):
+    """
+    Tabulate the ballot groups of all batches
+
+    Returns
+    -------
+    The same as rcv.tabulate() with the ballot groups of all batches.
+
+    Raises
+    ------
+    The same as rcv.tabulate().
+
+    """
+    if self.results is None or not self.is_irv:
+      self.results = self.new_tabulation().tabulate()
+      self.recount_round = 1
+    elif self.changes:
+      self.results = self._update_irv()
+    self.changes = []
+    return self.results
+
+  def _update_irv(self):
+    """
+    Get the IRV results after changes, counting as little as possible
+
+    This method is for internal use only.
+
+    """
+    elected, status, tallies = self.results
+    nbr_rounds = max([len(votes) for votes in tallies.values()])
+    round_tallies = [{tab_code: votes[ix]
+          for tab_code, votes in tallies.items() if len(votes) > ix}
+          for ix in range(nbr_rounds)]
+    continuing_by_round = [set([candidate for candidate in self.candidates
+          if candidate in round_tally]) for round_tally in round_tallies]
+    for sign, ballot_groups in self.changes:
+      for ballot_group in ballot_groups:
+        ballot_group = ballot_group.copy()
+        for round_tally, continuing in zip(round_tallies,
+              continuing_by_round):
+          round_tally[ballot_group.get_hrcc(continuing,
+                self.max_ranking_levels)] += sign * ballot_group.get_multiple()
+    (nbr_seats_to_fill, candidates, max_ranking_levels, tie_breaker,
+          options) = self.args
+    replay = _ReplayTabulation(nbr_seats_to_fill, candidates, (),
+          max_ranking_levels, tie_breaker, options)
+    replay.round_tallies = round_tallies
+    statuses = []
+    for round_result in replay.iter_rounds():
+      nbr_round = round_result.nbr_round
+      decisions = [frozenset([candidate
+            for candidate, cstatus in status.items()
+            if cstatus.status == status_code and
+            cstatus.nbr_round == nbr_round])
+            for status_code in (K.STATUS_ELECTED, K.STATUS_DEFEATED)]
+      if [round_result.elected, round_result.defeated] != decisions:
+        return self._recount(nbr_round, round_tallies,
+              continuing_by_round, statuses)
+      statuses.append(tuple([(candidate, cstatus.status, cstatus.nbr_round,
+            cstatus.votes) for candidate, cstatus in replay.status.items()]))
+    self.recount_round = None
+    return replay.elected(), replay.status, replay.tallies
+
+  def _recount(self, nbr_round, round_tallies, continuing_by_round,
+        statuses):
+    """
+    Tabulate all ballots, starting from a round
+
+    This method is for internal use only.
+
+    """
+    self.recount_round = nbr_round
+    tabulation = self.new_tabulation()
+    if nbr_round == 1:
+      return tabulation.tabulate()
+    tab_codes = list(round_tallies[0])
+    piles = {tab_code: [] for tab_code in tab_codes}
+    ballot_states = []
+    for ix, ballot_group in enumerate(tabulation.ballots):
+      piles[ballot_group.get_hrcc(continuing_by_round[nbr_round - 1],
+            self.max_ranking_levels)].append(ix)
+      ballot_states.append(ballot_group.get_state())
+    round_state = rcv.RoundState(
+          nbr_round - 1,
+          tuple(ballot_states),
+          tuple([(tab_code, tuple(piles[tab_code]))
+                for tab_code in tab_codes]),
+          tuple([(tab_code, tuple([round_tally[tab_code]
+                for round_tally in round_tallies[:nbr_round - 1]
+                if tab_code in round_tally]))
+                for tab_code in tab_codes]),
+          statuses[nbr_round - 2],
+          None,
+          0)
+    return tabulation.resume(round_state)
+
+
+class _ReplayTabulation(rcv.Tabulation):
+  """
+  Make the decisions of an IRV tabulation from given round tallies
+
+  The round_tallies attribute must be set to a list of dicts of the
+  vote totals of each round, keyed by tabulation code.  Ballots are not
+  assigned or transferred.
+
+  """
+
+  def tally_piles(self, tab_codes):
+    round_tally = self.round_tallies[self.nbr_round - 1]
+    return {tab_code: round_tally[tab_code] for tab_code in tab_codes}
+
+  def assign_ballots(self, ballot_list):
+    pass
+
+  def transfer_from_defeated(self, defeated):
+    pass
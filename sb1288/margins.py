@@ -0,0 +1,303 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Margins of an IRV tabulation, for planning risk-limiting audits
+
+The margin of victory is the smallest number of ballots that, if their
+rankings were changed, would change the winner.  It is not computed
+exactly here, but is bounded:
+
+  * An upper bound comes from the last round between two finalists:
+    if more than half of the difference between their votes is moved
+    from the winner's ballots to the runner-up, by swapping the two in
+    the rankings, either the winner is defeated in an earlier round, or
+    the runner-up wins the last round.
+
+  * A lower bound comes from elimination orders.  Changing one ballot
+    changes the difference between the votes of two candidates by at
+    most two.  So for a candidate to be defeated when a set of
+    candidates is continuing, at least half the difference between its
+    votes and the fewest votes of another continuing candidate must be
+    changed, and an elimination order needs at least the most that any
+    of its defeats needs.  The winner loses only if it is defeated in
+    some elimination order, so the lower bound is the least, over sets
+    of continuing candidates that include the winner, of what the
+    cheapest elimination order to that set needs, plus what the
+    winner's defeat then needs.
+
+The sets of continuing candidates are searched in order of increasing
+need, and a set is not searched if it needs at least the best bound
+found.  Trailing candidates whose total votes are far enough below the
+next candidate are defeated together, as with alternative defeats,
+since no order that defeats another candidate first can need fewer
+changes than the best bound.  If the search is stopped at max_sets
+sets, the lower bound is still valid, but it might be smaller.
+
+Ties are assumed to be resolved against the winner, so the lower bound
+allows for them.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import constants as K
+from sb1288 import errors
+from sb1288 import rounds
+
+import collections
+import heapq
+
+# The default maximum number of sets of continuing candidates searched
+MAX_SETS = 2000
+
+MarginAnalysis = collections.namedtuple('MarginAnalysis', [
+      'winner', 'round_margins', 'last_round_margin', 'lower_bound',
+      'upper_bound', 'nbr_sets', 'is_complete'])
+MarginAnalysis.__doc__ = """
+The margins of an IRV tabulation, as from analyze()
+
+Attributes
+----------
+winner
+  The elected candidate.
+
+round_margins
+  A tuple with a pair for each round in which candidates were defeated
+  without electing the winner, of the round number and the votes of
+  the continuing candidate with the fewest votes that was not defeated,
+  less the total votes of the defeated candidates.
+
+last_round_margin
+  The votes of the winner, less the most votes of another continuing
+  candidate, in the last round, or None if there was only one
+  candidate.
+
+lower_bound
+  A number of ballots that is at most the margin of victory, or None if
+  there was only one candidate.
+
+upper_bound
+  A number of ballots that is at least the margin of victory, or None
+  if there was only one candidate.
+
+nbr_sets
+  The number of sets of continuing candidates searched.
+
+is_complete
+  True if the search for the lower bound finished within max_sets
+  sets.
+
+"""
+
+def analyze(tabulation, max_sets=MAX_SETS):
+  """
+  Get the margins of an IRV tabulation
+
+  Arguments
+  ---------
+  tabulation
+    An rcv.Tabulation for IRV, after its tabulate() method.  Its
+    ballots are tallied again for each set of continuing candidates
+    that is searched, but their tabulation states are not changed.
+
+  max_sets
+    The maximum number of sets of continuing candidates searched for
+    the lower bound.
+    Default value: MAX_SETS
+
+  Returns
+  -------
+  A MarginAnalysis.
+
+  Raises
+  ------
+  RcvValueError
+    If the tabulation is not for IRV or has not been tabulated.
+
+  """
+  if not tabulation.is_irv():
+    raise errors.RcvValueError('Margins are only supported for IRV:', (
+          ('nbr_seats_to_fill', tabulation.nbr_seats_to_fill),
+          ))
+  if not hasattr(tabulation, 'nbr_round') or (len(tabulation.candidates)
+        and len(tabulation.elected()) != 1):
+    raise errors.RcvValueError('The tabulation has not been tabulated:', (
+          ('nbr_round', getattr(tabulation, 'nbr_round', None)),
+          ))
+  winner = (list(tabulation.elected())[0] if tabulation.candidates
+        else None)
+  if len(tabulation.candidates) < 2:
+    return MarginAnalysis(winner, (), None, None, None, 0, True)
+  decisions = rounds.decisions_from_status(tabulation.status)
+  continuing_sets = rounds.continuing_by_round(tabulation.candidates,
+        decisions)
+  round_margins = []
+  for ix, ((elected, defeated), continuing) in enumerate(
+        zip(decisions, continuing_sets)):
+    votes = {candidate: tabulation.tallies[candidate][ix]
+          for candidate in continuing}
+    if elected:
+      last_round_margin = votes[winner] - max([votes[candidate]
+            for candidate in continuing if candidate != winner])
+    else:
+      round_margins.append((ix + 1, min([votes[candidate]
+            for candidate in continuing - defeated]) -
+            sum([votes[candidate] for candidate in defeated])))
+  upper_bound = finalists_margin(tabulation, continuing_sets[-1],
+        winner) // 2 + 1
+  lower_bound, nbr_sets, is_complete = _search(tabulation, winner,
+        upper_bound, max_sets)
+  return MarginAnalysis(winner, tuple(round_margins), last_round_margin,
+        lower_bound, upper_bound, nbr_sets, is_complete)
+
+def finalists_margin(tabulation, continuing, winner):
+  """
+  Get the margin between the winner and the runner-up of the last round
+  of two finalists
+
+  If more than two candidates are continuing, as when the tabulation
+  stops at a majority, candidates are defeated one at a time, with ties
+  resolved by the tie_breaker, until two remain.
+
+  Returns
+  -------
+  The votes of the winner less the votes of the runner-up.
+
+  """
+  continuing = set(continuing)
+  while True:
+    tally = rounds.round_tally(tabulation.ballots, continuing,
+          tabulation.max_ranking_levels)
+    if len(continuing) == 2:
+      break
+    continuing.remove(min([candidate for candidate in continuing
+          if candidate != winner], key=lambda candidate: (tally[candidate],
+          tabulation.tie_breaker.get(candidate, len(tabulation.tie_breaker)))))
+  return tally[winner] - max([tally[candidate] for candidate in continuing
+        if candidate != winner])
+
+def _changes(votes_difference):
+  """
+  Get the fewest ballots to change to overcome a difference in votes
+
+  This function is for internal use only.
+
+  """
+  return max(votes_difference + 1, 0) // 2
+
+def _preferences(tabulation):
+  """
+  Get the ballot groups as the candidates they rank, with their totals
+
+  Only the candidates ranked before any overvote count, so the first
+  of them that is continuing is the one the ballot group counts for.
+  Ballot groups that rank the same candidates are combined.
+
+  This function is for internal use only.
+
+  Returns
+  -------
+  A list of pairs of a tuple of candidates and a number of ballots.
+
+  """
+  totals = {}
+  for ballot_group in tabulation.ballots:
+    candidates = []
+    for ranking_code in ballot_group.get_rankings()[
+          :ballot_group.get_ranking_depth()]:
+      if ranking_code == K.RANKING_CODE_OVERVOTE:
+        break
+      if (ranking_code in tabulation.status and
+            ranking_code not in candidates):
+        candidates.append(ranking_code)
+    candidates = tuple(candidates)
+    totals[candidates] = totals.get(candidates, 0) + (
+          ballot_group.get_multiple())
+  return [(candidates, total) for candidates, total in totals.items()
+        if candidates]
+
+def _candidate_tally(preferences, continuing):
+  """
+  Get the votes of each continuing candidate
+
+  This function is for internal use only.
+
+  """
+  tally = {candidate: 0 for candidate in continuing}
+  for candidates, total in preferences:
+    for candidate in candidates:
+      if candidate in continuing:
+        tally[candidate] += total
+        break
+  return tally
+
+def _search(tabulation, winner, upper_bound, max_sets):
+  """
+  Search sets of continuing candidates for a lower bound on the margin
+
+  Sets are searched in order of the least number of changes that an
+  elimination order to them needs, and then from the smallest set.
+  That number is raised to the least that the winner's defeat needs
+  from any smaller set:  the winner's votes never decrease as
+  candidates are defeated, and another candidate never has more votes
+  than when it is the only other candidate continuing.
+
+  This function is for internal use only.
+
+  Returns
+  -------
+  A tuple of the lower bound, the number of sets searched, and whether
+  the search finished.
+
+  """
+  preferences = _preferences(tabulation)
+  rival_votes = {candidate: _candidate_tally(preferences,
+        set([winner, candidate]))[candidate]
+        for candidate in tabulation.candidates if candidate != winner}
+  best = upper_bound
+  start = frozenset(tabulation.candidates)
+  needs = {start: 0}
+  heap = [(0, len(start), sorted(start), start)]
+  nbr_sets = 0
+  while heap:
+    need, size, ignored, continuing = heap[0]
+    if need >= best:
+      break
+    if nbr_sets >= max_sets:
+      return need, nbr_sets, False
+    heapq.heappop(heap)
+    if need > needs[continuing]:
+      continue
+    nbr_sets += 1
+    tally = _candidate_tally(preferences, continuing)
+    need = max(need, _changes(tally[winner] - max([rival_votes[candidate]
+          for candidate in continuing if candidate != winner])))
+    by_votes = sorted(continuing, key=lambda candidate: tally[candidate])
+    fewest = [tally[candidate] for candidate in by_votes[:2]]
+    best = min(best, max(need, _changes(tally[winner] -
+          (fewest[1] if by_votes[0] == winner else fewest[0]))))
+    if len(continuing) == 2 or need >= best:
+      continue
+    batch_size = 0
+    batch_votes = 0
+    for ix, candidate in enumerate(by_votes[:-1]):
+      if candidate == winner:
+        break
+      batch_votes += tally[candidate]
+      if _changes(tally[by_votes[ix + 1]] - batch_votes) >= best:
+        batch_size = ix + 1
+    if batch_size:
+      successors = [(need, continuing.difference(by_votes[:batch_size]))]
+      if len(successors[0][1]) < 2:
+        successors = []
+    else:
+      successors = [(max(need, _changes(tally[candidate] -
+            (fewest[1] if candidate == by_votes[0] else fewest[0]))),
+            continuing - set([candidate]))
+            for candidate in by_votes if candidate != winner]
+    for successor_need, successor in successors:
+      if successor_need < min(best, needs.get(successor, best)):
+        needs[successor] = successor_need
+        heapq.heappush(heap, (successor_need, len(successor),
+              sorted(successor), successor))
+  return best, nbr_sets, True
@@ -0,0 +1,288 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Collect metrics from RCV tabulations in Prometheus text format
+
+A Metrics object is an observer, as described in the observe module,
+that accumulates counters and histograms from the rounds and phases of
+the tabulations it observes.  It also counts contests, ballot groups,
+validation failures, and cache hits and misses when those are recorded
+with its methods.  Its tabulate() method does all of that for one
+contest.
+
+The metrics can be written to a file, for example for the textfile
+collector of a Prometheus node exporter, or served over HTTP from a
+local port.  Only the standard library is used.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import checkpoint
+from sb1288 import errors
+from sb1288 import observe
+from sb1288 import rcv
+
+import threading
+
+try:
+  from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+  # Python 2
+  from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# The default upper bounds, in seconds, of the duration histogram buckets
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0,
+      60.0)
+
+METRIC_CONTESTS = 'sb1288_contests_tabulated_total'
+METRIC_BALLOT_GROUPS = 'sb1288_ballot_groups_total'
+METRIC_ROUNDS = 'sb1288_rounds_total'
+METRIC_VALIDATION_FAILURES = 'sb1288_validation_failures_total'
+METRIC_CACHE_HITS = 'sb1288_cache_hits_total'
+METRIC_CACHE_MISSES = 'sb1288_cache_misses_total'
+METRIC_PHASE_DURATION = 'sb1288_phase_duration_seconds'
+METRIC_TABULATION_DURATION = 'sb1288_tabulation_duration_seconds'
+
+# The kinds of validation failures, each with a word that identifies it
+# in an RcvValueError message, in the order the words are searched, so
+# that the kind label has a small, fixed set of values
+VALIDATION_KIND_LIST = [
+      ('tie_breaker', 'tie_breaker'),
+      ('option', 'options'),
+      ('max_ranking_levels', 'max_ranking_levels'),
+      ('nbr_seats_to_fill', 'nbr_seats_to_fill'),
+      ('ballot', 'ballots'),
+      ('candidate', 'candidates'),
+      ]
+VALIDATION_KIND_OTHER = 'other'
+
+# The name, type, help text, and label name, if any, of each metric
+METRIC_LIST = [
+      (METRIC_CONTESTS, 'counter', 'Contests tabulated.', None),
+      (METRIC_BALLOT_GROUPS, 'counter', 'Validated ballot groups ingested.',
+            None),
+      (METRIC_ROUNDS, 'counter', 'Rounds tabulated.', None),
+      (METRIC_VALIDATION_FAILURES, 'counter',
+            'Tabulations with invalid arguments, by kind of error.', 'kind'),
+      (METRIC_CACHE_HITS, 'counter', 'Cache hits, by cache.', 'cache'),
+      (METRIC_CACHE_MISSES, 'counter', 'Cache misses, by cache.', 'cache'),
+      (METRIC_PHASE_DURATION, 'histogram',
+            'Seconds per tabulation phase, by phase.', 'phase'),
+      (METRIC_TABULATION_DURATION, 'histogram',
+            'Seconds per tabulation, excluding validation.', None),
+      ]
+
+
+def validation_failure_kind(exc):
+  """
+  Get the kind of a validation failure, for the kind label of a metric
+
+  Returns
+  -------
+  The kind from VALIDATION_KIND_LIST whose word is in the message of the
+  RcvValueError, or VALIDATION_KIND_OTHER.
+
+  """
+  message = str(exc.message).lower()
+  for word, kind in VALIDATION_KIND_LIST:
+    if word in message:
+      return kind
+  return VALIDATION_KIND_OTHER
+
+class Metrics(object):
+  """
+  Counters and histograms of RCV tabulations
+
+  The methods may be called from several threads.
+
+  """
+
+  def __init__(self, buckets=DURATION_BUCKETS):
+    self.buckets = tuple(sorted(buckets))
+    self.lock = threading.Lock()
+    self.counters = {}
+    self.histograms = {}
+
+  def __call__(self, event):
+    """Observe an event of a tabulation"""
+    if event.kind == observe.EVENT_PHASE:
+      self.observe(METRIC_PHASE_DURATION, event.elapsed, event.phase)
+    elif event.kind == observe.EVENT_ROUND:
+      self.inc(METRIC_ROUNDS)
+    elif event.kind == observe.EVENT_TABULATION:
+      self.observe(METRIC_TABULATION_DURATION, event.elapsed)
+
+  def inc(self, metric, label=None, amount=1):
+    """Add to a counter, optionally for a label value"""
+    with self.lock:
+      values = self.counters.setdefault(metric, {})
+      values[label] = values.get(label, 0) + amount
+
+  def observe(self, metric, value, label=None):
+    """Add a value to a histogram, optionally for a label value"""
+    with self.lock:
+      values = self.histograms.setdefault(metric, {})
+      if label not in values:
+        values[label] = {'buckets': [0] * len(self.buckets), 'count': 0,
+              'sum': 0.0}
+      histogram = values[label]
+      for ix, upper_bound in enumerate(self.buckets):
+        if value <= upper_bound:
+          histogram['buckets'][ix] += 1
+      histogram['count'] += 1
+      histogram['sum'] += value
+
+  def record_validation_failure(self, exc):
+    """Count an RcvValueError from validation, by its kind"""
+    self.inc(METRIC_VALIDATION_FAILURES, validation_failure_kind(exc))
+
+  def record_cache(self, cache, is_hit):
+    """Count a hit or miss for a named cache"""
+    self.inc(METRIC_CACHE_HITS if is_hit else METRIC_CACHE_MISSES, cache)
+
+  def tabulate(self, *args, **kwargs):
+    """
+    Tabulate a contest while collecting its metrics
+
+    Arguments
+    ---------
+    The same as for rcv.tabulate().  Any observer is also given the
+    events of the tabulation.
+
+    Returns
+    -------
+    The same as rcv.tabulate().
+
+    Raises
+    ------
+    The same as rcv.tabulate().  An RcvValueError raised by validation
+    is counted as a validation failure.
+
+    """
+    kwargs['observer'] = observe.ObserverGroup(self,
+          kwargs.get('observer'))
+    try:
+      tabulation = rcv.Tabulation(*args, **kwargs)
+    except errors.RcvValueError as exc:
+      self.record_validation_failure(exc)
+      raise
+    self.inc(METRIC_BALLOT_GROUPS, amount=len(tabulation.ballots))
+    result = tabulation.tabulate()
+    self.inc(METRIC_CONTESTS)
+    return result
+
+  def exposition(self):
+    """
+    Get the metrics in the Prometheus text exposition format
+
+    Returns
+    -------
+    A str of lines, with HELP and TYPE lines for every metric, even if
+    it has no values yet.
+
+    """
+    lines = []
+    with self.lock:
+      for metric, metric_type, help_text, label_name in METRIC_LIST:
+        lines.append('# HELP {} {}'.format(metric, help_text))
+        lines.append('# TYPE {} {}'.format(metric, metric_type))
+        if metric_type == 'counter':
+          values = self.counters.get(metric, {})
+          if label_name is None and None not in values:
+            values = {None: 0}
+          for label in sorted(values, key=str):
+            lines.append('{}{} {}'.format(metric,
+                  _labels(label_name, label), _number(values[label])))
+          continue
+        values = self.histograms.get(metric, {})
+        for label in sorted(values, key=str):
+          histogram = values[label]
+          for upper_bound, bucket_count in zip(self.buckets,
+                histogram['buckets']):
+            lines.append('{}_bucket{} {}'.format(metric, _labels(label_name,
+                  label, ('le', _number(upper_bound))), bucket_count))
+          lines.append('{}_bucket{} {}'.format(metric,
+                _labels(label_name, label, ('le', '+Inf')),
+                histogram['count']))
+          lines.append('{}_sum{} {}'.format(metric,
+                _labels(label_name, label), _number(histogram['sum'])))
+          lines.append('{}_count{} {}'.format(metric,
+                _labels(label_name, label), histogram['count']))
+    return '\n'.join(lines) + '\n'
+
+  def write(self, file_name):
+    """
+    Write the metrics to a file
+
+    The metrics are first written to a temporary file, which then
+    replaces any existing file, so that a reader never sees a partly
+    written file.
+
+    """
+    temp_file_name = file_name + '.tmp'
+    with open(temp_file_name, 'w') as output_file:
+      output_file.write(self.exposition())
+    checkpoint.replace_file(temp_file_name, file_name)
+
+  def serve(self, port, host='127.0.0.1'):
+    """
+    Serve the metrics over HTTP from a background thread
+
+    Arguments
+    ---------
+    port
+      The port number.  If 0, a free port is chosen.
+
+    host
+      The host address to listen on.
+      Default value: '127.0.0.1', so only local clients can connect
+
+    Returns
+    -------
+    The HTTPServer, whose server_address attribute gives the port
+    actually used, and whose shutdown() method stops serving.
+
+    """
+    metrics = self
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+      def do_GET(self):
+        body = metrics.exposition().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def log_message(self, format, *args):
+        pass
+
+    server = HTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever,
+          name='sb1288-metrics')
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def _labels(label_name, label, *extra_pairs):
+  """Format the label set of a sample"""
+  pairs = list(extra_pairs)
+  if label_name is not None and label is not None:
+    pairs.insert(0, (label_name, label))
+  if not pairs:
+    return ''
+  return '{' + ','.join(['{}="{}"'.format(name, _escape(value))
+        for name, value in pairs]) + '}'
+
+def _escape(value):
+  """Escape a label value"""
+  return (str(value).replace('\\', '\\\\').replace('"', '\\"').
+        replace('\n', '\\n'))
+
+def _number(value):
+  """Format a sample value"""
+  return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,187 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Observe the phases and rounds of an RCV tabulation
+
+An observer is any callable that accepts one TabulationEvent argument.
+It is given to an rcv.Tabulation object when it is created, and is then
+called as validation, each phase of each round, each round, and the
+whole tabulation finish.  It is also called periodically with progress
+events while ballots are being assigned to candidates.
+
+When no observer is given, the tabulation does not collect timings or
+counters.
+
+"""
+
+from __future__ import print_function
+
+import collections
+import time
+
+# A monotonic clock, where available
+try:
+  clock = time.perf_counter
+except AttributeError:
+  clock = time.time
+
+EVENT_PHASE = 'phase'
+EVENT_PROGRESS = 'progress'
+EVENT_ROUND = 'round'
+EVENT_TABULATION = 'tabulation'
+
+PHASE_VALIDATE = 'validate'
+PHASE_ASSIGN = 'assign_ballots'
+PHASE_TALLY = 'tally_votes'
+PHASE_TRANSFER_SURPLUS = 'transfer_surplus'
+PHASE_TRANSFER_DEFEATED = 'transfer_from_defeated'
+PHASE_LIST = [
+      PHASE_VALIDATE,
+      PHASE_ASSIGN,
+      PHASE_TALLY,
+      PHASE_TRANSFER_SURPLUS,
+      PHASE_TRANSFER_DEFEATED,
+      ]
+
+COUNTER_BALLOTS_MOVED = 'ballots_moved'
+COUNTER_PILES_TOUCHED = 'piles_touched'
+COUNTER_DECIMAL_OPERATIONS = 'decimal_operations'
+COUNTER_ROUNDS = 'rounds'
+COUNTER_LIST = [
+      COUNTER_BALLOTS_MOVED,
+      COUNTER_PILES_TOUCHED,
+      COUNTER_DECIMAL_OPERATIONS,
+      COUNTER_ROUNDS,
+      ]
+
+# The default number of ballot groups assigned between progress events
+PROGRESS_INTERVAL = 100000
+
+TabulationEvent = collections.namedtuple('TabulationEvent', [
+      'kind', 'phase', 'nbr_round', 'elapsed', 'counters'])
+TabulationEvent.__doc__ = """
+An event observed during a tabulation
+
+Attributes
+----------
+kind
+  One of:
+
+    'phase'
+      A phase has finished.
+
+    'progress'
+      Some ballot groups of a phase have been assigned.  The counters
+      include a 'ballots_total' count of the ballot groups being
+      assigned.
+
+    'round'
+      A round has finished.
+
+    'tabulation'
+      The tabulation has finished.
+
+phase
+  For phase and progress events, one of the PHASE_LIST values,
+  otherwise None.
+
+nbr_round
+  The current round number, 0 for validation.
+
+elapsed
+  The seconds elapsed, by a monotonic clock, since the start of the
+  phase, round, or tabulation.
+
+counters
+  A dict of counts, keyed by the COUNTER_LIST values, for the phase,
+  round, or tabulation:
+
+    ballots_moved
+      The number of ballot groups assigned to a candidate or other
+      tabulation category.
+
+    piles_touched
+      The number of piles of ballot groups that were added to or
+      tallied.
+
+    decimal_operations
+      For STV, the number of arithmetic operations on Decimal values
+      made for ballot groups and their transfers.
+
+    rounds
+      The number of rounds.
+
+"""
+
+def new_counters():
+  """Get a dict of zero counts"""
+  return {counter: 0 for counter in COUNTER_LIST}
+
+def add_counters(total_counters, counters):
+  """Add counts to a dict of total counts"""
+  for counter in COUNTER_LIST:
+    total_counters[counter] += counters[counter]
+
+
+class ObserverGroup(object):
+  """An observer that passes each event to several observers"""
+
+  def __init__(self, *observers):
+    self.observers = [observer for observer in observers
+          if observer is not None]
+
+  def __call__(self, event):
+    for observer in self.observers:
+      observer(event)
+
+
+class PhaseTimer(object):
+  """
+  An observer that totals elapsed times and counters by phase
+
+  Attributes
+  ----------
+  elapsed
+    A dict keyed by phase of total seconds elapsed in that phase.
+
+  counters
+    A dict keyed by phase of dicts of total counts for that phase.
+
+  rounds
+    A list of the round events, in order.
+
+  total
+    The tabulation event, or None if the tabulation has not finished.
+
+  """
+
+  def __init__(self):
+    self.elapsed = {phase: 0.0 for phase in PHASE_LIST}
+    self.counters = {phase: new_counters() for phase in PHASE_LIST}
+    self.rounds = []
+    self.total = None
+
+  def __call__(self, event):
+    if event.kind == EVENT_PHASE:
+      self.elapsed[event.phase] += event.elapsed
+      add_counters(self.counters[event.phase], event.counters)
+    elif event.kind == EVENT_ROUND:
+      self.rounds.append(event)
+    elif event.kind == EVENT_TABULATION:
+      self.total = event
+
+  def as_dict(self):
+    """
+    Get the totals as a dict, suitable for conversion to JSON
+
+    Returns
+    -------
+    A dict with the names 'phases', a dict keyed by phase of dicts with
+    'elapsed' and counter names, and 'rounds', the number of rounds.
+
+    """
+    phases = {}
+    for phase in PHASE_LIST:
+      phases[phase] = dict(self.counters[phase])
+      phases[phase]['elapsed'] = self.elapsed[phase]
+    return {'phases': phases, 'rounds': len(self.rounds)}
@@ -0,0 +1,113 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Run independent RCV tasks across a pool of processes"""
+
+from __future__ import print_function
+
+import itertools
+import multiprocessing
+
+def map_tasks(function, tasks, nbr_processes=None, initializer=None,
+      initargs=(), ordered=True, window=None):
+  """
+  Apply a function to each task, possibly in a pool of processes
+
+  Arguments
+  ---------
+  function
+    A module-level function that takes one task as its argument.  It
+    must be picklable, as must each task and each result.
+
+  tasks
+    An iterable of tasks.
+
+  nbr_processes
+    The number of worker processes.  If None, the number of CPUs is
+    used.  If 1, the tasks are run serially in the current process,
+    which is useful for testing and debugging.
+    Default value: None
+
+  initializer
+    If not None, a function called once in each worker process, before
+    any tasks are run there, with initargs as its arguments.  This can
+    be used to send large, shared data to each worker only once.
+    Default value: None
+
+  initargs
+    A tuple of arguments for the initializer.
+    Default value: an empty tuple
+
+  ordered
+    If this evaluates to True, results are produced in the same order
+    as the tasks.  Otherwise, results are produced as they are
+    completed, with tasks started in the order given.
+    Default value: True
+
+  window
+    If not None, the number of tasks taken from tasks at a time.  The
+    next window of tasks is taken only after every result of the
+    previous window has been produced, so that a long or unbounded
+    generator of tasks is not consumed far ahead of its results.
+    Default value: None, for taking tasks as the pool is able
+
+  Returns
+  -------
+  A generator of results of the function, one for each task.
+
+  """
+  nbr_processes = process_count(nbr_processes)
+  if nbr_processes <= 1:
+    if initializer is not None:
+      initializer(*initargs)
+    for task in tasks:
+      yield function(task)
+    return
+  pool = multiprocessing.Pool(nbr_processes, initializer, initargs)
+  try:
+    for window_tasks in ([tasks] if window is None else
+          _windows(tasks, window)):
+      if ordered:
+        results = pool.imap(function, window_tasks)
+      else:
+        results = pool.imap_unordered(function, window_tasks)
+      for result in results:
+        yield result
+    pool.close()
+  finally:
+    pool.terminate()
+    pool.join()
+
+def process_count(nbr_processes):
+  """
+  Get the number of processes that map_tasks() uses
+
+  Arguments
+  ---------
+  nbr_processes
+    The number of worker processes, as for map_tasks(), or None.
+
+  Returns
+  -------
+  The number of CPUs if nbr_processes is None, otherwise nbr_processes.
+  A value of 1 or less means that tasks are run serially in the
+  current process.
+
+  """
+  if nbr_processes is None:
+    return multiprocessing.cpu_count()
+  return nbr_processes
+
+def _windows(tasks, window):
+  """
+  Generate lists of up to window tasks at a time
+
+  This function is for internal use only.
+
+  """
+  tasks = iter(tasks)
+  while True:
+    window_tasks = list(itertools.islice(tasks, window))
+    if not window_tasks:
+      return
+    yield window_tasks
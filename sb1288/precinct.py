@@ -0,0 +1,112 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Round-by-round vote totals by precinct
+
+A ballot group may have a precinct, or other batch key, as a third
+value.  The vote totals of each precinct are then kept for each round
+of the tabulation, following the same elect and defeat decisions as the
+contest as a whole, and updated only as ballots move between piles.
+
+Each row of vote totals, one total per precinct, is kept in an array of
+integers, so that thousands of precincts over dozens of rounds do not
+take much memory.  For STV, the integers are the internal values of the
+Decimal vote totals.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import decimal5
+
+import array
+
+try:
+  array.array('q')
+  _TYPECODE = 'q'
+except ValueError:
+  # Python 2
+  _TYPECODE = 'l'
+
+
+class PrecinctTally(object):
+  """
+  The vote totals of tabulation categories by precinct, for each round
+
+  Attributes
+  ----------
+  precincts
+    A tuple of the precinct keys, in the order in which they first
+    appear in the ballot groups.
+
+  rounds
+    A list with an item for each round, which is a dict keyed by
+    candidate name or other tabulation label of an array of vote
+    totals, one for each precinct in the order of precincts.  A
+    category has a row for a round only if its vote total for that
+    round is the total of the ballots assigned to it; for STV, a
+    candidate whose surplus was transferred in an earlier round and the
+    residual surplus have no rows.  The item for a round is None if the
+    round was processed before a tabulation was resumed.
+
+  """
+
+  def __init__(self, precincts, is_irv):
+    self.precincts = tuple(precincts)
+    self.is_irv = is_irv
+    self.rounds = []
+    self._zero_row = array.array(_TYPECODE, [0])
+
+  def new_row(self):
+    """Get an array of zero vote totals, one for each precinct"""
+    return self._zero_row * len(self.precincts)
+
+  def add_round(self, rows):
+    """Add a dict of rows for the next round, copying each row"""
+    self.rounds.append({tab_code: array.array(_TYPECODE, row)
+          for tab_code, row in rows.items()})
+
+  def votes(self, nbr_round, tab_code):
+    """
+    Get the vote totals of a tabulation category for a round
+
+    Arguments
+    ---------
+    nbr_round
+      The 1-based number of a round.
+
+    tab_code
+      A candidate name or other tabulation label.
+
+    Returns
+    -------
+    A tuple of the votes in each precinct, in the order of precincts,
+    or None if the category has no row for the round.  For STV, the
+    votes are Decimal values.
+
+    """
+    rows = self.rounds[nbr_round - 1]
+    if rows is None or tab_code not in rows:
+      return None
+    if self.is_irv:
+      return tuple(rows[tab_code])
+    return tuple([decimal5.decimal_from_json(value)
+          for value in rows[tab_code]])
+
+  def totals(self, nbr_round):
+    """
+    Get the vote totals of every precinct for a round
+
+    Returns
+    -------
+    A dict keyed by precinct of dicts keyed by tabulation category of
+    votes, for the categories that have a row for the round.
+
+    """
+    rows = self.rounds[nbr_round - 1] or {}
+    result = {precinct: {} for precinct in self.precincts}
+    for tab_code in rows:
+      for precinct, votes in zip(self.precincts,
+            self.votes(nbr_round, tab_code)):
+        result[precinct][tab_code] = votes
+    return result
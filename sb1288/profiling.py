@@ -0,0 +1,219 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Profile RCV tabulations
+
+Two kinds of profiling are supported, separately or together:
+
+  - cProfile, with statistics written to a file that can be read with
+    the pstats module, e.g. with:  python -m pstats stats_file
+
+  - a lightweight sampling profiler, which periodically records the
+    call stack of the profiled thread and writes the counts of each
+    stack as collapsed-stack text, one line per stack, as used by flame
+    graph tools.  The outermost frame of each stack is a tag for the
+    tabulation phase in progress, e.g. 'phase:tally_votes'.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import observe
+from sb1288 import rcv
+from sb1288 import validate
+
+import cProfile
+import os.path
+import sys
+import threading
+
+# The default seconds between samples of the sampling profiler
+SAMPLE_INTERVAL = 0.001
+
+# The phase tag for samples outside of validation and the round phases
+PHASE_OTHER = 'other'
+
+def _module_path(module):
+  """Get the path of a module's source, without an extension"""
+  return os.path.splitext(os.path.abspath(module.__file__))[0]
+
+_RCV_PATH = _module_path(rcv)
+_VALIDATE_PATH = _module_path(validate)
+
+def current_phase(frame):
+  """
+  Get the tabulation phase in progress for a call stack
+
+  Arguments
+  ---------
+  frame
+    The innermost frame of the call stack.
+
+  Returns
+  -------
+  One of the observe.PHASE_LIST values, or PHASE_OTHER.
+
+  """
+  while frame is not None:
+    code = frame.f_code
+    path = os.path.splitext(os.path.abspath(code.co_filename))[0]
+    if path == _VALIDATE_PATH:
+      return observe.PHASE_VALIDATE
+    if path == _RCV_PATH:
+      if code.co_name == 'run_phase':
+        return frame.f_locals.get('phase', PHASE_OTHER)
+      if code.co_name == '__init__':
+        return observe.PHASE_VALIDATE
+    frame = frame.f_back
+  return PHASE_OTHER
+
+def frame_label(frame):
+  """Get a label for a frame, as used in collapsed stacks"""
+  code = frame.f_code
+  return '{}:{}'.format(os.path.basename(code.co_filename), code.co_name)
+
+
+class SamplingProfiler(object):
+  """
+  A profiler that samples the call stack of a thread from another thread
+
+  The profiler is started and stopped by its start() and stop()
+  methods, or by its use as a context manager.  It samples the thread
+  that starts it.
+
+  Attributes
+  ----------
+  interval
+    The seconds between samples.
+
+  stacks
+    A dict keyed by collapsed stack str of the number of samples of
+    that stack.
+
+  nbr_samples
+    The total number of samples.
+
+  """
+
+  def __init__(self, interval=SAMPLE_INTERVAL):
+    self.interval = interval
+    self.stacks = {}
+    self.nbr_samples = 0
+    self._thread_id = None
+    self._sampler = None
+    self._stop_event = threading.Event()
+
+  def __enter__(self):
+    self.start()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.stop()
+    return False
+
+  def start(self):
+    """Start sampling the current thread"""
+    self._thread_id = threading.current_thread().ident
+    self._stop_event.clear()
+    self._sampler = threading.Thread(target=self._run,
+          name='sb1288-sampling-profiler')
+    self._sampler.daemon = True
+    self._sampler.start()
+
+  def stop(self):
+    """Stop sampling"""
+    if self._sampler is not None:
+      self._stop_event.set()
+      self._sampler.join()
+      self._sampler = None
+
+  def _run(self):
+    """Take samples until stopped"""
+    while not self._stop_event.wait(self.interval):
+      frame = sys._current_frames().get(self._thread_id)
+      if frame is not None:
+        self.sample(frame)
+
+  def sample(self, frame):
+    """Record one sample of a call stack, given its innermost frame"""
+    labels = []
+    phase = current_phase(frame)
+    while frame is not None:
+      labels.append(frame_label(frame))
+      frame = frame.f_back
+    labels.append('phase:' + phase)
+    labels.reverse()
+    stack = ';'.join(labels)
+    self.stacks[stack] = self.stacks.get(stack, 0) + 1
+    self.nbr_samples += 1
+
+  def collapsed(self):
+    """
+    Get the samples as collapsed-stack text
+
+    Returns
+    -------
+    A str with a line for each distinct stack, sorted, of the stack's
+    frame labels from outermost to innermost separated by semicolons,
+    then a space and the number of samples.
+
+    """
+    return ''.join(['{} {}\n'.format(stack, count)
+          for stack, count in sorted(self.stacks.items())])
+
+  def phase_counts(self):
+    """Get a dict keyed by phase tag of the number of samples"""
+    counts = {}
+    for stack, count in self.stacks.items():
+      phase = stack.split(';', 1)[0][len('phase:'):]
+      counts[phase] = counts.get(phase, 0) + count
+    return counts
+
+
+def profile_call(function, args=(), kwargs={}, pstats_file=None,
+      stacks_file=None, interval=SAMPLE_INTERVAL):
+  """
+  Call a function while profiling it
+
+  Arguments
+  ---------
+  function, args, kwargs
+    The function to call, with its positional and keyword arguments.
+
+  pstats_file
+    If not None, the name of a file to which cProfile statistics are
+    written.
+    Default value: None
+
+  stacks_file
+    If not None, the name of a file to which the collapsed stacks of a
+    SamplingProfiler are written.
+    Default value: None
+
+  interval
+    The seconds between samples of the SamplingProfiler.
+    Default value: SAMPLE_INTERVAL
+
+  Returns
+  -------
+  The return value of the function.  The profiles are written even if
+  the function raises an exception.
+
+  """
+  profiler = cProfile.Profile() if pstats_file is not None else None
+  sampler = SamplingProfiler(interval) if stacks_file is not None else None
+  if sampler is not None:
+    sampler.start()
+  try:
+    if profiler is not None:
+      result = profiler.runcall(function, *args, **kwargs)
+    else:
+      result = function(*args, **kwargs)
+  finally:
+    if sampler is not None:
+      sampler.stop()
+      with open(stacks_file, 'w') as output_file:
+        output_file.write(sampler.collapsed())
+    if profiler is not None:
+      profiler.dump_stats(pstats_file)
+  return result
@@ -5,15 +5,26 @@
 
 from __future__ import print_function
 
+from sb1288 import checkpoint
+from sb1288 import decimal5
 from sb1288 import constants as K
 from sb1288 import errors
+from sb1288 import observe
+from sb1288 import precinct
 from sb1288 import status
 from sb1288 import validate
 
+import collections
+import os.path
+import time
+
+# The number of ballot groups assigned between checks for cancellation
+CANCEL_CHECK_INTERVAL = 10000
+
 # A convenience method to the RcvTabulation class
 
 def tabulate(nbr_seats_to_fill, candidates, ballots,
-      max_ranking_levels, tie_breaker, options={}):
+      max_ranking_levels, tie_breaker, options={}, observer=None):
   """
   Tabulate an RCV contest per California SB 1288
 
@@ -37,9 +48,110 @@ def tabulate(nbr_seats_to_fill, candidates, ballots,
 
   """
   return Tabulation(nbr_seats_to_fill, candidates, ballots,
-      max_ranking_levels, tie_breaker, options
+      max_ranking_levels, tie_breaker, options, observer
       ).tabulate()
 
+RoundState = collections.namedtuple('RoundState', [
+      'nbr_round', 'ballot_states', 'piles', 'tallies', 'statuses',
+      'threshold', 'residual_surplus'])
+RoundState.__doc__ = """
+An immutable capture of a tabulation's state at the end of a round
+
+Attributes
+----------
+nbr_round
+  The number of the last round that was processed.
+
+ballot_states
+  A tuple with the value of Ballot.get_state() for each ballot group,
+  in the order of the Tabulation object's ballots attribute.
+
+piles
+  A tuple of pairs, one for each candidate and other tabulation
+  category, of a tabulation code and a tuple of the indexes of the
+  ballot groups currently assigned to that code.
+
+tallies
+  A tuple of pairs of a tabulation code and a tuple of its
+  round-by-round vote totals.
+
+statuses
+  A tuple of (candidate, status, nbr_round, votes) tuples, one per
+  candidate.
+
+threshold
+  The STV threshold, or None if it has not been determined.
+
+residual_surplus
+  The total residual surplus.
+
+"""
+
+RoundResult = collections.namedtuple('RoundResult', [
+      'nbr_round', 'tally', 'elected', 'defeated', 'threshold',
+      'residual_surplus'])
+RoundResult.__doc__ = """
+An immutable summary of a round, as produced by Tabulation.iter_rounds()
+
+Attributes
+----------
+nbr_round
+  The 1-based number of the round.
+
+tally
+  A tuple of pairs of a candidate name or other tabulation category
+  label and its vote total for the round.  Candidates are in the order
+  given to the tabulation, followed by the other categories.  Only
+  candidates that have a vote total for the round are included.
+
+elected
+  A frozenset of the candidates elected in the round.
+
+defeated
+  A frozenset of the candidates defeated in the round.
+
+threshold
+  For STV, the threshold; for IRV, None.
+
+residual_surplus
+  For STV, the total residual surplus at the end of the round, after
+  any transfer of surplus; for IRV, None.
+
+"""
+
+JournalEntry = collections.namedtuple('JournalEntry', [
+      'nbr_round', 'elected', 'defeated', 'ties', 'threshold',
+      'surplus_factors'])
+JournalEntry.__doc__ = """
+An immutable record of the decisions of a round, as kept in the journal
+attribute of a Tabulation
+
+Attributes
+----------
+nbr_round
+  The 1-based number of the round.
+
+elected
+  A frozenset of the candidates elected in the round.
+
+defeated
+  A frozenset of the candidates defeated in the round.
+
+ties
+  A tuple of pairs, one for each tie resolved in the round, of a
+  frozenset of the tied candidates and the candidate selected from
+  them by the tie_breaker.
+
+threshold
+  For STV, the threshold; for IRV, None.
+
+surplus_factors
+  A tuple of pairs, sorted by candidate, of a candidate whose surplus
+  was transferred in the round and the Decimal surplus factor that was
+  applied to the transfer values of the candidate's ballots.
+
+"""
+
 class Tabulation(object):
   """
   A class for RCV tabulations per California SB 1288.
@@ -55,7 +167,7 @@ class Tabulation(object):
 
 
   def __init__(self, nbr_seats_to_fill, candidates, ballots,
-        max_ranking_levels, tie_breaker, options={}):
+        max_ranking_levels, tie_breaker, options={}, observer=None):
     """
     Initialize a tabulation for an RCV contest per California SB 1288
 
@@ -102,7 +214,7 @@ class Tabulation(object):
     ballots
       A list or tuple of ballot groups.  A ballot group represents a
       number of ballots with the same rankings.  A ballot group is a
-      list or tuple of length two with the following values:
+      list or tuple of length two or three with the following values:
 
         multiple
           A positive integer indicating how many individual ballots are
@@ -125,6 +237,19 @@ class Tabulation(object):
           ennumeration of a candidate name and use of the special string
           '#' to indicate an overvote.
 
+        precinct
+          Optional.  A str or int key of the precinct or other batch
+          of the ballots.  If any ballot group has a precinct, the
+          round-by-round vote totals of each precinct are kept in the
+          precinct_tally attribute, a precinct.PrecinctTally object.
+          Ballot groups without a precinct have a precinct of None.
+
+      A ballot group may also be a ballot.Ballot object from the result
+      of an earlier validation of ballots with the same candidates and
+      max_ranking_levels, for example, the ballots attribute of another
+      Tabulation object.  Such ballot groups are copied, not
+      revalidated.
+
 
     max_ranking_levels
       The maximum number of candidates that each voter is allowed to
@@ -188,11 +313,47 @@ class Tabulation(object):
           sequence of round-by-round choices may be replicated with this
           option.
 
+        'ranking_depth'
+          None, or a positive int number of rankings that are counted.
+          Each ballot is tabulated as if it had only that many
+          rankings, without copying the rankings, and an exhausted
+          ballot is an abstention if it ranks fewer candidates within
+          that depth than the lesser of the ranking depth and
+          max_ranking_levels.  This supports studying the effect of
+          allowing fewer rankings, as with a scenarios grid of depths.
+          Default value: None
+
+    observer
+      None, or a callable that is called with an
+      observe.TabulationEvent argument as validation, each phase of
+      each round, each round, and the tabulation finish, and
+      periodically while ballots are assigned.  See the observe module.
+      The number of ballot groups assigned between progress events can
+      be changed with the progress_interval attribute.
+      Default value: None
+
     Raises
     ------
     Same as for Tabulation.tabulate()
 
     """
+    self.observer = observer
+    self.progress_interval = observe.PROGRESS_INTERVAL
+    self.phase = None
+    self.phase_counters = observe.new_counters()
+    self.round_counters = observe.new_counters()
+    self.total_counters = observe.new_counters()
+    self.phase_start_time = observe.clock()
+    self.cancel_token = None
+    self.deadline = None
+    self.is_cancellable = False
+    self.cancel_round_state = None
+    self.is_round_discarded = False
+    self.precincts = None
+    self.precinct_votes = None
+    self.precinct_tally = None
+    if self.observer is not None:
+      start_time = observe.clock()
     try:
       self.nbr_seats_to_fill = nbr_seats_to_fill
       self.candidates = candidates
@@ -216,6 +377,10 @@ class Tabulation(object):
           K.OPTION_ALTERNATIVE_DEFEATS_NEVER,
             }
       self.options.update(options_validated)
+      for ballot_group in self.ballots:
+        ballot_group.set_ranking_depth(self.options.get(
+              K.OPTION_RANKING_DEPTH))
+      self._find_precincts()
     except (errors.RcvValueError, errors.RcvImplementationError):
       raise
     except (MemoryError, SystemError):
@@ -223,6 +388,10 @@ class Tabulation(object):
     except Exception as exc:
       raise errors.RcvImplementationError(
             'Possible RCV implementation error:', (), exc)
+    if self.observer is not None:
+      self.observer(observe.TabulationEvent(observe.EVENT_PHASE,
+            observe.PHASE_VALIDATE, 0, observe.clock() - start_time,
+            observe.new_counters()))
 
   def tabulate(self, **kwargs):
     """
@@ -249,6 +418,34 @@ class Tabulation(object):
       The number of a round; stop at the end of that round.
       Default value: None
 
+    The following keyword arguments support restarting a long
+    tabulation that is interrupted:
+
+    checkpoint_file
+      If not None, the name of a file to which the round state is
+      written at the end of rounds, replacing any earlier checkpoint.
+      See the resume_from_checkpoint() method.
+      Default value: None
+
+    checkpoint_interval
+      The number of rounds between checkpoints.
+      Default value: 1
+
+    The following keyword arguments allow a long tabulation to be
+    stopped.  They are checked at the beginning of each round and
+    periodically while ballots are assigned to candidates.
+
+    cancel_token
+      If not None, an object with an is_set() method, such as a
+      threading.Event, that returns True when the tabulation is to be
+      cancelled.
+      Default value: None
+
+    deadline
+      If not None, a time, as from time.time(), after which the
+      tabulation is stopped.
+      Default value: None
+
     Returns
     -------
     A tuple with the following values in order:
@@ -291,6 +488,11 @@ class Tabulation(object):
           ':Other exhausted'
           ':Residual Surplus'   (only for STV tabulations)
 
+    The tabulation also keeps a journal attribute, a list with a
+    JournalEntry of the decisions of each round, in order, which can be
+    checked with sb1288.verify.  After resume(), the journal starts
+    with the first resumed round.
+
 
     Raises
     ------
@@ -305,6 +507,15 @@ class Tabulation(object):
       is raised, it might be because this Python package contains a
       logic error.
 
+    RcvCancelledError
+      If the cancel_token is set or the deadline passes.  Its
+      round_state attribute, which can be given to the resume() method,
+      is the state at the end of the last round that finished, or if
+      the tabulation was stopped within a round, the state of its
+      latest checkpoint or of the round it was resumed from, or None.
+      Its nbr_round attribute is the number of the last round that
+      finished.
+
     Other exceptions:
       Other exceptions defined by Python and its standard libraries can
       be raised, for example as a result of unavailable or insufficient
@@ -322,15 +533,129 @@ class Tabulation(object):
     of the Exception class and neither is a subclass of the other,
     directly or indirectly.
 
+    """
+    return self._tabulate(None, **kwargs)
+
+  def resume(self, round_state, **kwargs):
+    """
+    Resume a tabulation from the state at the end of a round
+
+    Arguments
+    ---------
+    round_state
+      A RoundState value, as returned by get_round_state() at the end
+      of a round of a tabulation with the same arguments.
+
+    Other keyword arguments are the same as for tabulate().
+
+    Returns
+    -------
+    The same as the tabulate() method, with results that are the same
+    as those of an uninterrupted tabulation.
+
+    Raises
+    ------
+    The same as the tabulate() method.  An RcvValueError is raised if
+    the round_state does not match the tabulation.
+
+    """
+    return self._tabulate(round_state, **kwargs)
+
+  def resume_from_checkpoint(self, checkpoint_file, **kwargs):
+    """
+    Resume a tabulation from its latest checkpoint file, if any
+
+    If the checkpoint file exists, the tabulation continues from the
+    round state saved in it, otherwise the tabulation starts from the
+    beginning.  Either way, checkpoints continue to be written to the
+    same file.
+
+    Arguments
+    ---------
+    checkpoint_file
+      The name of a checkpoint file, as given to an earlier call of
+      tabulate() with the same arguments.
+
+    Other keyword arguments are the same as for tabulate().
+
+    Returns
+    -------
+    The same as the tabulate() method, with results that are the same
+    as those of an uninterrupted tabulation.
+
+    Raises
+    ------
+    The same as the tabulate() method.  An RcvValueError is raised if
+    the checkpoint file is not a checkpoint for this tabulation.
+
+    """
+    round_state = None
+    if os.path.isfile(checkpoint_file):
+      round_state = RoundState(*checkpoint.read_checkpoint(
+            checkpoint_file, self))
+    kwargs['checkpoint_file'] = checkpoint_file
+    return self._tabulate(round_state, **kwargs)
+
+  def iter_rounds(self, **kwargs):
+    """
+    Tabulate, producing a summary of each round as soon as it finishes
+
+    Arguments
+    ---------
+    The same as for the tabulate() method, plus:
+
+    round_state
+      If not None, a RoundState from which the tabulation is resumed,
+      as for the resume() method.
+      Default value: None
+
+    Returns
+    -------
+    A generator of RoundResult values, one for each round.  After the
+    generator is exhausted, the results of the tabulation are available
+    from the elected() method and the status and tallies attributes.
+
+    Raises
+    ------
+    The same as the tabulate() method, when the generator is iterated.
+
+    """
+    round_state = kwargs.pop('round_state', None)
+    return self._iter_rounds(round_state, **kwargs)
+
+  def _tabulate(self, round_state, **kwargs):
+    """
+    Tabulate, optionally starting from a round state
+
+    This method is for internal use only.
+
+    """
+    for round_result in self._iter_rounds(round_state, **kwargs):
+      pass
+    return self.elected(), self.status, self.tallies
+
+  def _iter_rounds(self, round_state, **kwargs):
+    """
+    Generate a RoundResult for each round of the tabulation
+
+    This method is for internal use only.
+
     """
     try:
+      self.checkpoint_file = kwargs.pop('checkpoint_file', None)
+      self.checkpoint_interval = kwargs.pop('checkpoint_interval', 1)
+      self.cancel_token = kwargs.pop('cancel_token', None)
+      self.deadline = kwargs.pop('deadline', None)
+      self.is_cancellable = (self.cancel_token is not None or
+            self.deadline is not None)
+      self.cancel_round_state = None
       self.testing = {'stop_at_begin': None, 'stop_after_status_update': None,
             'stop_at_end': None}
       self.testing.update(kwargs)
-      if self.is_irv():
-        elected, status, tally = self._tabulate_irv()
-      else:
-        elected, status, tally = self._tabulate_stv()
+      self._tabulate_setup()
+      if round_state is not None:
+        self.set_round_state(round_state)
+        self.cancel_round_state = round_state
     except (errors.RcvValueError, errors.RcvImplementationError):
       raise
     except (MemoryError, SystemError):
@@ -338,7 +663,80 @@ class Tabulation(object):
     except Exception as exc:
       raise errors.RcvImplementationError(
             'Possible RCV implementation error:', (), exc)
-    return elected, status, tally
+    if self.observer is not None:
+      start_time = observe.clock()
+      self.total_counters = observe.new_counters()
+    is_continuing = True
+    while is_continuing:
+      try:
+        if self.is_cancellable:
+          self.check_cancel(is_between_rounds=True)
+        if self.observer is not None:
+          round_start_time = observe.clock()
+          self.round_counters = observe.new_counters()
+        self.round_ties = []
+        self.round_surplus_factors = {}
+        self.is_round_discarded = False
+        if self.is_irv():
+          is_continuing = self._process_an_irv_round()
+        else:
+          is_continuing = self._process_an_stv_round()
+        if self.is_round_discarded:
+          # stopped before the round began, so there is no round to record
+          break
+        if (self.testing['stop_at_begin'] == self.nbr_round or
+              self.testing['stop_after_status_update'] == self.nbr_round):
+          break
+        if is_continuing:
+          self._write_checkpoint()
+        round_result = self.get_round_result()
+        self.journal.append(JournalEntry(self.nbr_round,
+              round_result.elected, round_result.defeated,
+              tuple(self.round_ties), round_result.threshold,
+              tuple(sorted(self.round_surplus_factors.items()))))
+        if self.observer is not None:
+          self.round_counters[observe.COUNTER_ROUNDS] = 1
+          observe.add_counters(self.total_counters, self.round_counters)
+          self.observer(observe.TabulationEvent(observe.EVENT_ROUND, None,
+                self.nbr_round, observe.clock() - round_start_time,
+                self.round_counters))
+          if not is_continuing:
+            self.observer(observe.TabulationEvent(
+                  observe.EVENT_TABULATION, None, self.nbr_round,
+                  observe.clock() - start_time, self.total_counters))
+      except (errors.RcvValueError, errors.RcvImplementationError,
+            errors.RcvCancelledError):
+        raise
+      except (MemoryError, SystemError):
+        raise
+      except Exception as exc:
+        raise errors.RcvImplementationError(
+              'Possible RCV implementation error:', (), exc)
+      yield round_result
+      if self.testing['stop_at_end'] == self.nbr_round:
+        break
+
+  def get_round_result(self):
+    """
+    Get an immutable RoundResult summarizing the current round
+    """
+    index_round = self.nbr_round - 1
+    tally = tuple([(tab_code, self.tallies[tab_code][index_round])
+          for tab_code in (list(self.candidates) +
+          [label for label in K.OTHER_LABELS_LIST if label in self.tallies])
+          if len(self.tallies[tab_code]) > index_round])
+    elected = frozenset([candidate
+          for candidate, cstatus in self.status.items()
+          if cstatus.status == K.STATUS_ELECTED and
+          cstatus.nbr_round == self.nbr_round])
+    defeated = frozenset([candidate
+          for candidate, cstatus in self.status.items()
+          if cstatus.status == K.STATUS_DEFEATED and
+          cstatus.nbr_round == self.nbr_round])
+    round_result = RoundResult(self.nbr_round, tally, elected, defeated,
+          None if self.is_irv() else self.threshold,
+          None if self.is_irv() else self.total_residual_surplus)
+    return round_result
 
   def is_irv(self):
     return self.nbr_seats_to_fill == 1
@@ -361,32 +759,65 @@ class Tabulation(object):
     """
     return tab_code_tally if self.is_irv() else K.Decimal(self.threshold)
 
-  def _tabulate_irv(self):
+  def check_cancel(self, is_between_rounds=False):
     """
-    Tabulate an IRV contest.
+    Stop the tabulation if it is cancelled or its deadline has passed
 
-    This method is for internal use only.
+    The round state is only taken when the tabulation is stopped.
+    Between rounds, it is the current state.  Within a round, it is the
+    state of the latest checkpoint, or the state the tabulation was
+    resumed from, since the state at the end of the previous round has
+    already been changed.
 
-    """
-    self._tabulate_setup()
-    while self._process_an_irv_round():
-      if self.testing['stop_at_end'] == self.nbr_round:
-        break
-    return self.elected(), self.status, self.tallies
+    Arguments
+    ---------
+    is_between_rounds
+      True if the tabulation is between rounds.
+      Default value: False
+
+    Raises
+    ------
+    RcvCancelledError
+      With the round state at the end of a finished round, or None, and
+      the number of the last round that finished.
 
-  def _tabulate_stv(self):
     """
-    Tabulate an STV contest.
+    if self.cancel_token is not None and self.cancel_token.is_set():
+      message = 'Tabulation cancelled:'
+    elif self.deadline is not None and time.time() >= self.deadline:
+      message = 'Tabulation deadline passed:'
+    else:
+      return
+    round_state = self.cancel_round_state
+    nbr_round = self.nbr_round
+    if is_between_rounds:
+      if nbr_round > 0:
+        round_state = self.get_round_state()
+    else:
+      # the round in progress has not finished
+      nbr_round -= 1
+    raise errors.RcvCancelledError(message, (
+          ('nbr_round', self.nbr_round),
+          ), round_state, nbr_round)
 
-    This method is for internal use only.
+  def _find_precincts(self):
+    """
+    Set the precincts of the ballot groups, in order of appearance
+    """
+    precincts = [ballot.get_precinct() for ballot in self.ballots]
+    if any([key is not None for key in precincts]):
+      self.precincts = tuple(collections.OrderedDict.fromkeys(precincts))
+      self._precinct_indexes = {key: ix
+            for ix, key in enumerate(self.precincts)}
 
+  def _write_checkpoint(self):
     """
-    self._tabulate_setup()
-    self.total_residual_surplus = self.zero_votes()
-    while self._process_an_stv_round():
-      if self.testing['stop_at_end'] == self.nbr_round:
-        break
-    return self.elected(), self.status, self.tallies
+    Write a checkpoint at the end of a round, if one is due
+    """
+    if (self.checkpoint_file is not None and
+          self.nbr_round % self.checkpoint_interval == 0):
+      self.cancel_round_state = checkpoint.write_checkpoint(
+            self.checkpoint_file, self)
 
   def _tabulate_setup(self):
     """
@@ -398,6 +829,84 @@ class Tabulation(object):
     self.status = {candidate: status.Status(candidate, self.zero_votes())
           for candidate in self.candidates}
     self.nbr_round = 0
+    self.threshold = None
+    self.total_residual_surplus = self.zero_votes()
+    self._ballot_indexes = None
+    self.journal = []
+    self.round_ties = []
+    self.round_surplus_factors = {}
+    if self.precincts is not None:
+      self.precinct_tally = precinct.PrecinctTally(self.precincts,
+            self.is_irv())
+      self.precinct_votes = {tab_code: self.precinct_tally.new_row()
+            for tab_code in self.tallies}
+
+  def get_round_state(self):
+    """
+    Get an immutable RoundState of the tabulation
+
+    The state is complete only between rounds, for example when the
+    tabulation has been stopped with the stop_at_end keyword argument.
+
+    """
+    if self._ballot_indexes is None:
+      self._ballot_indexes = {id(ballot): ix
+            for ix, ballot in enumerate(self.ballots)}
+    piles = tuple([(tab_code, tuple([self._ballot_indexes[id(ballot)]
+          for ballot in self.ballots_for[tab_code]]))
+          for tab_code in self.tallies])
+    round_state = RoundState(
+          self.nbr_round,
+          tuple([ballot.get_state() for ballot in self.ballots]),
+          piles,
+          tuple([(tab_code, tuple(votes))
+                for tab_code, votes in self.tallies.items()]),
+          tuple([(candidate, cstatus.status, cstatus.nbr_round,
+                cstatus.votes)
+                for candidate, cstatus in self.status.items()]),
+          self.threshold,
+          self.total_residual_surplus)
+    return round_state
+
+  def set_round_state(self, round_state):
+    """
+    Restore a RoundState returned by get_round_state()
+
+    Raises
+    ------
+    RcvValueError
+      If the round state does not match the ballots, candidates, and
+      tabulation categories of this tabulation.
+
+    """
+    if (len(round_state.ballot_states) != len(self.ballots) or
+          set([tab_code for tab_code, indexes in round_state.piles]) !=
+          set(self.tallies) or
+          set([cstatus[0] for cstatus in round_state.statuses]) !=
+          set(self.candidates)):
+      raise errors.RcvValueError(
+            'Round state does not match the tabulation:', (
+            ('nbr_round', round_state.nbr_round),
+            ('len(ballot_states)', len(round_state.ballot_states)),
+            ('len(ballots)', len(self.ballots)),
+            ))
+    for ballot, ballot_state in zip(self.ballots, round_state.ballot_states):
+      ballot.set_state(ballot_state)
+    self.ballots_for = {tab_code: [self.ballots[ix] for ix in indexes]
+          for tab_code, indexes in round_state.piles}
+    self.tallies = {tab_code: list(votes)
+          for tab_code, votes in round_state.tallies}
+    self.status = {candidate: status.Status(candidate, votes, nbr_round,
+          cstatus)
+          for candidate, cstatus, nbr_round, votes in round_state.statuses}
+    self.nbr_round = round_state.nbr_round
+    self.threshold = round_state.threshold
+    self.total_residual_surplus = round_state.residual_surplus
+    if self.precincts is not None:
+      self.precinct_tally.rounds = [None] * self.nbr_round
+      for tab_code, pile in self.ballots_for.items():
+        self._clear_precinct_votes(tab_code)
+        self._add_precinct_votes(self.precinct_votes[tab_code], pile)
 
   def _process_an_irv_round(self):
     """
@@ -411,8 +920,10 @@ class Tabulation(object):
       return False
     if self.nbr_round == 1:
       # initial assignment to highest ranked continuing candidate (hrcc)
-      self.assign_ballots(self.ballots)
-    self.tally_votes_for_assigned_ballots()
+      self.run_phase(observe.PHASE_ASSIGN, self.assign_ballots,
+            self.ballots)
+    self.run_phase(observe.PHASE_TALLY,
+          self.tally_votes_for_assigned_ballots)
     self.update_candidate_status_tally()
     if self.testing['stop_after_status_update'] == self.nbr_round:
       return False
@@ -458,7 +969,8 @@ class Tabulation(object):
       # do regular, single-candidate defeat, after resolving any ties
       defeated_this_round = self.get_single_defeat_candidate()
       self.defeat_candidates(defeated_this_round)
-    self.transfer_from_defeated(defeated_this_round)
+    self.run_phase(observe.PHASE_TRANSFER_DEFEATED,
+          self.transfer_from_defeated, defeated_this_round)
     return True
 
   def _process_an_stv_round(self):
@@ -473,10 +985,12 @@ class Tabulation(object):
       return False
     if self.nbr_round == 1:
       # initial assignment to highest ranked continuing candidate (hrcc)
-      self.assign_ballots(self.ballots)
+      self.run_phase(observe.PHASE_ASSIGN, self.assign_ballots,
+            self.ballots)
       self.threshold = self.total_votes_for_candidates().__div__(
             self.nbr_seats_to_fill + 1, True)
-    self.tally_votes_for_assigned_ballots()
+    self.run_phase(observe.PHASE_TALLY,
+          self.tally_votes_for_assigned_ballots)
     self.update_candidate_status_tally()
     if self.testing['stop_after_status_update'] == self.nbr_round:
       return False
@@ -503,7 +1017,8 @@ class Tabulation(object):
       self.defeat_candidates(defeated_this_round)
     if not defeated_this_round and candidates_with_surplus:
       # transfer surplus
-      self.transfer_surplus(candidates_with_surplus)
+      self.run_phase(observe.PHASE_TRANSFER_SURPLUS, self.transfer_surplus,
+            candidates_with_surplus)
     # if no candidates had surplus transferred and
     #       no candidates have yet been defeated this round,
     #   defeat a candidate with the fewest votes
@@ -517,21 +1032,94 @@ class Tabulation(object):
       self.elect_candidates(self.continuing())
       return False
     # transfer ballots from all defeated candidates
-    self.transfer_from_defeated(defeated_this_round)
+    self.run_phase(observe.PHASE_TRANSFER_DEFEATED,
+          self.transfer_from_defeated, defeated_this_round)
     return True
 
+  def run_phase(self, phase, method, *args):
+    """
+    Run a phase of a round, informing any observer when it finishes
+
+    Arguments
+    ---------
+    phase
+      One of the observe.PHASE_LIST values.
+
+    method
+      The method that performs the phase.
+
+    args
+      Arguments for the method.
+
+    Returns
+    -------
+    The return value of the method.
+
+    """
+    if self.observer is None:
+      return method(*args)
+    self.phase = phase
+    self.phase_counters = observe.new_counters()
+    self.phase_start_time = observe.clock()
+    result = method(*args)
+    elapsed = observe.clock() - self.phase_start_time
+    observe.add_counters(self.round_counters, self.phase_counters)
+    self.observer(observe.TabulationEvent(observe.EVENT_PHASE, phase,
+          self.nbr_round, elapsed, self.phase_counters))
+    return result
+
   def assign_ballots(self, ballot_list):
     """
     Assign ballots from the ballot list
     """
+    if (self.observer is not None or self.is_cancellable or
+          self.precinct_votes is not None):
+      self._assign_ballots_observed(ballot_list)
+      return
     for ballot in ballot_list:
       self.ballots_for[ballot.get_hrcc(self.continuing(),
             self.max_ranking_levels)].append(ballot)
 
+  def _assign_ballots_observed(self, ballot_list):
+    """
+    Assign ballots, while counting, reporting progress, checking for
+    cancellation, and adding votes by precinct
+
+    This method is for internal use only.
+
+    """
+    continuing = self.continuing()
+    piles_touched = set()
+    nbr_ballots = len(ballot_list)
+    for ix, ballot in enumerate(ballot_list):
+      tab_code = ballot.get_hrcc(continuing, self.max_ranking_levels)
+      self.ballots_for[tab_code].append(ballot)
+      piles_touched.add(tab_code)
+      if self.precinct_votes is not None:
+        self.precinct_votes[tab_code][
+              self._precinct_indexes[ballot.get_precinct()]] += (
+              decimal5.votes_to_json(self.ballot_votes(ballot)))
+      if self.is_cancellable and (ix + 1) % CANCEL_CHECK_INTERVAL == 0:
+        self.check_cancel()
+      if (self.observer is not None and
+            (ix + 1) % self.progress_interval == 0 and ix + 1 < nbr_ballots):
+        self.observer(observe.TabulationEvent(observe.EVENT_PROGRESS,
+              self.phase, self.nbr_round,
+              observe.clock() - self.phase_start_time, {
+              observe.COUNTER_BALLOTS_MOVED: ix + 1,
+              'ballots_total': nbr_ballots}))
+    self.phase_counters[observe.COUNTER_BALLOTS_MOVED] += nbr_ballots
+    self.phase_counters[observe.COUNTER_PILES_TOUCHED] += len(piles_touched)
+
   def tally_votes_for_assigned_ballots(self):
     """
     Tally the votes for a round
     """
+    pile_votes = self.tally_piles([tab_code for tab_code in self.ballots_for
+          if tab_code != K.LABEL_RESIDUAL_SURPLUS and
+          not (tab_code in self.status and
+          self.status[tab_code].status == K.STATUS_DEFEATED)])
+    previously_elected = set()
     for tab_code in self.ballots_for:
       if (tab_code in self.status and
             self.status[tab_code].status == K.STATUS_DEFEATED):
@@ -539,14 +1127,39 @@ class Tabulation(object):
       if tab_code == K.LABEL_RESIDUAL_SURPLUS:
         tab_code_tally = self.total_residual_surplus
       else:
-        tab_code_tally = sum([
-              self.ballot_votes(ballot)
-              for ballot in self.ballots_for[tab_code]], self.zero_votes())
+        tab_code_tally = pile_votes[tab_code]
+        if self.observer is not None:
+          self.phase_counters[observe.COUNTER_PILES_TOUCHED] += 1
+          if not self.is_irv():
+            self.phase_counters[observe.COUNTER_DECIMAL_OPERATIONS] += (
+                  2 * len(self.ballots_for[tab_code]))
         if (tab_code in self.status and
               self.status[tab_code].status == K.STATUS_ELECTED and
               tab_code_tally == self.zero_votes()):
           tab_code_tally = self.votes_for_previously_elected(tab_code_tally)
+          previously_elected.add(tab_code)
       self.tallies[tab_code].append(tab_code_tally)
+    if self.precinct_tally is not None:
+      self.precinct_tally.add_round({tab_code: self.precinct_votes[tab_code]
+            for tab_code in pile_votes if tab_code not in previously_elected})
+
+  def tally_piles(self, tab_codes):
+    """
+    Get the total votes of the ballots assigned to tabulation codes
+
+    Arguments
+    ---------
+    tab_codes
+      A collection of candidate names and other tabulation labels.
+
+    Returns
+    -------
+    A dict of vote totals, keyed by tabulation code.
+
+    """
+    return {tab_code: sum([self.ballot_votes(ballot)
+          for ballot in self.ballots_for[tab_code]], self.zero_votes())
+          for tab_code in tab_codes}
 
   def update_candidate_status_tally(self):
     index_round = self.nbr_round - 1
@@ -621,6 +1234,22 @@ class Tabulation(object):
     for defeated_candidate in defeated:
       self.assign_ballots(self.ballots_for[defeated_candidate])
       self.ballots_for[defeated_candidate] = []
+      self._clear_precinct_votes(defeated_candidate)
+
+  def _clear_precinct_votes(self, tab_code):
+    """
+    Set to zero the votes by precinct of a tabulation code, if kept
+    """
+    if self.precinct_votes is not None:
+      self.precinct_votes[tab_code] = self.precinct_tally.new_row()
+
+  def _add_precinct_votes(self, row, ballot_list):
+    """
+    Add the votes of ballots to a row of votes by precinct
+    """
+    for ballot in ballot_list:
+      row[self._precinct_indexes[ballot.get_precinct()]] += (
+            decimal5.votes_to_json(self.ballot_votes(ballot)))
 
   def get_single_defeat_candidate(self):
     """
@@ -679,6 +1308,7 @@ class Tabulation(object):
         if candidate in tied_candidates}
     selected_candidate = tied_candidates_by_index[
           min(tied_candidates_by_index)]
+    self.round_ties.append((frozenset(tied_candidates), selected_candidate))
     return selected_candidate
 
 
@@ -742,9 +1372,8 @@ class Tabulation(object):
     """
     Calculate the total votes for candidates
     """
-    result = sum([sum([self.ballot_votes(ballot)
-          for ballot in self.ballots_for[candidate]], self.zero_votes())
-          for candidate in self.candidates], self.zero_votes())
+    result = sum(self.tally_piles(self.candidates).values(),
+          self.zero_votes())
     return result
 
   def get_candidates_with_surplus(self):
@@ -766,14 +1395,41 @@ class Tabulation(object):
     for candidate, candidate_votes in candidates_with_surplus.items():
       surplus_votes = candidate_votes - self.threshold
       surplus_factor = surplus_votes / candidate_votes
-      transferred_votes = K.ZERO
-      for ballot in self.ballots_for[candidate]:
-        ballot.update_transfer_value(surplus_factor)
-        transferred_votes += ballot.total_votes()
-      self.assign_ballots(self.ballots_for[candidate])
-      self.ballots_for[candidate] = []
+      self.round_surplus_factors[candidate] = surplus_factor
+      if self.observer is not None:
+        self.phase_counters[observe.COUNTER_DECIMAL_OPERATIONS] += (
+              4 + 3 * len(self.ballots_for[candidate]))
+      transferred_votes = self.transfer_pile_surplus(candidate,
+            surplus_factor)
       self.total_residual_surplus += surplus_votes - transferred_votes
 
+  def transfer_pile_surplus(self, candidate, surplus_factor):
+    """
+    Transfer the ballots of an elected candidate at a reduced value
+
+    Arguments
+    ---------
+    candidate
+      The name of a candidate with surplus votes.
+
+    surplus_factor
+      The Decimal factor by which the transfer value of each of the
+      candidate's ballots is multiplied.
+
+    Returns
+    -------
+    The total votes of the transferred ballots, at their new values.
+
+    """
+    transferred_votes = K.ZERO
+    for ballot in self.ballots_for[candidate]:
+      ballot.update_transfer_value(surplus_factor)
+      transferred_votes += ballot.total_votes()
+    self.assign_ballots(self.ballots_for[candidate])
+    self.ballots_for[candidate] = []
+    self._clear_precinct_votes(candidate)
+    return transferred_votes
+
   def get_stv_alternative_defeats(self):
     """
     Get largest set of STV candidates that can be alternatively defeated
@@ -0,0 +1,363 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Tabulate a contest repeatedly with other multiples of its ballot groups
+
+Bootstrap confidence estimates, audit simulations, and early projections
+all tabulate the same contest many times, each time with a different
+number of ballots in each ballot group.  The ballots are validated only
+once.  Each replicate is a vector of replacement multiples, one for
+each validated ballot group, and the replicates are tabulated across a
+pool of processes, reusing the validated rankings.
+
+A ballot group with a replacement multiple of zero is left out of that
+replicate.  The frequencies with which candidates are elected are
+summarized by summarize().
+
+For an early projection, the ballots received so far are the contest's
+ballots, and bootstrap_multiples() draws replicates with the number of
+ballots expected in all.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import ballot
+from sb1288 import errors
+from sb1288 import parallel
+from sb1288 import rcv
+from sb1288 import validate
+from sb1288 import with_json
+
+import argparse
+import bisect
+import collections
+import json
+import random
+
+ReplicateResult = collections.namedtuple('ReplicateResult', [
+      'index', 'elected', 'nbr_rounds', 'error'])
+ReplicateResult.__doc__ = """
+The result of tabulating one replicate
+
+Attributes
+----------
+index
+  The 0-based index of the replicate's multiples vector.
+
+elected
+  A frozenset of the elected candidates, or None if the tabulation
+  raised an error.
+
+nbr_rounds
+  The number of rounds of the tabulation, or None if it raised an
+  error.
+
+error
+  None, or if the multiples vector is not valid or the tabulation
+  raised an RcvValueError or RcvImplementationError, a string
+  describing the error.
+
+"""
+
+WinnerFrequencies = collections.namedtuple('WinnerFrequencies', [
+      'nbr_replicates', 'nbr_errors', 'elected', 'winner_sets'])
+WinnerFrequencies.__doc__ = """
+A summary of replicate results, as from summarize()
+
+Attributes
+----------
+nbr_replicates
+  The number of replicates, including those with errors.
+
+nbr_errors
+  The number of replicates with errors.
+
+elected
+  A dict keyed by candidate, of the number of replicates that elected
+  the candidate.  Only candidates elected in some replicate are keys.
+
+winner_sets
+  A dict keyed by a frozenset of the elected candidates, of the number
+  of replicates that elected exactly that set.
+
+"""
+
+# The number of replicates taken from multiples at a time, per process
+REPLICATES_PER_PROCESS = 8
+
+# The validated contest used by tabulations in a worker process
+_contest = {}
+
+def tabulate_replicates(nbr_seats_to_fill, candidates, ballots,
+      max_ranking_levels, tie_breaker, options={}, multiples=(),
+      nbr_processes=None):
+  """
+  Tabulate an RCV contest once for each vector of replacement multiples
+
+  Arguments
+  ---------
+  nbr_seats_to_fill, candidates, ballots, max_ranking_levels,
+  tie_breaker, options
+    The same as for the __init__ method of the rcv.Tabulation class.
+    The ballots may be the ballots attribute of another Tabulation, so
+    that they are not validated again.
+
+  multiples
+    An iterable, possibly a generator, of replicates, each a sequence
+    of non-negative integers with one replacement multiple for each
+    ballot group, in the same order as the ballots.
+    Default value: an empty tuple
+
+  nbr_processes
+    The number of processes used to tabulate replicates, as for
+    parallel.map_tasks().
+    Default value: None
+
+  Returns
+  -------
+  A generator of ReplicateResult values, one for each replicate, in
+  order.  Replicates are taken from multiples as they are tabulated,
+  up to REPLICATES_PER_PROCESS for each process at a time.
+
+  Raises
+  ------
+  RcvValueError
+    If candidates, ballots, or max_ranking_levels do not pass
+    validation.  An invalid multiples vector, or an error in tabulating
+    a replicate, is reported in its ReplicateResult.
+
+  """
+  validator = validate.Validator()
+  candidates = validator.candidates(candidates)
+  max_ranking_levels = validator.max_ranking_levels(max_ranking_levels)
+  ballots = validator.ballots(ballots, candidates, max_ranking_levels)
+  contest_args = (nbr_seats_to_fill, candidates, ballots,
+        max_ranking_levels, tie_breaker, options)
+  nbr_processes = parallel.process_count(nbr_processes)
+  if nbr_processes <= 1:
+    # keep the contest local, so that generators do not share it
+    contest = _make_contest(*contest_args)
+    return (_tabulate_replicate(contest, task)
+          for task in enumerate(multiples))
+  return parallel.map_tasks(_tabulate_task, enumerate(multiples),
+        nbr_processes, _set_contest, contest_args,
+        window=REPLICATES_PER_PROCESS * nbr_processes)
+
+def bootstrap_multiples(multiples, nbr_replicates, nbr_ballots=None,
+      seed=None):
+  """
+  Draw replicates of multiples by sampling ballots with replacement
+
+  Arguments
+  ---------
+  multiples
+    A sequence of the non-negative multiples of the ballot groups, for
+    example, the number of ballots of each group received so far.
+
+  nbr_replicates
+    The number of replicates to draw.
+
+  nbr_ballots
+    The number of ballots drawn for each replicate, or None for the sum
+    of multiples.  For an early projection, this is the number of
+    ballots expected in all.
+    Default value: None
+
+  seed
+    The seed for the random number generator.  The same arguments with
+    the same seed draw the same replicates.
+    Default value: None
+
+  Returns
+  -------
+  A generator of lists of multiples, one for each replicate, each with
+  the same length as multiples and a sum of nbr_ballots.
+
+  Raises
+  ------
+  RcvValueError
+    If nbr_ballots is positive but there are no ballots to sample.
+
+  """
+  cumulative = []
+  total = 0
+  for multiple in multiples:
+    total += multiple
+    cumulative.append(total)
+  if nbr_ballots is None:
+    nbr_ballots = total
+  if not total and nbr_ballots:
+    raise errors.RcvValueError('There are no ballots to sample:', (
+          ('nbr_ballots', nbr_ballots),
+          ))
+  return _draw_replicates(cumulative, nbr_replicates, nbr_ballots,
+        random.Random(seed))
+
+def summarize(results):
+  """
+  Summarize the winner frequencies of replicate results
+
+  Arguments
+  ---------
+  results
+    An iterable of ReplicateResult values, as from
+    tabulate_replicates().
+
+  Returns
+  -------
+  A WinnerFrequencies value.
+
+  """
+  nbr_replicates = 0
+  nbr_errors = 0
+  elected = {}
+  winner_sets = {}
+  for result in results:
+    nbr_replicates += 1
+    if result.error is not None:
+      nbr_errors += 1
+      continue
+    for candidate in result.elected:
+      elected[candidate] = elected.get(candidate, 0) + 1
+    winner_sets[result.elected] = winner_sets.get(result.elected, 0) + 1
+  return WinnerFrequencies(nbr_replicates, nbr_errors, elected,
+        winner_sets)
+
+def frequencies_to_json(frequencies, description=None):
+  """
+  Convert winner frequencies to a JSON string
+
+  The winner sets are listed from the most frequent, with the elected
+  candidates of each sorted.
+
+  """
+  item = collections.OrderedDict()
+  if description is not None:
+    item['description'] = description
+  item['nbr_replicates'] = frequencies.nbr_replicates
+  item['nbr_errors'] = frequencies.nbr_errors
+  item['elected'] = collections.OrderedDict(sorted(
+        frequencies.elected.items(), key=lambda pair: (-pair[1], pair[0])))
+  item['winner_sets'] = [[sorted(winners), count]
+        for winners, count in sorted(frequencies.winner_sets.items(),
+        key=lambda pair: (-pair[1], sorted(pair[0])))]
+  return json.dumps(item, indent=2) + '\n'
+
+def _draw_replicates(cumulative, nbr_replicates, nbr_ballots, rng):
+  """
+  Draw replicates from the cumulative multiples of the ballot groups
+
+  This function is for internal use only.
+
+  """
+  total = cumulative[-1] if cumulative else 0
+  for ix in range(nbr_replicates):
+    replicate = [0] * len(cumulative)
+    for jx in range(nbr_ballots):
+      replicate[bisect.bisect_right(cumulative,
+            int(rng.random() * total))] += 1
+    yield replicate
+
+def _make_contest(nbr_seats_to_fill, candidates, ballots,
+      max_ranking_levels, tie_breaker, options):
+  """Get a dict of the validated contest for tabulating replicates"""
+  return {'args': (nbr_seats_to_fill, candidates, max_ranking_levels,
+        tie_breaker, options), 'ballots': ballots}
+
+def _set_contest(*contest_args):
+  """Save the validated contest for tabulations in a worker process"""
+  _contest.update(_make_contest(*contest_args))
+
+def _tabulate_task(task):
+  """Tabulate one replicate with the contest saved in a worker process"""
+  return _tabulate_replicate(_contest, task)
+
+def _tabulate_replicate(contest, task):
+  """Tabulate one replicate of a validated contest"""
+  index, multiples = task
+  nbr_seats_to_fill, candidates, max_ranking_levels, tie_breaker, options = (
+        contest['args'])
+  try:
+    replicate_ballots = _replicate_ballots(contest['ballots'], multiples)
+    elected, status, tally = rcv.Tabulation(nbr_seats_to_fill,
+          candidates, replicate_ballots, max_ranking_levels, tie_breaker,
+          options).tabulate()
+  except (errors.RcvValueError, errors.RcvImplementationError) as exc:
+    return ReplicateResult(index, None, None,
+          '{}: {}'.format(type(exc).__name__, exc.message))
+  return ReplicateResult(index, frozenset(elected),
+        max([len(votes) for votes in tally.values()] + [0]), None)
+
+def _replicate_ballots(ballots, multiples):
+  """
+  Get Ballot objects for the validated ballot groups with other multiples
+
+  This function is for internal use only.
+
+  Raises
+  ------
+  RcvValueError
+    If multiples does not have a non-negative int for each ballot
+    group.
+
+  """
+  multiples = list(multiples)
+  if len(multiples) != len(ballots):
+    raise errors.RcvValueError(
+          'A multiples vector does not have one multiple per ballot group:', (
+          ('len(multiples)', len(multiples)),
+          ('len(ballots)', len(ballots)),
+          ))
+  replicate_ballots = []
+  for ix, (ballot_group, multiple) in enumerate(zip(ballots, multiples)):
+    if type(multiple) != int or multiple < 0:
+      raise errors.RcvValueError('Invalid replacement multiple:', (
+            ('multiple', multiple),
+            ('index', ix),
+            ))
+    if multiple:
+      replicate_ballots.append(ballot.Ballot(multiple,
+            ballot_group.get_rankings(), ballot_group.get_precinct()))
+  return replicate_ballots
+
+def main(argv=None):
+  """Run bootstrap replicates of a contest from the command line"""
+  parser = argparse.ArgumentParser(prog='python -m sb1288.resample',
+        description='Tabulate bootstrap replicates of an RCV contest and'
+        ' summarize how often each candidate is elected.')
+  parser.add_argument('input_json',
+        help='JSON file with the contest specification')
+  parser.add_argument('output_json', nargs='?', default='',
+        help='file for the JSON summary; default is standard output')
+  parser.add_argument('--replicates', type=int, default=1000,
+        help='number of replicates; default is 1000')
+  parser.add_argument('--ballots', type=int, default=None,
+        help='number of ballots in each replicate, such as the number'
+        ' expected in all for an early projection; default is the'
+        ' number of ballots in the contest')
+  parser.add_argument('--seed', type=int, default=None,
+        help='seed for drawing replicates')
+  parser.add_argument('--processes', type=int, default=None,
+        help='number of worker processes; default is the number of CPUs')
+  args = parser.parse_args(argv)
+  tabulate_args, tabulation_spec = with_json.build_tabulate_args(
+        args.input_json, None)
+  tabulate_args = list(tabulate_args)
+  validator = validate.Validator()
+  candidates = validator.candidates(tabulate_args[1])
+  max_ranking_levels = validator.max_ranking_levels(tabulate_args[3])
+  tabulate_args[2] = validator.ballots(tabulate_args[2], candidates,
+        max_ranking_levels)
+  multiples = bootstrap_multiples([ballot_group.get_multiple()
+        for ballot_group in tabulate_args[2]], args.replicates,
+        args.ballots, args.seed)
+  frequencies = summarize(tabulate_replicates(*tabulate_args,
+        multiples=multiples, nbr_processes=args.processes))
+  json_str = frequencies_to_json(frequencies,
+        tabulation_spec.get('description'))
+  with_json.write_file(args.output_json, with_json.s2u(json_str))
+  return frequencies
+
+if __name__ == '__main__':
+  main()
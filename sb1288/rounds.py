@@ -0,0 +1,150 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Compute any round of an IRV tally directly, without earlier rounds
+
+In an IRV tabulation, a ballot counts in a round for its highest ranked
+candidate among those still continuing, or is counted as exhausted.  So
+the tally of a round depends only on the ballots and the candidates
+continuing in that round, which are given by the candidates elected or
+defeated in earlier rounds.  Rounds can then be tallied independently,
+for example to verify a tabulation, and in parallel.
+
+These functions apply to IRV only.  STV tallies also depend on the
+transfer values of ballots, which are set by earlier rounds.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import constants as K
+from sb1288 import parallel
+
+def decisions_from_status(status):
+  """
+  Get the candidates elected and defeated in each round
+
+  Arguments
+  ---------
+  status
+    A dict of status.Status objects keyed by candidate, as returned by
+    rcv.tabulate().
+
+  Returns
+  -------
+  A list with an item for each round, up to the last round in which a
+  candidate was elected or defeated, which is a pair of sets of the
+  candidates elected and defeated in that round.
+
+  """
+  nbr_rounds = max([cstatus.nbr_round for cstatus in status.values()] + [0])
+  decisions = [(set(), set()) for ix in range(nbr_rounds)]
+  for candidate, cstatus in status.items():
+    if cstatus.status == K.STATUS_ELECTED:
+      decisions[cstatus.nbr_round - 1][0].add(candidate)
+    elif cstatus.status == K.STATUS_DEFEATED:
+      decisions[cstatus.nbr_round - 1][1].add(candidate)
+  return decisions
+
+def continuing_by_round(candidates, decisions):
+  """
+  Get the continuing candidates of each round
+
+  Arguments
+  ---------
+  candidates
+    A collection of the names of all candidates.
+
+  decisions
+    A sequence with an item for each round, which is a pair of
+    collections of the candidates elected and defeated in that round,
+    as from decisions_from_status().
+
+  Returns
+  -------
+  A list of frozensets of the candidates continuing at the start of
+  each round, with an item for each item of decisions.
+
+  """
+  continuing = frozenset(candidates)
+  result = []
+  for elected, defeated in decisions:
+    result.append(continuing)
+    continuing = continuing - frozenset(elected) - frozenset(defeated)
+  return result
+
+def round_tally(ballots, continuing, max_ranking_levels):
+  """
+  Tally an IRV round from its continuing candidates
+
+  Arguments
+  ---------
+  ballots
+    A sequence of ballot.Ballot objects, for example, the ballots
+    attribute of an rcv.Tabulation.  Their tabulation states are not
+    changed.
+
+  continuing
+    A collection of the candidates continuing in the round.
+
+  max_ranking_levels
+    The validated max_ranking_levels of the tabulation.
+
+  Returns
+  -------
+  A dict of vote totals for each continuing candidate and each other
+  IRV tabulation category, the same as the votes of the round in the
+  tally returned by rcv.tabulate().
+
+  """
+  continuing = frozenset(continuing)
+  tally = {tab_code: 0 for tab_code in continuing}
+  tally.update({label: 0 for label in K.OTHER_LABELS_LIST
+        if label != K.LABEL_RESIDUAL_SURPLUS})
+  for ballot_group in ballots:
+    tally[ballot_group.peek_hrcc(continuing, max_ranking_levels)] += (
+          ballot_group.get_multiple())
+  return tally
+
+def round_tallies(ballots, continuing_sets, max_ranking_levels,
+      nbr_processes=None):
+  """
+  Tally IRV rounds independently, possibly in a pool of processes
+
+  Arguments
+  ---------
+  ballots
+    As for round_tally().  The ballots are sent once to each process.
+
+  continuing_sets
+    A sequence of collections of continuing candidates, one per round
+    to be tallied, as from continuing_by_round().
+
+  max_ranking_levels
+    As for round_tally().
+
+  nbr_processes
+    As for parallel.map_tasks().
+    Default value: None
+
+  Returns
+  -------
+  A list of the values of round_tally(), one for each continuing set.
+
+  """
+  return list(parallel.map_tasks(_round_tally_task,
+        [frozenset(continuing) for continuing in continuing_sets],
+        nbr_processes, _set_worker_ballots,
+        (tuple(ballots), max_ranking_levels)))
+
+_worker_ballots = None
+
+def _set_worker_ballots(ballots, max_ranking_levels):
+  """Keep the ballots of a worker process for its tasks"""
+  global _worker_ballots
+  _worker_ballots = (ballots, max_ranking_levels)
+
+def _round_tally_task(continuing):
+  """Tally a round in a worker process"""
+  ballots, max_ranking_levels = _worker_ballots
+  return round_tally(ballots, continuing, max_ranking_levels)
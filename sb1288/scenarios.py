@@ -0,0 +1,365 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Tabulate an RCV contest under a grid of scenario variants
+
+The same contest can be tabulated with different tabulation options,
+tie breakers, or numbers of seats to fill.  The ballots are validated
+only once and the variants are tabulated across a pool of processes.
+The results of each variant are compared with those of the baseline
+tabulation, which uses the contest specification without changes.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import constants as K
+from sb1288 import errors
+from sb1288 import parallel
+from sb1288 import rcv
+from sb1288 import validate
+from sb1288 import with_json
+
+import argparse
+import collections
+import itertools
+import json
+
+VARIANT_NAME = 'name'
+VARIANT_NBR_SEATS_TO_FILL = 'nbr_seats_to_fill'
+VARIANT_TIE_BREAKER = 'tie_breaker'
+VARIANT_OPTIONS = 'options'
+VARIANT_KEY_SET = set([
+      VARIANT_NAME,
+      VARIANT_NBR_SEATS_TO_FILL,
+      VARIANT_TIE_BREAKER,
+      VARIANT_OPTIONS,
+      ]) | K.OPTION_KEY_SET
+
+BASELINE_NAME = 'baseline'
+
+ScenarioResult = collections.namedtuple('ScenarioResult', [
+      'name', 'variant', 'elected', 'status', 'tally',
+      'first_divergent_round', 'error'])
+ScenarioResult.__doc__ = """
+The result of tabulating one scenario variant
+
+Attributes
+----------
+name
+  The name of the variant.
+
+variant
+  The dict of changes from the contest specification.
+
+elected, status, tally
+  The values returned by rcv.Tabulation().tabulate(), or None values if
+  the tabulation raised an error.
+
+first_divergent_round
+  The 1-based number of the first round for which the tally differs
+  from the baseline tally, or None if the tallies are the same.
+
+error
+  None, or if the tabulation raised an RcvValueError or
+  RcvImplementationError, a string describing the error.
+
+"""
+
+# The validated contest used by tabulations in a worker process
+_contest = {}
+
+def tabulate_scenarios(nbr_seats_to_fill, candidates, ballots,
+      max_ranking_levels, tie_breaker, options={}, variants=(),
+      nbr_processes=None):
+  """
+  Tabulate an RCV contest for a baseline and each scenario variant
+
+  Arguments
+  ---------
+  nbr_seats_to_fill, candidates, ballots, max_ranking_levels,
+  tie_breaker, options
+    The same as for the __init__ method of the rcv.Tabulation class.
+    These specify the baseline tabulation.
+
+  variants
+    A sequence of dicts, each specifying changes to the baseline for a
+    variant.  A variant may use the following keys:
+
+      name
+        A str name for the variant.  If not provided, a name is built
+        from the other keys and values.
+
+      nbr_seats_to_fill
+        A replacement number of seats to fill.
+
+      tie_breaker
+        A replacement tie_breaker.
+
+      options
+        A dict of options that update the baseline options.
+
+      stop_at_majority, alternative_defeats
+        A value that updates the corresponding baseline option.
+
+    Default value: an empty tuple
+
+  nbr_processes
+    The number of processes used to tabulate variants, as for
+    parallel.map_tasks().
+    Default value: None
+
+  Returns
+  -------
+  A list of ScenarioResult values, the first for the baseline, followed
+  by one for each variant in order.
+
+  Raises
+  ------
+  RcvValueError
+    If candidates, ballots, or max_ranking_levels do not pass
+    validation, or if a variant uses an unsupported key.  Errors in
+    validating or tabulating an individual variant are reported in its
+    ScenarioResult.
+
+  """
+  validator = validate.Validator()
+  candidates = validator.candidates(candidates)
+  max_ranking_levels = validator.max_ranking_levels(max_ranking_levels)
+  ballots = validator.ballots(ballots, candidates, max_ranking_levels)
+  tasks = [(BASELINE_NAME, {}, nbr_seats_to_fill, tie_breaker, options)]
+  for variant in variants:
+    tasks.append(apply_variant(variant, nbr_seats_to_fill, tie_breaker,
+          options))
+  results = list(parallel.map_tasks(_tabulate_task, tasks,
+        nbr_processes, _set_contest,
+        (candidates, ballots, max_ranking_levels)))
+  base_tally = results[0].tally
+  for ix, result in enumerate(results):
+    if result.error is None and base_tally is not None:
+      results[ix] = result._replace(first_divergent_round=
+            first_divergent_round(result.tally, base_tally))
+  return results
+
+def apply_variant(variant, nbr_seats_to_fill, tie_breaker, options):
+  """
+  Apply a variant's changes to baseline tabulation arguments
+
+  Returns
+  -------
+  A tuple of the variant name, the variant, and the variant's
+  nbr_seats_to_fill, tie_breaker, and options values.
+
+  Raises
+  ------
+  RcvValueError
+    If the variant is not a dict or uses an unsupported key.
+
+  """
+  if type(variant) != dict:
+    raise errors.RcvValueError('A scenario variant is not a dict:', (
+          ('type(variant)', type(variant)),
+          ))
+  for key in variant:
+    if key not in VARIANT_KEY_SET:
+      raise errors.RcvValueError('Invalid scenario variant key:', (
+            ('key', key),
+            ))
+  variant_options = dict(options)
+  variant_options.update(variant.get(VARIANT_OPTIONS, {}))
+  for option_name in K.OPTION_KEY_SET:
+    if option_name in variant:
+      variant_options[option_name] = variant[option_name]
+  name = variant.get(VARIANT_NAME, None)
+  if name is None:
+    name = variant_name(variant)
+  return (name, variant,
+        variant.get(VARIANT_NBR_SEATS_TO_FILL, nbr_seats_to_fill),
+        variant.get(VARIANT_TIE_BREAKER, tie_breaker),
+        variant_options)
+
+def variant_name(variant):
+  """Build a name for a variant from its keys and values"""
+  parts = []
+  for key, value in sorted(variant.items()):
+    if key == VARIANT_OPTIONS:
+      parts.extend(['{}={}'.format(name, value)
+            for name, value in sorted(value.items())])
+    elif key != VARIANT_NAME:
+      parts.append('{}={}'.format(key, value))
+  return ', '.join(parts)
+
+def expand_grid(grid):
+  """
+  Expand a grid of variant values into a list of variants
+
+  Arguments
+  ---------
+  grid
+    A dict keyed by variant keys, as described for
+    tabulate_scenarios(), each with a value that is a list of
+    alternative values for that key.
+
+  Returns
+  -------
+  A list of variant dicts, one for each combination of values, in a
+  deterministic order.
+
+  """
+  keys = sorted(grid)
+  variants = [dict(zip(keys, values))
+        for values in itertools.product(*[grid[key] for key in keys])]
+  return variants
+
+def first_divergent_round(tally, base_tally):
+  """
+  Find the first round for which two tallies differ
+
+  Arguments
+  ---------
+  tally, base_tally
+    Tallies as returned by rcv.Tabulation().tabulate().  IRV and STV
+    tallies can be compared with each other.
+
+  Returns
+  -------
+  The 1-based number of the first round with a different vote total
+  for any candidate or other tabulation category, or a round that
+  exists in only one tally.  None if the tallies are the same.
+
+  """
+  nbr_rounds = max([len(votes) for votes in tally.values()] +
+        [len(votes) for votes in base_tally.values()] + [0])
+  codes = set(tally) | set(base_tally)
+  for index_round in range(nbr_rounds):
+    for code in codes:
+      votes = _votes_in_round(tally, code, index_round)
+      base_votes = _votes_in_round(base_tally, code, index_round)
+      if votes != base_votes:
+        return index_round + 1
+  return None
+
+def _votes_in_round(tally, code, index_round):
+  """Get comparable votes for a round, or None if there are none"""
+  try:
+    votes = tally[code][index_round]
+  except (KeyError, IndexError):
+    return None
+  if type(votes) == int:
+    votes = K.Decimal(votes)
+  return votes
+
+def _set_contest(candidates, ballots, max_ranking_levels):
+  """Save the validated contest for tabulations in this process"""
+  _contest['candidates'] = candidates
+  _contest['ballots'] = ballots
+  _contest['max_ranking_levels'] = max_ranking_levels
+
+def _tabulate_task(task):
+  """Tabulate one scenario variant with the saved, validated contest"""
+  name, variant, nbr_seats_to_fill, tie_breaker, options = task
+  try:
+    elected, status, tally = rcv.Tabulation(nbr_seats_to_fill,
+          _contest['candidates'], _contest['ballots'],
+          _contest['max_ranking_levels'], tie_breaker, options
+          ).tabulate()
+  except (errors.RcvValueError, errors.RcvImplementationError) as exc:
+    return ScenarioResult(name, variant, None, None, None, None,
+          '{}: {}'.format(type(exc).__name__, exc.message))
+  return ScenarioResult(name, variant, elected, status, tally, None, None)
+
+def scenarios_to_json(results, description=None):
+  """
+  Convert scenario results to a compact JSON comparison string
+
+  Arguments
+  ---------
+  results
+    A list of ScenarioResult values, as returned by
+    tabulate_scenarios().
+
+  description
+    A description of the contest, or None.
+
+  Returns
+  -------
+  A JSON string with one line per scenario, showing its name, changes,
+  winners, number of rounds, whether the winners are the same as the
+  baseline winners, the first divergent round, and any error.
+
+  """
+  base_elected = results[0].elected
+  lines = []
+  for result in results:
+    item = collections.OrderedDict()
+    item['name'] = result.name
+    item['variant'] = result.variant
+    if result.error is None:
+      item['elected'] = sorted(result.elected)
+      item['nbr_rounds'] = max([len(votes)
+            for votes in result.tally.values()] + [0])
+      item['same_elected'] = (base_elected is not None and
+            set(result.elected) == set(base_elected))
+      item['first_divergent_round'] = result.first_divergent_round
+    else:
+      item['error'] = result.error
+    lines.append('    ' + json.dumps(item, sort_keys=False))
+  json_str = '{\n'
+  if description is not None:
+    json_str += '  "description": ' + json.dumps(description) + ',\n'
+  json_str += '  "scenarios": [\n' + ',\n'.join(lines) + '\n  ]\n}\n'
+  return json_str
+
+def read_variants(variants_json):
+  """
+  Read scenario variants from a JSON file
+
+  The JSON file should contain an object with a "variants" array of
+  variant objects, a "grid" object of arrays of variant values, or
+  both.  Variants from the grid follow the listed variants.
+
+  """
+  variants_spec = with_json.read_json(variants_json)
+  variants = [_u2s_variant(variant)
+        for variant in variants_spec.get('variants', [])]
+  grid = variants_spec.get('grid', {})
+  grid = {with_json.u2s(key): [_u2s_value(value) for value in values]
+        for key, values in grid.items()}
+  variants.extend(expand_grid(grid))
+  return variants
+
+def _u2s_variant(variant):
+  """Convert a variant's keys and values from JSON, as needed"""
+  return {with_json.u2s(key): _u2s_value(value)
+        for key, value in variant.items()}
+
+def _u2s_value(value):
+  """Convert a variant value from JSON, as needed"""
+  if type(value) == dict:
+    return _u2s_variant(value)
+  return with_json.u2s(value)
+
+def main(argv=None):
+  """Run scenario variants from the command line"""
+  parser = argparse.ArgumentParser(prog='python -m sb1288.scenarios',
+        description='Tabulate an RCV contest under scenario variants.')
+  parser.add_argument('input_json',
+        help='JSON file with the contest specification')
+  parser.add_argument('variants_json',
+        help='JSON file with "variants" and/or a "grid" of variants')
+  parser.add_argument('output_json', nargs='?', default='',
+        help='file for the JSON comparison; default is standard output')
+  parser.add_argument('--processes', type=int, default=None,
+        help='number of worker processes; default is the number of CPUs')
+  args = parser.parse_args(argv)
+  tabulate_args, tabulation_spec = with_json.build_tabulate_args(
+        args.input_json, None)
+  variants = read_variants(args.variants_json)
+  results = tabulate_scenarios(*tabulate_args, variants=variants,
+        nbr_processes=args.processes)
+  json_str = scenarios_to_json(results, tabulation_spec.get('description'))
+  with_json.write_file(args.output_json, with_json.s2u(json_str))
+  return results
+
+if __name__ == '__main__':
+  main()
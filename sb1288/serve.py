@@ -0,0 +1,334 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Serve RCV tabulations over HTTP
+
+A local HTTP service accepts tabulation specifications, with the same
+names as are used for the input to with_json.tabulate(), and responds
+with the same JSON results as with_json.results_to_json().  It is run
+with:
+
+  python -m sb1288.serve --port 8288
+
+and is used by POSTing a specification to /tabulate.  GET /metrics
+gives metrics in the Prometheus text format, and GET /health responds
+with 'ok'.
+
+Tabulations are run in a pool of worker processes that is started
+before the first request.  Identical requests that arrive while a
+tabulation of the same specification is pending share that one
+tabulation.  When the number of pending tabulations reaches the queue
+size, further requests get a 503 response, so clients can back off.
+With a timeout, a tabulation that is not finished that many seconds
+after it was queued is stopped, freeing its worker and its place in
+the queue.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import errors
+from sb1288 import metrics
+from sb1288 import observe
+from sb1288 import rcv
+from sb1288 import with_json
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import sys
+import threading
+import time
+
+try:
+  from http.server import BaseHTTPRequestHandler, HTTPServer
+  from socketserver import ThreadingMixIn
+except ImportError:
+  # Python 2
+  from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+  from SocketServer import ThreadingMixIn
+
+DEFAULT_PORT = 8288
+
+# The cache name used for metrics of coalesced requests
+CACHE_COALESCE = 'coalesce'
+
+# A small contest that each worker tabulates once when it starts
+_WARM_UP_ARGS = (1, ' A B', ((2, ' A B'), (1, ' B A')), 3, ' A B')
+
+
+class TabulationService(object):
+  """
+  Tabulate specifications in a pool of worker processes
+
+  Attributes
+  ----------
+  metrics
+    A metrics.Metrics object for the tabulations of the service.
+
+  """
+
+  def __init__(self, nbr_processes=None, queue_size=None, timeout=None):
+    """
+    Start the worker processes
+
+    Arguments
+    ---------
+    nbr_processes
+      The number of worker processes.  If None, the number of CPUs.
+      Default value: None
+
+    queue_size
+      The maximum number of distinct tabulations that are running or
+      waiting to run.  If None, twice the number of worker processes.
+      Default value: None
+
+    timeout
+      The maximum seconds to wait for a tabulation, after which the
+      request gets a 504 response.  The tabulation is stopped at its
+      deadline, that many seconds after it was queued, so it does not
+      keep its worker or its place in the queue.  If None, there is no
+      limit.
+      Default value: None
+
+    """
+    if nbr_processes is None:
+      nbr_processes = multiprocessing.cpu_count()
+    if queue_size is None:
+      queue_size = 2 * nbr_processes
+    self.queue_size = queue_size
+    self.timeout = timeout
+    self.metrics = metrics.Metrics()
+    self.lock = threading.Lock()
+    self.pending = {}
+    self.pool = multiprocessing.Pool(nbr_processes, _warm_up)
+
+  def close(self):
+    """Stop the worker processes"""
+    self.pool.terminate()
+    self.pool.join()
+
+  def tabulate(self, tabulation_spec):
+    """
+    Tabulate a specification, sharing any identical pending tabulation
+
+    Arguments
+    ---------
+    tabulation_spec
+      A dict with the same names as are used for the input to
+      with_json.tabulate(), except that include is not supported.
+
+    Returns
+    -------
+    A tuple of an HTTP status code and a str of JSON.  For status 200,
+    the JSON is the same as from with_json.results_to_json().
+    Otherwise, it is an object with an "error" message.
+
+    """
+    if not isinstance(tabulation_spec, dict) or 'include' in tabulation_spec:
+      return 400, _error_json('A tabulation spec must be a JSON object '
+            'without an include name.')
+    key = hashlib.sha1(json.dumps(tabulation_spec, sort_keys=True).
+          encode('utf-8')).hexdigest()
+    with self.lock:
+      pending = self.pending.get(key)
+      is_hit = pending is not None
+      if not is_hit:
+        if len(self.pending) >= self.queue_size:
+          return 503, _error_json('Too many pending tabulations.')
+        deadline = None
+        if self.timeout is not None:
+          deadline = time.time() + self.timeout
+        callbacks = {'callback': lambda result: self._finish(key, result)}
+        if sys.version_info[0] >= 3:
+          callbacks['error_callback'] = lambda exc: self._fail(key, exc)
+        pending = self.pool.apply_async(_tabulate_task,
+              (tabulation_spec, deadline), **callbacks)
+        self.pending[key] = pending
+    self.metrics.record_cache(CACHE_COALESCE, is_hit)
+    try:
+      result = pending.get(self.timeout)
+    except multiprocessing.TimeoutError:
+      return 504, _error_json('The tabulation did not finish in time.')
+    except Exception as exc:
+      # Python 2 has no error_callback, so forget the failure here
+      self._forget(key, pending)
+      return 500, _error_json('The tabulation failed: {}: {}'.format(
+            type(exc).__name__, exc))
+    return result['status'], result['body']
+
+  def _finish(self, key, result):
+    """Record the metrics of a finished tabulation and forget it"""
+    with self.lock:
+      del self.pending[key]
+    for kind, phase, elapsed in result['events']:
+      self.metrics(observe.TabulationEvent(kind, phase, None, elapsed, None))
+    if result['status'] == 200:
+      self.metrics.inc(metrics.METRIC_CONTESTS)
+      self.metrics.inc(metrics.METRIC_BALLOT_GROUPS,
+            amount=result['ballot_groups'])
+    elif result['kind'] is not None:
+      self.metrics.inc(metrics.METRIC_VALIDATION_FAILURES, result['kind'])
+
+  def _fail(self, key, exc):
+    """
+    Forget a tabulation that failed outside of _tabulate_task()
+
+    For example, its result could not be pickled.  The requests waiting
+    for it get a 500 response.  Python 2 has no error callback, so
+    there the tabulation is forgotten by the first request that gets
+    the 500 response.
+
+    """
+    with self.lock:
+      del self.pending[key]
+
+  def _forget(self, key, pending):
+    """
+    Forget a failed tabulation, unless it has already been forgotten
+
+    Its key may since have been used by a later tabulation, which is
+    not forgotten.
+
+    """
+    with self.lock:
+      if self.pending.get(key) is pending:
+        del self.pending[key]
+
+
+def _warm_up():
+  """Prepare a worker process by running a small tabulation"""
+  rcv.tabulate(*_WARM_UP_ARGS)
+
+def _tabulate_task(tabulation_spec, deadline=None):
+  """
+  Tabulate in a worker process, stopping at any deadline
+
+  Returns
+  -------
+  A dict with the HTTP status code, the JSON body, the number of
+  ballot groups, the kind of any validation failure, and the kind,
+  phase, and elapsed time of each tabulation event.
+
+  """
+  events = []
+  result = {'status': 200, 'body': None, 'ballot_groups': 0, 'kind': None}
+  tabulation = None
+  try:
+    tabulate_args, tabulation_spec = with_json.build_tabulate_args(
+          tabulation_spec, None)
+    tabulation = rcv.Tabulation(*tabulate_args, observer=events.append)
+    result['ballot_groups'] = len(tabulation.ballots)
+    elected, status, tally = tabulation.tabulate(deadline=deadline)
+    result['body'] = with_json.results_to_json(elected, status, tally,
+          tabulation_spec.get('description'), tabulation.precinct_tally)
+  except errors.RcvValueError as exc:
+    result.update(status=400, body=_error_json(str(exc)))
+    if tabulation is None:
+      result['kind'] = metrics.validation_failure_kind(exc)
+  except errors.RcvImplementationError as exc:
+    result.update(status=500, body=_error_json(str(exc)))
+  except errors.RcvCancelledError as exc:
+    result.update(status=504,
+          body=_error_json('The tabulation did not finish in time.'))
+  except Exception as exc:
+    result.update(status=400, body=_error_json('Invalid tabulation spec: '
+          '{}: {}'.format(type(exc).__name__, exc)))
+  result['events'] = [(event.kind, event.phase, event.elapsed)
+        for event in events if event.kind != observe.EVENT_PROGRESS]
+  return result
+
+def _error_json(message):
+  """Get the JSON body of an error response"""
+  return json.dumps({'error': message}) + '\n'
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+  """An HTTP server that handles each request in its own thread"""
+  daemon_threads = True
+
+
+class TabulationHandler(BaseHTTPRequestHandler):
+  """Handle the HTTP requests of a TabulationService"""
+
+  def do_GET(self):
+    if self.path == '/metrics':
+      self.respond(200, self.server.service.metrics.exposition(),
+            metrics.CONTENT_TYPE)
+    elif self.path == '/health':
+      self.respond(200, 'ok\n', 'text/plain')
+    else:
+      self.respond(404, _error_json('Not found.'))
+
+  def do_POST(self):
+    if self.path not in ('/', '/tabulate'):
+      self.respond(404, _error_json('Not found.'))
+      return
+    length = int(self.headers.get('Content-Length', 0))
+    try:
+      tabulation_spec = json.loads(self.rfile.read(length).decode('utf-8'))
+    except ValueError as exc:
+      self.respond(400, _error_json('Invalid JSON: {}'.format(exc)))
+      return
+    status, body = self.server.service.tabulate(tabulation_spec)
+    self.respond(status, body)
+
+  def respond(self, status, body, content_type='application/json'):
+    """Send a response with a text body"""
+    body = body.encode('utf-8')
+    self.send_response(status)
+    self.send_header('Content-Type', content_type)
+    self.send_header('Content-Length', str(len(body)))
+    if status == 503:
+      self.send_header('Retry-After', '1')
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    pass
+
+
+def make_server(service, host='127.0.0.1', port=DEFAULT_PORT):
+  """
+  Make an HTTP server for a TabulationService
+
+  Returns
+  -------
+  A ThreadingHTTPServer, which serves requests when its serve_forever()
+  method is called.  If the port is 0, a free port is chosen, which is
+  given by the server's server_address attribute.
+
+  """
+  server = ThreadingHTTPServer((host, port), TabulationHandler)
+  server.service = service
+  return server
+
+def main(argv=None):
+  """Serve tabulations from the command line"""
+  parser = argparse.ArgumentParser(prog='python -m sb1288.serve',
+        description='Serve RCV tabulations over HTTP.')
+  parser.add_argument('--host', default='127.0.0.1',
+        help='address to listen on; default is 127.0.0.1')
+  parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+        help='port to listen on; default is 8288')
+  parser.add_argument('--processes', type=int, default=None,
+        help='number of worker processes; default is the number of CPUs')
+  parser.add_argument('--queue-size', type=int, default=None,
+        help='maximum pending tabulations; default is twice the number '
+              'of worker processes')
+  parser.add_argument('--timeout', type=float, default=None,
+        help='maximum seconds for a tabulation, after which it is stopped')
+  args = parser.parse_args(argv)
+  service = TabulationService(args.processes, args.queue_size, args.timeout)
+  server = make_server(service, args.host, args.port)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+    service.close()
+
+if __name__ == '__main__':
+  main()
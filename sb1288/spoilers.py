@@ -0,0 +1,338 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Leave-one-out spoiler analysis of an RCV contest
+
+For each candidate in turn, the contest is tabulated as if that
+candidate had not run:  the candidate is not a candidate, is left out
+of the tie breaker, and each of its rankings is a skipped ranking.
+
+The ballots are validated only once, and an index from each candidate
+to the ballot groups that rank it is built once, so a variant only
+rebuilds the ballot groups that rank the withdrawn candidate.  All
+other ballot groups are shared by the variants.  Each variant is still
+a full tabulation of every ballot group, so an analysis of C
+candidates costs about C + 1 tabulations, which are spread across a
+pool of processes.  Only the rebuilding of ballot groups is saved, not
+the counting of ballot groups that do not rank the withdrawn
+candidate.
+
+Each variant is compared with the baseline tabulation of all
+candidates:  whether the winners change, and the first round in which
+the variant's decisions differ from the baseline's decisions, leaving
+out the withdrawn candidate.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import ballot
+from sb1288 import constants as K
+from sb1288 import errors
+from sb1288 import parallel
+from sb1288 import rcv
+from sb1288 import validate
+from sb1288 import with_json
+
+import argparse
+import collections
+import json
+
+SpoilerResult = collections.namedtuple('SpoilerResult', [
+      'withdrawn', 'elected', 'winners_changed', 'first_divergent_round',
+      'error'])
+SpoilerResult.__doc__ = """
+The result of tabulating a contest with one candidate withdrawn
+
+Attributes
+----------
+withdrawn
+  The withdrawn candidate, or None for the baseline tabulation.
+
+elected
+  A frozenset of the elected candidates, or None if the tabulation
+  raised an error.
+
+winners_changed
+  True if the elected candidates differ from those of the baseline
+  tabulation, other than by the withdrawn candidate itself.  A
+  withdrawn baseline winner always changes the winners.  None for the
+  baseline or if either tabulation raised an error.
+
+first_divergent_round
+  The 1-based number of the first round of the variant whose elected
+  or defeated candidates differ from those of the corresponding
+  baseline decision, or None if none differ.  Baseline rounds that
+  only defeat the withdrawn candidate are skipped, so later rounds
+  correspond.  None for the baseline or if either tabulation raised an
+  error.
+
+error
+  None, or if the tabulation raised an RcvValueError or
+  RcvImplementationError, a string describing the error.
+
+"""
+
+# The validated contest used by tabulations in a worker process
+_contest = {}
+
+def analyze_spoilers(nbr_seats_to_fill, candidates, ballots,
+      max_ranking_levels, tie_breaker, options={}, withdrawn=None,
+      nbr_processes=None):
+  """
+  Tabulate an RCV contest with each candidate withdrawn in turn
+
+  Arguments
+  ---------
+  nbr_seats_to_fill, candidates, ballots, max_ranking_levels,
+  tie_breaker, options
+    The same as for the __init__ method of the rcv.Tabulation class.
+
+  withdrawn
+    A sequence of the candidates to withdraw, one at a time, or None for
+    all candidates, in order.
+    Default value: None
+
+  nbr_processes
+    The number of processes used to tabulate variants, as for
+    parallel.map_tasks().
+    Default value: None
+
+  Returns
+  -------
+  A list of SpoilerResult values, the first for the baseline, followed
+  by one for each withdrawn candidate in order.
+
+  Raises
+  ------
+  RcvValueError
+    If candidates, ballots, max_ranking_levels, or tie_breaker do not
+    pass validation, or if a withdrawn candidate is not a candidate.
+    Errors in tabulating an individual variant, such as too few
+    candidates for the seats to fill, are reported in its
+    SpoilerResult.
+
+  """
+  validator = validate.Validator()
+  candidates = validator.candidates(candidates)
+  max_ranking_levels = validator.max_ranking_levels(max_ranking_levels)
+  ballots = validator.ballots(ballots, candidates, max_ranking_levels)
+  tie_breaker = validator.tie_breaker(tie_breaker, candidates)
+  tie_breaker = tuple(sorted(tie_breaker, key=tie_breaker.get))
+  if withdrawn is None:
+    withdrawn = candidates
+  for candidate in withdrawn:
+    if candidate not in candidates:
+      raise errors.RcvValueError('A withdrawn candidate is not a candidate:',
+            (
+            ('candidate', candidate),
+            ))
+  contest_args = (nbr_seats_to_fill, candidates, ballots,
+        max_ranking_levels, tie_breaker, options)
+  tasks = [None] + list(withdrawn)
+  if parallel.process_count(nbr_processes) <= 1:
+    # keep the contest local, so that analyses do not share it
+    contest = _make_contest(*contest_args)
+    results = [_tabulate_variant(contest, task) for task in tasks]
+  else:
+    results = list(parallel.map_tasks(_tabulate_task, tasks,
+          nbr_processes, _set_contest, contest_args))
+  baseline, base_decisions = results[0]
+  spoiler_results = [baseline]
+  for result, decisions in results[1:]:
+    if baseline.error is None and result.error is None:
+      result = result._replace(
+            winners_changed=(result.elected !=
+            baseline.elected - set([result.withdrawn])),
+            first_divergent_round=first_divergent_round(decisions,
+            base_decisions, result.withdrawn))
+    spoiler_results.append(result)
+  return spoiler_results
+
+def candidate_index(ballots):
+  """
+  Build an index from each candidate to the ballot groups that rank it
+
+  Arguments
+  ---------
+  ballots
+    A sequence of validated ballot.Ballot objects.
+
+  Returns
+  -------
+  A dict keyed by candidate, of a tuple of the indexes of the ballot
+  groups that rank the candidate, in order.
+
+  """
+  index = {}
+  for ix, ballot_group in enumerate(ballots):
+    for ranking_code in set(ballot_group.get_rankings()):
+      if (ranking_code != K.RANKING_CODE_SKIPPED and
+            ranking_code != K.RANKING_CODE_OVERVOTE):
+        index.setdefault(ranking_code, []).append(ix)
+  return {candidate: tuple(indexes) for candidate, indexes in index.items()}
+
+def withdraw_ballots(ballots, index, candidate):
+  """
+  Get ballot groups with a candidate's rankings changed to skipped
+
+  Arguments
+  ---------
+  ballots
+    A sequence of validated ballot.Ballot objects.
+
+  index
+    The candidate index of the ballots, as from candidate_index().
+
+  candidate
+    The withdrawn candidate.
+
+  Returns
+  -------
+  A list of the ballot groups, in order.  Ballot groups that do not
+  rank the candidate are the same objects as in ballots.
+
+  """
+  withdrawn_ballots = list(ballots)
+  for ix in index.get(candidate, ()):
+    ballot_group = ballots[ix]
+    withdrawn_ballots[ix] = ballot.Ballot(ballot_group.get_multiple(),
+          tuple([K.RANKING_CODE_SKIPPED if ranking_code == candidate
+          else ranking_code for ranking_code in ballot_group.get_rankings()]),
+          ballot_group.get_precinct())
+  return withdrawn_ballots
+
+def first_divergent_round(decisions, base_decisions, withdrawn):
+  """
+  Find the first round in which a variant's decisions differ
+
+  Arguments
+  ---------
+  decisions, base_decisions
+    Lists of the (elected, defeated) pairs of frozensets of each round
+    of the variant and the baseline tabulations.
+
+  withdrawn
+    The withdrawn candidate, which is left out of the baseline
+    decisions.  Baseline rounds that then have no decisions are
+    skipped.
+
+  Returns
+  -------
+  The 1-based number of the first round of the variant with different
+  decisions, or a round that exists in only one of the tabulations, or
+  None if the decisions are the same.
+
+  """
+  omitted = set([withdrawn])
+  base_decisions = [(elected - omitted, defeated - omitted)
+        for elected, defeated in base_decisions]
+  base_decisions = [(elected, defeated)
+        for elected, defeated in base_decisions if elected or defeated]
+  for ix in range(max(len(decisions), len(base_decisions))):
+    if (ix >= len(decisions) or ix >= len(base_decisions) or
+          decisions[ix] != base_decisions[ix]):
+      return ix + 1
+  return None
+
+def spoilers_to_json(results, description=None):
+  """
+  Convert spoiler results to a compact JSON comparison string
+
+  Arguments
+  ---------
+  results
+    A list of SpoilerResult values, as returned by analyze_spoilers().
+
+  description
+    A description of the contest, or None.
+
+  Returns
+  -------
+  A JSON string with one line per tabulation, showing the withdrawn
+  candidate, the winners, whether the winners changed, the first
+  divergent round, and any error.
+
+  """
+  lines = []
+  for result in results:
+    item = collections.OrderedDict()
+    item['withdrawn'] = result.withdrawn
+    if result.error is None:
+      item['elected'] = sorted(result.elected)
+      item['winners_changed'] = result.winners_changed
+      item['first_divergent_round'] = result.first_divergent_round
+    else:
+      item['error'] = result.error
+    lines.append('    ' + json.dumps(item, sort_keys=False))
+  json_str = '{\n'
+  if description is not None:
+    json_str += '  "description": ' + json.dumps(description) + ',\n'
+  json_str += '  "spoilers": [\n' + ',\n'.join(lines) + '\n  ]\n}\n'
+  return json_str
+
+def _make_contest(nbr_seats_to_fill, candidates, ballots,
+      max_ranking_levels, tie_breaker, options):
+  """Get a dict of the validated contest and its candidate index"""
+  return {'args': (nbr_seats_to_fill, candidates, max_ranking_levels,
+        tie_breaker, options), 'ballots': ballots,
+        'index': candidate_index(ballots)}
+
+def _set_contest(*contest_args):
+  """Save the validated contest for tabulations in a worker process"""
+  _contest.update(_make_contest(*contest_args))
+
+def _tabulate_task(withdrawn):
+  """Tabulate a variant with the contest saved in a worker process"""
+  return _tabulate_variant(_contest, withdrawn)
+
+def _tabulate_variant(contest, withdrawn):
+  """
+  Tabulate the contest with a candidate withdrawn, or the baseline
+
+  Returns
+  -------
+  A pair of a SpoilerResult and a list of the (elected, defeated)
+  decisions of each round, or None if there was an error.
+
+  """
+  nbr_seats_to_fill, candidates, max_ranking_levels, tie_breaker, options = (
+        contest['args'])
+  ballots = contest['ballots']
+  if withdrawn is not None:
+    candidates = tuple([candidate for candidate in candidates
+          if candidate != withdrawn])
+    tie_breaker = tuple([candidate for candidate in tie_breaker
+          if candidate != withdrawn])
+    ballots = withdraw_ballots(ballots, contest['index'], withdrawn)
+  try:
+    tabulation = rcv.Tabulation(nbr_seats_to_fill, candidates, ballots,
+          max_ranking_levels, tie_breaker, options)
+    elected, status, tally = tabulation.tabulate()
+  except (errors.RcvValueError, errors.RcvImplementationError) as exc:
+    return (SpoilerResult(withdrawn, None, None, None,
+          '{}: {}'.format(type(exc).__name__, exc.message)), None)
+  return (SpoilerResult(withdrawn, frozenset(elected), None, None, None),
+        [(entry.elected, entry.defeated) for entry in tabulation.journal])
+
+def main(argv=None):
+  """Run a leave-one-out spoiler analysis from the command line"""
+  parser = argparse.ArgumentParser(prog='python -m sb1288.spoilers',
+        description='Tabulate an RCV contest with each candidate withdrawn'
+        ' in turn.')
+  parser.add_argument('input_json',
+        help='JSON file with the contest specification')
+  parser.add_argument('output_json', nargs='?', default='',
+        help='file for the JSON comparison; default is standard output')
+  parser.add_argument('--processes', type=int, default=None,
+        help='number of worker processes; default is the number of CPUs')
+  args = parser.parse_args(argv)
+  tabulate_args, tabulation_spec = with_json.build_tabulate_args(
+        args.input_json, None)
+  results = analyze_spoilers(*tabulate_args, nbr_processes=args.processes)
+  json_str = spoilers_to_json(results, tabulation_spec.get('description'))
+  with_json.write_file(args.output_json, with_json.s2u(json_str))
+  return results
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,253 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Analyze whether tie resolutions could change an RCV outcome
+
+A tabulation normally resolves a tie for defeat by choosing the tied
+candidate that is earliest in the tie_breaker.  This module runs the
+tabulation once and, whenever a real tie is resolved, saves the state
+at the end of the previous round.  Each alternative resolution of the
+tie is then explored by resuming from that saved state, rather than by
+recounting from the first round.  Branches that reach a state that has
+already been reached are not explored again.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import rcv
+
+import collections
+import hashlib
+import time
+
+TieResolution = collections.namedtuple('TieResolution', [
+      'nbr_round', 'tied_candidates', 'selected_candidate'])
+TieResolution.__doc__ = """
+A tie resolution made in a branch of a tie analysis
+
+Attributes
+----------
+nbr_round
+  The round in which the tie was resolved.
+
+tied_candidates
+  A sorted tuple of the tied candidates.
+
+selected_candidate
+  The candidate selected for defeat.
+
+"""
+
+TieAnalysis = collections.namedtuple('TieAnalysis', [
+      'elected', 'outcomes', 'nbr_branches', 'nbr_duplicates',
+      'nbr_ties', 'complete'])
+TieAnalysis.__doc__ = """
+The results of a tie analysis
+
+Attributes
+----------
+elected
+  The set of candidates elected by the tabulation that resolves every
+  tie with the tie_breaker.
+
+outcomes
+  A dict keyed by each reachable set of elected candidates, as a
+  frozenset, with a value that is a tuple of TieResolution values that
+  reach that outcome.  The tie resolutions are those in which the
+  selected candidate differs from the usual selection, in round order.
+
+nbr_branches
+  The number of branches that were tabulated, including the first.
+
+nbr_duplicates
+  The number of branches that were not continued because they reached
+  a state that had already been reached.
+
+nbr_ties
+  The number of real ties that were resolved in all branches.  A tie
+  that a branch resolves as forced by its fork is not counted again.
+
+complete
+  True if every branch was explored; False if exploration was stopped
+  by the max_branches or max_seconds limit.
+
+"""
+
+def analyze_ties(nbr_seats_to_fill, candidates, ballots,
+      max_ranking_levels, tie_breaker, options={}, max_branches=None,
+      max_seconds=None):
+  """
+  Find the outcomes that are reachable by any resolution of ties
+
+  Arguments
+  ---------
+  nbr_seats_to_fill, candidates, ballots, max_ranking_levels,
+  tie_breaker, options
+    The same as for the __init__ method of the rcv.Tabulation class.
+
+  max_branches
+    If not None, the maximum number of branches to tabulate, including
+    the first.
+    Default value: None
+
+  max_seconds
+    If not None, the approximate maximum number of seconds to spend
+    exploring branches.
+    Default value: None
+
+  Returns
+  -------
+  A TieAnalysis value.
+
+  Raises
+  ------
+  The same as for rcv.Tabulation().tabulate().
+
+  """
+  start_time = time.time()
+  first = _ForkingTabulation(nbr_seats_to_fill, candidates, ballots,
+        max_ranking_levels, tie_breaker, options)
+  elected, status, tally = first.tabulate()
+  outcomes = {frozenset(elected): ()}
+  pending = collections.deque(first.forks)
+  seen_states = set(first.state_keys)
+  nbr_branches = 1
+  nbr_duplicates = first.nbr_duplicates
+  nbr_ties = first.nbr_ties
+  complete = True
+  while pending:
+    if ((max_branches is not None and nbr_branches >= max_branches) or
+          (max_seconds is not None and
+          time.time() - start_time >= max_seconds)):
+      complete = False
+      break
+    round_state, resolutions = pending.popleft()
+    branch = first.branch(resolutions, seen_states)
+    branch_elected, branch_status, branch_tally = branch.resume(round_state)
+    nbr_branches += 1
+    nbr_duplicates += branch.nbr_duplicates
+    nbr_ties += branch.nbr_ties
+    if not branch.is_duplicate:
+      outcomes.setdefault(frozenset(branch_elected), branch.resolutions)
+    pending.extend(branch.forks)
+  return TieAnalysis(elected, outcomes, nbr_branches, nbr_duplicates,
+        nbr_ties, complete)
+
+def round_state_key(round_state):
+  """
+  Get a compact key for the parts of a round state that affect later
+  rounds
+
+  Round-by-round tallies are excluded, as is the order of ballot groups
+  within a pile.
+
+  """
+  key = (round_state.nbr_round,
+        tuple([(index, _as_key(transfer_value))
+        for index, transfer_value in round_state.ballot_states]),
+        tuple(sorted([(tab_code, tuple(sorted(indexes)))
+        for tab_code, indexes in round_state.piles])),
+        tuple(sorted([(candidate, cstatus, _as_key(votes))
+        for candidate, cstatus, nbr_round, votes in round_state.statuses])),
+        _as_key(round_state.threshold),
+        _as_key(round_state.residual_surplus))
+  return hashlib.sha1(repr(key).encode('ascii')).digest()
+
+def _as_key(votes):
+  """Convert a vote total to a value with a consistent repr()"""
+  return str(votes)
+
+
+class _ForkingTabulation(rcv.Tabulation):
+  """
+  A tabulation that records a fork for each alternative tie resolution
+
+  This class is for internal use only.
+
+  """
+
+  def __init__(self, *args):
+    rcv.Tabulation.__init__(self, *args)
+    self.forced = {}
+    self.resolutions = ()
+    self.forks = []
+    self.state_keys = set()
+    self.seen_states = self.state_keys
+    self.nbr_duplicates = 0
+    self.nbr_ties = 0
+    self.is_duplicate = False
+    self.is_resuming = False
+
+  def branch(self, resolutions, seen_states):
+    """
+    Create a tabulation that resolves ties as listed in resolutions
+
+    The branch shares the set of seen state keys.
+
+    """
+    tie_breaker = sorted(self.tie_breaker, key=self.tie_breaker.get)
+    branch = _ForkingTabulation(self.nbr_seats_to_fill, self.candidates,
+          self.ballots, self.max_ranking_levels, tie_breaker,
+          self.options)
+    branch.resolutions = resolutions
+    branch.forced = {resolution.nbr_round: resolution.selected_candidate
+          for resolution in resolutions}
+    branch.seen_states = seen_states
+    branch.is_resuming = True
+    return branch
+
+  def _process_an_irv_round(self):
+    if not self._save_round_start():
+      return False
+    return rcv.Tabulation._process_an_irv_round(self)
+
+  def _process_an_stv_round(self):
+    if not self._save_round_start():
+      return False
+    return rcv.Tabulation._process_an_stv_round(self)
+
+  def _save_round_start(self):
+    """
+    Save the state at the start of a round
+
+    Return False, and discard the round, to stop the tabulation if the
+    state has already been reached by another branch.
+
+    """
+    self.round_start_state = self.get_round_state()
+    if self.is_resuming:
+      # the state at a fork has already been reached by another branch
+      self.is_resuming = False
+      return True
+    key = round_state_key(self.round_start_state)
+    if key in self.seen_states:
+      self.nbr_duplicates += 1
+      self.is_duplicate = True
+      self.is_round_discarded = True
+      return False
+    self.seen_states.add(key)
+    return True
+
+  def resolve_tie(self, tied_candidates):
+    """
+    Resolve a tie as forced, or as usual while recording alternatives
+
+    The tie is validated and recorded in round_ties as usual, with the
+    forced selection, if any.
+
+    """
+    selected_candidate = rcv.Tabulation.resolve_tie(self, tied_candidates)
+    if len(tied_candidates) <= 1:
+      return selected_candidate
+    nbr_round = self.nbr_round
+    forced_candidate = self.forced.get(nbr_round)
+    if forced_candidate in tied_candidates:
+      self.round_ties[-1] = (frozenset(tied_candidates), forced_candidate)
+      return forced_candidate
+    self.nbr_ties += 1
+    tied = tuple(sorted(tied_candidates))
+    for candidate in sorted(tied_candidates, key=self.tie_breaker.get)[1:]:
+      self.forks.append((self.round_start_state, self.resolutions +
+            (TieResolution(nbr_round, tied, candidate),)))
+    return selected_candidate
@@ -241,6 +241,12 @@ class Validator(object):
       A valid specification of ballots that meet the requirements of
       the rcv.tabulate function.
 
+      A ballot group may also be a Ballot object that was produced by
+      an earlier validation with the same candidates and
+      max_ranking_levels.  Such a ballot group is not revalidated, but
+      is copied with a fresh tabulation state, so that one validated
+      collection of ballots can be used for several tabulations.
+
     candidates
       A tuple of all the names of all candidates.
 
@@ -264,13 +270,17 @@ class Validator(object):
             ('type(ballots)', type(ballots)),
             ))
     for ix, ballot in enumerate(ballots):
+      if isinstance(ballot, Ballot):
+        result.append(ballot.copy())
+        continue
       if type(ballot) not in (list, tuple):
         raise errors.RcvValueError('A ballot is not a list or tuple:', (
               ('type(ballot)', type(ballot)),
               ('ballot index', ix),
               ))
-      if len(ballot) != 2:
-        raise errors.RcvValueError('A ballot is not a pair of values:', (
+      if len(ballot) not in (2, 3):
+        raise errors.RcvValueError(
+              'A ballot is not a pair or triple of values:', (
               ('len(ballot)', len(ballot)),
               ('ballot index', ix),
               ))
@@ -306,7 +316,18 @@ class Validator(object):
                 ('ballot index', ix),
                 ('ranking code index', rix),
                 ))
-      internal_ballot = Ballot(multiple, rankings)
+      precinct = None
+      if len(ballot) == 3:
+        precinct = ballot[2]
+        if sys.version_info[0] == 2 and type(precinct) == unicode:
+          precinct = precinct.encode('utf-8')
+        if type(precinct) not in (str, int):
+          raise errors.RcvValueError(
+                'A ballot precinct is not a str or int:', (
+                ('type(precinct)', type(precinct)),
+                ('ballot index', ix),
+                ))
+      internal_ballot = Ballot(multiple, rankings, precinct)
       result.append(internal_ballot)
     result = tuple(result)
     return result
@@ -399,6 +420,14 @@ class Validator(object):
                     ))
           value = tuple([per_round_value.upper() for per_round_value in value])
         result[K.OPTION_ALTERNATIVE_DEFEATS] = value
+      elif name == K.OPTION_RANKING_DEPTH:
+        if value is not None and (type(value) != int or value < 1):
+          raise errors.RcvValueError('The option {} must be None or an int'
+                ' that is at least one:'.format(repr(K.OPTION_RANKING_DEPTH)),
+                (
+                ('option value', value),
+                ))
+        result[K.OPTION_RANKING_DEPTH] = value
       else:
         raise errors.RcvValueError('Invalid option name:', (
           ('option name', name),
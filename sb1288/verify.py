@@ -0,0 +1,278 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+"""Verify a tabulation from its decision journal, in parallel
+
+A tabulation keeps a journal of the decisions of each round: the
+candidates elected and defeated, the ties resolved, the threshold, and
+the surplus factors applied.  Given the journal, the ballots needed for
+each round's tally are known without making any decisions, so the
+tallies can be computed in parallel:
+
+  * For IRV, each round is tallied independently from the candidates
+    continuing in it, using sb1288.rounds.
+
+  * For STV, the ballot groups are divided into shards, and each shard
+    follows the journal's transfers through all rounds, giving its part
+    of each round's tally and of each surplus transfer.
+
+The decisions are then made again from those tallies, round by round,
+and compared with the journal, and optionally the tallies are compared
+with those of the tabulation.  Verification stops at the first round
+that is inconsistent.
+
+"""
+
+from __future__ import print_function
+
+from sb1288 import constants as K
+from sb1288 import decimal5
+from sb1288 import parallel
+from sb1288 import rcv
+from sb1288 import rounds
+from sb1288 import with_json
+
+import collections
+import multiprocessing
+
+Inconsistency = collections.namedtuple('Inconsistency', [
+      'nbr_round', 'item', 'journal_value', 'verified_value'])
+Inconsistency.__doc__ = """
+The first inconsistency found by verify()
+
+Attributes
+----------
+nbr_round
+  The 1-based number of the first inconsistent round.
+
+item
+  What is inconsistent:  'tally', one of the JournalEntry attribute
+  names 'elected', 'defeated', 'ties', 'threshold', or
+  'surplus_factors', or 'nbr_rounds' if the journal has more or fewer
+  rounds than the verified tabulation.
+
+journal_value
+  The value of the item from the journal, or for a tally, from the
+  given tally.  For 'nbr_rounds', the number of rounds in the journal.
+
+verified_value
+  The value of the item from verification.  For 'nbr_rounds', the
+  number of rounds verified, or None if the verified tabulation
+  continues beyond the rounds of the journal.
+
+"""
+
+JOURNAL_ITEMS = ['elected', 'defeated', 'ties', 'threshold',
+      'surplus_factors']
+
+def verify(nbr_seats_to_fill, candidates, ballots, max_ranking_levels,
+      tie_breaker, options={}, journal=(), tally=None, nbr_processes=None):
+  """
+  Verify the decision journal of a tabulation
+
+  Arguments
+  ---------
+  The first six arguments are the same as for rcv.tabulate().
+
+  journal
+    A sequence of rcv.JournalEntry values, one for each round, as from
+    the journal attribute of an rcv.Tabulation after tabulate().
+
+  tally
+    If not None, the tally returned by rcv.tabulate(), which is also
+    verified, round by round.
+    Default value: None
+
+  nbr_processes
+    As for parallel.map_tasks().
+    Default value: None
+
+  Returns
+  -------
+  None if the journal and any tally are consistent with the ballots,
+  otherwise an Inconsistency for the first inconsistent round.
+
+  Raises
+  ------
+  RcvValueError
+    If an argument does not pass validation checks.
+
+  """
+  tabulation = _VerifyTabulation(nbr_seats_to_fill, candidates, ballots,
+        max_ranking_levels, tie_breaker, options)
+  if not journal:
+    return Inconsistency(1, 'nbr_rounds', 0, None)
+  continuing_sets = rounds.continuing_by_round(tabulation.candidates,
+        [(entry.elected, entry.defeated) for entry in journal])
+  if tabulation.is_irv():
+    tabulation.round_piles = rounds.round_tallies(tabulation.ballots,
+          continuing_sets, tabulation.max_ranking_levels, nbr_processes)
+    tabulation.round_transfers = [{} for entry in journal]
+  else:
+    tabulation.round_piles, tabulation.round_transfers = _stv_round_votes(
+          tabulation, journal, continuing_sets, nbr_processes)
+  nbr_rounds = 0
+  for round_result in tabulation.iter_rounds():
+    nbr_rounds = round_result.nbr_round
+    entry = journal[nbr_rounds - 1]
+    if tally is not None:
+      round_tally = {tab_code: votes[nbr_rounds - 1]
+            for tab_code, votes in tally.items()
+            if len(votes) >= nbr_rounds}
+      if round_tally != dict(round_result.tally):
+        return Inconsistency(nbr_rounds, 'tally', round_tally,
+              dict(round_result.tally))
+    verified_entry = tabulation.journal[-1]
+    for item in JOURNAL_ITEMS:
+      if getattr(entry, item) != getattr(verified_entry, item):
+        return Inconsistency(nbr_rounds, item, getattr(entry, item),
+              getattr(verified_entry, item))
+    if nbr_rounds == len(journal):
+      break
+  if nbr_rounds == len(journal) and tabulation.continuing():
+    return Inconsistency(nbr_rounds + 1, 'nbr_rounds', len(journal), None)
+  if nbr_rounds < len(journal):
+    return Inconsistency(nbr_rounds + 1, 'nbr_rounds', len(journal),
+          nbr_rounds)
+  return None
+
+def journal_to_json(journal):
+  """
+  Convert a decision journal to a list suitable for conversion to JSON
+
+  Decimal values are converted to their internal int values, as in a
+  checkpoint file, so they are restored exactly by journal_from_json().
+
+  """
+  return [{
+        'round': entry.nbr_round,
+        'elected': sorted(entry.elected),
+        'defeated': sorted(entry.defeated),
+        'ties': [[sorted(tied_candidates), selected]
+              for tied_candidates, selected in entry.ties],
+        'threshold': (None if entry.threshold is None
+              else decimal5.votes_to_json(entry.threshold)),
+        'surplus_factors': [[candidate, decimal5.votes_to_json(factor)]
+              for candidate, factor in entry.surplus_factors],
+        } for entry in journal]
+
+def journal_from_json(value):
+  """
+  Convert a decision journal from the value of journal_to_json()
+
+  Returns
+  -------
+  A list of rcv.JournalEntry values.
+
+  """
+  u2s = with_json.u2s
+  return [rcv.JournalEntry(
+        entry['round'],
+        frozenset([u2s(candidate) for candidate in entry['elected']]),
+        frozenset([u2s(candidate) for candidate in entry['defeated']]),
+        tuple([(frozenset([u2s(candidate) for candidate in tied_candidates]),
+              u2s(selected))
+              for tied_candidates, selected in entry['ties']]),
+        (None if entry['threshold'] is None
+              else decimal5.decimal_from_json(entry['threshold'])),
+        tuple([(u2s(candidate), decimal5.decimal_from_json(factor))
+              for candidate, factor in entry['surplus_factors']]),
+        ) for entry in value]
+
+def _stv_round_votes(tabulation, journal, continuing_sets, nbr_processes):
+  """
+  Get the STV pile votes and surplus transfers of each round, by shards
+
+  This function is for internal use only.
+
+  """
+  nbr_shards = (multiprocessing.cpu_count() if nbr_processes is None
+        else max(nbr_processes, 1))
+  round_piles = [{} for entry in journal]
+  round_transfers = [{} for entry in journal]
+  for shard_piles, shard_transfers in parallel.map_tasks(_shard_task,
+        range(nbr_shards), nbr_processes, _set_worker_data,
+        (tuple(tabulation.ballots), tabulation.max_ranking_levels,
+        tuple(journal), continuing_sets, nbr_shards)):
+    for totals, shard_totals in (list(zip(round_piles, shard_piles)) +
+          list(zip(round_transfers, shard_transfers))):
+      for key, votes in shard_totals.items():
+        totals[key] = totals.get(key, K.ZERO) + votes
+  return round_piles, round_transfers
+
+_worker_data = None
+
+def _set_worker_data(*args):
+  """Keep the ballots and journal of a worker process for its tasks"""
+  global _worker_data
+  _worker_data = args
+
+def _shard_task(shard):
+  """
+  Follow the ballot groups of a shard through the rounds of a journal
+
+  This function is for internal use only.
+
+  Returns
+  -------
+  A pair of lists, with an item for each round, of dicts of the votes
+  of the shard:  the votes of each pile when the round is tallied, and
+  the votes transferred from each candidate with surplus.
+
+  """
+  (ballots, max_ranking_levels, journal, continuing_sets,
+        nbr_shards) = _worker_data
+  piles = {}
+  for ballot in ballots[shard::nbr_shards]:
+    ballot = ballot.copy()
+    piles.setdefault(ballot.get_hrcc(continuing_sets[0],
+          max_ranking_levels), []).append(ballot)
+  round_piles = []
+  round_transfers = []
+  for ix, entry in enumerate(journal):
+    round_piles.append({tab_code: sum([ballot.total_votes()
+          for ballot in pile], K.ZERO)
+          for tab_code, pile in piles.items()})
+    transfers = {}
+    if ix + 1 < len(journal):
+      moved = []
+      for candidate, surplus_factor in entry.surplus_factors:
+        transferred_votes = K.ZERO
+        for ballot in piles.pop(candidate, []):
+          ballot.update_transfer_value(surplus_factor)
+          transferred_votes += ballot.total_votes()
+          moved.append(ballot)
+        transfers[candidate] = transferred_votes
+      for candidate in entry.defeated:
+        moved.extend(piles.pop(candidate, []))
+      for ballot in moved:
+        piles.setdefault(ballot.get_hrcc(continuing_sets[ix + 1],
+              max_ranking_levels), []).append(ballot)
+    round_transfers.append(transfers)
+  return round_piles, round_transfers
+
+
+class _VerifyTabulation(rcv.Tabulation):
+  """
+  Make the decisions of a tabulation from votes computed in advance
+
+  The round_piles attribute must be set to a list of dicts of the votes
+  of the piles of each round, and the round_transfers attribute to a
+  list of dicts of the votes transferred from each candidate with
+  surplus in each round.  Ballots are not assigned or transferred.
+
+  """
+
+  def tally_piles(self, tab_codes):
+    round_piles = self.round_piles[self.nbr_round - 1]
+    return {tab_code: round_piles.get(tab_code, self.zero_votes())
+          for tab_code in tab_codes}
+
+  def assign_ballots(self, ballot_list):
+    pass
+
+  def transfer_from_defeated(self, defeated):
+    pass
+
+  def transfer_pile_surplus(self, candidate, surplus_factor):
+    return self.round_transfers[self.nbr_round - 1].get(candidate, K.ZERO)
@@ -6,17 +6,21 @@ from __future__ import print_function
 
 from sb1288 import rcv
 from sb1288 import errors
+from sb1288 import profiling
 from sb1288.ballot import Ballot  # this is probably not needed
 from sb1288 import status
 from sb1288 import validate
 
+import argparse
+import collections
 import sys
 import json
 import os.path
 
 # A convenience method for using the rcv.Tabulation class
 
-def tabulate(input_json='', output_json='', default_json=None):
+def tabulate(input_json='', output_json='', default_json=None,
+      stream_rounds=False, observer=None):
   """
   Tabulate an RCV contest using JSON files for input and output
 
@@ -28,6 +32,8 @@ def tabulate(input_json='', output_json='', default_json=None):
     empty str, standard input is read.  If the value is None, nothing is
     read. The JSON specification should be a JSON object with names
     that correspond to the parameters of rcv.Tabulation() initialization.
+    The value may also be a dict of such names and values, which is used
+    instead of reading a file.
 
     Additional names may be specified.  Some that are recognized
     include:
@@ -64,6 +70,10 @@ def tabulate(input_json='', output_json='', default_json=None):
       An object of tally values, corresponding to the third value
       returned by rcv.Tabulation().tabulate().
 
+    precinct_tally
+      If any ballot group has a precinct, an object of round-by-round
+      vote totals by precinct, as described for precinct_tally_to_json().
+
     description
       A string value of the input description value, if a non-empty
       description value string was provided.  Otherwise, this name is
@@ -79,6 +89,21 @@ def tabulate(input_json='', output_json='', default_json=None):
     this file, but its value may be overridden by an include value
     specified in the input_json file.
 
+  stream_rounds
+    If this evaluates to True, the output is written as a sequence of
+    lines, each a JSON object, as the tabulation progresses.  A line is
+    written, and the output flushed, as soon as each round finishes,
+    with the names:  round, tally, elected, defeated, and, for STV,
+    threshold and residual_surplus.  The elected and defeated arrays
+    list the candidates elected or defeated in that round.  The last
+    line is the JSON object of the tabulation results, as written when
+    this value evaluates to False.
+    Default value: False
+
+  observer
+    If not None, an observer of the tabulation, as described for the
+    rcv.Tabulation class.
+    Default value: None
 
   Returns
   -------
@@ -98,12 +123,59 @@ def tabulate(input_json='', output_json='', default_json=None):
         input_json, default_json)
   try: description = tabulation_spec['description']
   except KeyError: description = None
-  elected, status, tally = rcv.Tabulation(*tabulate_args).tabulate()
-  json_str = results_to_json(elected, status, tally, description)
-  write_file(output_json, s2u(json_str))
+  tabulation = rcv.Tabulation(*tabulate_args, observer=observer)
+  if not stream_rounds:
+    elected, status, tally = tabulation.tabulate()
+    json_str = results_to_json(elected, status, tally, description,
+          tabulation.precinct_tally)
+    write_file(output_json, s2u(json_str))
+    return elected, status, tally, tabulation_spec
+  with OutputFile(output_json) as output_file:
+    for round_result in tabulation.iter_rounds():
+      output_file.write(s2u(round_to_json(round_result)))
+      output_file.flush()
+    elected, status, tally = (tabulation.elected(), tabulation.status,
+          tabulation.tallies)
+    json_str = results_to_json(elected, status, tally, description,
+          tabulation.precinct_tally)
+    json_str = json.dumps(json.loads(json_str,
+          object_pairs_hook=collections.OrderedDict)) + '\n'
+    output_file.write(s2u(json_str))
   return elected, status, tally, tabulation_spec
 
-def results_to_json(elected, status, tally, description):
+def round_to_json(round_result):
+  """
+  Convert a round summary to a single line of JSON
+
+  Arguments
+  =========
+  round_result
+    An rcv.RoundResult value, as produced by
+    rcv.Tabulation().iter_rounds().
+
+  Returns
+  =======
+  A JSON string, ending with a newline, with the names:  round, tally,
+  elected, defeated, and, for STV, threshold and residual_surplus.
+
+  """
+  round_dict = collections.OrderedDict()
+  round_dict['round'] = round_result.nbr_round
+  round_dict['tally'] = collections.OrderedDict([(code, json_votes(votes))
+        for code, votes in round_result.tally])
+  round_dict['elected'] = sorted(round_result.elected)
+  round_dict['defeated'] = sorted(round_result.defeated)
+  if round_result.threshold is not None:
+    round_dict['threshold'] = json_votes(round_result.threshold)
+    round_dict['residual_surplus'] = json_votes(
+          round_result.residual_surplus)
+  return json.dumps(round_dict) + '\n'
+
+def json_votes(votes):
+  """Convert votes to an int, or for a Decimal, to a float"""
+  return votes if type(votes) == int else float(str(votes))
+
+def results_to_json(elected, status, tally, description, precinct_tally=None):
   """
   Convert tabulation results to a JSON string
 
@@ -130,6 +202,12 @@ def results_to_json(elected, status, tally, description):
     False.
     in the return value of the rcv.Tabulation.tabulate() function.
 
+  precinct_tally
+    None, or a precinct.PrecinctTally of the tabulation, as given by
+    the precinct_tally attribute of an rcv.Tabulation, which is
+    included with the name precinct_tally.
+    Default value: None
+
   Returns
   =======
   a JSON string which represents the function arguments
@@ -156,8 +234,7 @@ def results_to_json(elected, status, tally, description):
   tally_str = '  "tally": {\n'
   tally_sorted = sorted(tally.items(), key=lambda item:
         get_tally_sort_key(item[0], status))
-  tally_sorted = [[code, [
-        votes if type(votes) == int else float(str(votes))
+  tally_sorted = [[code, [json_votes(votes)
         for votes in votes_by_round]]
         for code, votes_by_round in tally_sorted]
   for ix, (code, votes_by_round) in enumerate(tally_sorted):
@@ -166,10 +243,55 @@ def results_to_json(elected, status, tally, description):
       tally_str += ','
     tally_str += '\n'
   tally_str += '  }\n'
+  precinct_str = ''
+  if precinct_tally is not None:
+    tally_str = tally_str[:-1] + ',\n'
+    precinct_str = precinct_tally_to_json(precinct_tally, status)
   json_str = '{\n' + description_str + elected_str
-  json_str += status_str + tally_str + '}\n'
+  json_str += status_str + tally_str + precinct_str + '}\n'
   return json_str
 
+def precinct_tally_to_json(precinct_tally, status):
+  """
+  Convert round-by-round vote totals by precinct to part of the results
+
+  Arguments
+  =========
+  precinct_tally
+    A precinct.PrecinctTally.
+
+  status
+    The status dict of the tabulation, used to order the tabulation
+    categories.
+
+  Returns
+  =======
+  A str of JSON lines for the precinct_tally name of the results.  Its
+  value is an object with the names precincts, an array of the precinct
+  keys, and rounds, an array with an item for each round.  Each item is
+  an object of arrays of votes, one for each precinct, keyed by
+  tabulation category, or null for a round processed before the
+  tabulation was resumed.
+
+  """
+  round_strs = []
+  for round_ix, rows in enumerate(precinct_tally.rounds):
+    if rows is None:
+      round_strs.append('      null')
+      continue
+    round_strs.append('      {' + ', '.join([json.dumps(code) + ': ' +
+          json.dumps([json_votes(votes)
+          for votes in precinct_tally.votes(round_ix + 1, code)])
+          for code in sorted(rows, key=lambda code:
+          get_tally_sort_key(code, status))]) + '}')
+  precinct_str = '  "precinct_tally": {\n'
+  precinct_str += '    "precincts": ' + json.dumps(
+        list(precinct_tally.precincts)) + ',\n'
+  precinct_str += '    "rounds": [\n' + ',\n'.join(round_strs) + '\n'
+  precinct_str += '    ]\n'
+  precinct_str += '  }\n'
+  return precinct_str
+
 def get_tally_sort_key(code, status):
   """
   Get a tally sort key
@@ -256,6 +378,45 @@ def build_tabulate_args(input_json, default_json):
         )
   return tabulate_args, tabulation_spec
 
+class OutputFile(object):
+  """
+  A context manager for an output file that is written incrementally
+
+  The file_name is interpreted as for write_file().  Only a file that
+  is opened by name is closed on exit.
+
+  """
+
+  def __init__(self, file_name):
+    self.file_name = file_name
+    self.file = None
+    self.is_opened = False
+
+  def __enter__(self):
+    if self.file_name == '':
+      self.file = sys.stdout
+    elif type(self.file_name) != str and hasattr(self.file_name, 'write'):
+      self.file = self.file_name
+    elif self.file_name is None:
+      self.file = None
+    else:
+      self.file = open(self.file_name, 'w')
+      self.is_opened = True
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if self.is_opened:
+      self.file.close()
+    return False
+
+  def write(self, text):
+    if self.file is not None:
+      self.file.write(text)
+
+  def flush(self):
+    if self.file is not None and hasattr(self.file, 'flush'):
+      self.file.flush()
+
 def write_file(file_name, text):
   """
   Write text to a file
@@ -339,7 +500,10 @@ def read_tabulation_spec(input_json, default_json):
         not (default_json == '' and input_input_json == '')):
     default_spec = read_optional_json(default_json)
     tabulation_spec.update(default_spec)
-  primary_spec = read_json(input_json)
+  if isinstance(input_json, dict):
+    primary_spec = dict(input_json)
+  else:
+    primary_spec = read_json(input_json)
   try: include_list = primary_spec['include']
   except KeyError: include_list = []
   for include_input_json in include_list:
@@ -360,9 +524,32 @@ def u2s(value):
     value = value.encode('ascii')
   return value
 
+def main(argv=None):
+  """Tabulate from the command line"""
+  parser = argparse.ArgumentParser(prog='python -m sb1288.with_json',
+        description='Tabulate an RCV contest using JSON files.')
+  parser.add_argument('input_json',
+        help='JSON file with the tabulation specification')
+  parser.add_argument('output_json', nargs='?', default='',
+        help='file for the JSON results; default is standard output')
+  parser.add_argument('--stream-rounds', action='store_true',
+        help='write a JSON line as each round finishes')
+  parser.add_argument('--profile', metavar='PSTATS_FILE',
+        help='profile with cProfile, writing statistics for pstats')
+  parser.add_argument('--profile-stacks', metavar='STACKS_FILE',
+        help='profile by sampling, writing collapsed stacks tagged by phase')
+  parser.add_argument('--profile-interval', type=float,
+        default=profiling.SAMPLE_INTERVAL, metavar='SECONDS',
+        help='seconds between samples; default 0.001')
+  args = parser.parse_args(argv)
+  if args.profile is None and args.profile_stacks is None:
+    return tabulate(args.input_json, args.output_json,
+          stream_rounds=args.stream_rounds)
+  return profiling.profile_call(tabulate,
+        (args.input_json, args.output_json),
+        {'stream_rounds': args.stream_rounds}, pstats_file=args.profile,
+        stacks_file=args.profile_stacks, interval=args.profile_interval)
+
 if __name__ == '__main__':
-  if len(sys.argv) > 2:
-    tabulate(sys.argv[1], sys.argv[2])
-  elif len(sys.argv) > 1:
-    tabulate(sys.argv[1], '')
+  main()
 
@@ -11,6 +11,28 @@ from sb1288 import with_json
 u2s = with_json.u2s
 
 
+# The ballot groups of a small contest shared by unit tests
+CONTEST_BALLOTS = (
+      (15, ' A B C'),
+      (3, ' B C D'),
+      (1,  ' B'),
+      (1,  ' B #'),
+      (8,  ' C B A'),
+      (5,  ' D C B'),
+      (5,  ' C D B'),
+      )
+
+def make_contest(nbr_seats_to_fill=1):
+  """
+  Get a list of the rcv.Tabulation() arguments of a small contest
+
+  The contest has four candidates and the ballot groups of
+  CONTEST_BALLOTS, including a short ranking and an overvote.  It is
+  an IRV contest for one seat or an STV contest for more seats.
+
+  """
+  return [nbr_seats_to_fill, ' A B C D', CONTEST_BALLOTS, 3, ' A B C D', {}]
+
 def assertRaises_with_message(test_case, expected_exception, expected_message,
       raising_callable, args):
   """Run a test case that is expected to raise an exception"""
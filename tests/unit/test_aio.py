@@ -0,0 +1,102 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import observe
+from sb1288 import rcv
+from sb1288 import with_json
+from sb1288.bench import generate
+
+import json
+import os
+import os.path
+import sys
+import time
+
+if sys.version_info >= (3, 7):
+  from sb1288 import aio
+  import asyncio
+  import concurrent.futures
+
+@unittest.skipIf(sys.version_info < (3, 7), 'asyncio API needs Python 3.7')
+class TestAio(unittest.TestCase):
+  """Test tabulating from asyncio coroutines"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def test_tabulate_async(self):
+    for nbr_seats_to_fill in (1, 2):
+      args = _test_aids.make_contest(nbr_seats_to_fill)
+      expected = rcv.tabulate(*args)
+      self.assertEqual(asyncio.run(aio.tabulate_async(*args)), expected)
+      with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        self.assertEqual(asyncio.run(aio.tabulate_async(*args,
+              executor=executor)), expected)
+      with concurrent.futures.ProcessPoolExecutor(2) as executor:
+        self.assertEqual(asyncio.run(aio.tabulate_async(*args,
+              executor=executor)), expected)
+
+  def test_tabulate_with_json_async(self):
+    input_json = os.path.join('unit', 'json-001.json')
+    output_json = os.path.join('temp_output', 'aio-json-001-out.json')
+    expected_json = os.path.join('temp_output', 'aio-json-001-expected.json')
+    result = asyncio.run(aio.tabulate_with_json_async(input_json,
+          output_json))
+    self.assertEqual(result, with_json.tabulate(input_json, expected_json))
+    self.assertEqual(with_json.read_json(output_json),
+          with_json.read_json(expected_json))
+    os.remove(output_json)
+    os.remove(expected_json)
+
+  def test_tabulate_with_json_async_precincts(self):
+    tabulation_spec = with_json.read_json(os.path.join('unit',
+          'json-001.json'))
+    tabulation_spec['ballots'] = [ballot + ['P{}'.format(ix % 2)]
+          for ix, ballot in enumerate(tabulation_spec['ballots'])]
+    output_json = os.path.join('temp_output', 'aio-precincts-out.json')
+    expected_json = os.path.join('temp_output',
+          'aio-precincts-expected.json')
+    with_json.tabulate(tabulation_spec, expected_json)
+    with open(expected_json, 'rb') as expected_file:
+      expected = expected_file.read()
+    self.assertTrue(b'precinct_tally' in expected)
+    for executor in (None, concurrent.futures.ThreadPoolExecutor(2),
+          concurrent.futures.ProcessPoolExecutor(2)):
+      asyncio.run(aio.tabulate_with_json_async(tabulation_spec,
+            output_json, executor=executor))
+      if executor is not None:
+        executor.shutdown()
+      with open(output_json, 'rb') as output_file:
+        self.assertEqual(output_file.read(), expected)
+    os.remove(output_json)
+    os.remove(expected_json)
+
+  def test_cancel_between_rounds(self):
+    spec = generate.generate_contest(40000, 16, ranking_depth=8,
+          nbr_seats_to_fill=5, model=generate.MODEL_SPATIAL)
+    args = generate.tabulate_args(spec)
+    all_rounds = []
+    rcv.Tabulation(*args, observer=all_rounds.append).tabulate()
+    nbr_rounds = len([event for event in all_rounds
+          if event.kind == observe.EVENT_ROUND])
+    events = []
+    with self.assertRaises(asyncio.TimeoutError):
+      asyncio.run(asyncio.wait_for(aio.tabulate_async(*args,
+            observer=events.append), 0.01))
+    rounds = lambda: len([event for event in events
+          if event.kind == observe.EVENT_ROUND])
+    nbr_rounds_cancelled = rounds()
+    time.sleep(0.2)
+    self.assertTrue(rounds() <= nbr_rounds_cancelled + 1)
+    self.assertTrue(rounds() < nbr_rounds)
@@ -124,6 +124,20 @@ class TestBallot(unittest.TestCase):
     self.assertEqual(test_ballot.get_hrcc(('D',), 3), ':Abstentions')
     self.assertEqual(test_ballot.get_hrcc(('D',), 5), ':Abstentions')
 
+  def test_ballot_get_hrcc_depth(self):
+    test_ballot = ballot.Ballot(5, str_tuple(' A B C D'), ranking_depth=2)
+    self.assertEqual(test_ballot.get_ranking_depth(), 2)
+    self.assertEqual(test_ballot.get_hrcc(('B', 'C'), 4), 'B')
+    self.assertEqual(test_ballot.get_hrcc(('C', 'D'), 4), ':Other exhausted')
+    self.assertEqual(test_ballot.copy().get_hrcc(('C',), None),
+          ':Other exhausted')
+    test_ballot = ballot.Ballot(5, str_tuple(' A  C D'))
+    test_ballot.set_ranking_depth(3)
+    self.assertEqual(test_ballot.get_hrcc(('C', 'D'), 4), 'C')
+    self.assertEqual(test_ballot.get_hrcc(('D',), 4), ':Abstentions')
+    self.assertEqual(test_ballot.peek_hrcc(('A', 'D'), 4), 'A')
+    test_ballot.set_ranking_depth(None)
+    self.assertEqual(test_ballot.peek_hrcc(('D',), 4), 'D')
 
   def test_ballot_update_transfer_value_1(self):
     test_ballot = ballot.Ballot(5, str_tuple(' A B C'))
@@ -0,0 +1,93 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import batch
+from sb1288 import errors
+from sb1288 import with_json
+from sb1288.bench import generate
+
+import json
+import os
+import os.path
+import shutil
+
+class TestBatch(unittest.TestCase):
+  """Test tabulating a batch of contests"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+    self.batch_dir = os.path.join('temp_output', 'batch-test')
+    self.input_dir = os.path.join(self.batch_dir, 'input')
+    self.output_dir = os.path.join(self.batch_dir, 'output')
+    shutil.rmtree(self.batch_dir, ignore_errors=True)
+    os.makedirs(self.input_dir)
+    specs = {
+          'small': generate.generate_contest(50, 4),
+          'large': generate.generate_contest(2000, 8, ranking_depth=5,
+                nbr_seats_to_fill=3, model=generate.MODEL_SPATIAL),
+          'invalid': generate.generate_contest(50, 4),
+          }
+    specs['invalid']['ballots'].append([1, ['C01', 'Nobody']])
+    for name, spec in specs.items():
+      self.write_input(name + '.json', json.dumps(spec))
+    self.write_input('malformed.json', '{"candidates": ')
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+    shutil.rmtree(self.batch_dir, ignore_errors=True)
+
+  def write_input(self, file_name, text):
+    with open(os.path.join(self.input_dir, file_name), 'w') as output_file:
+      output_file.write(text)
+
+  def test_batch_from_directory(self):
+    batch.main([self.input_dir, self.output_dir, '--processes', '2'])
+    index = with_json.read_json(os.path.join(self.output_dir,
+          batch.INDEX_FILE_NAME))
+    self.assertEqual([(contest['name'], contest['outcome'])
+          for contest in index['contests']], [
+          ('invalid', batch.OUTCOME_INVALID),
+          ('large', batch.OUTCOME_TABULATED),
+          ('malformed', batch.OUTCOME_ERROR),
+          ('small', batch.OUTCOME_TABULATED),
+          ])
+    self.assertEqual(index['counts'], {'tabulated': 2, 'invalid': 1,
+          'implementation_error': 0, 'error': 1})
+    self.assertTrue(index['contests'][0]['error'].startswith(
+          'Invalid ballot ranking code:'))
+    for name in ('large', 'small'):
+      expected_json = os.path.join(self.batch_dir, name + '-expected.json')
+      with_json.tabulate(os.path.join(self.input_dir, name + '.json'),
+            expected_json)
+      self.assertEqual(with_json.read_json(os.path.join(self.output_dir,
+            name + '.json')), with_json.read_json(expected_json))
+
+  def test_batch_from_manifest(self):
+    manifest = os.path.join(self.batch_dir, 'manifest.json')
+    with open(manifest, 'w') as output_file:
+      json.dump({'contests': ['input/small.json',
+            {'name': 'big', 'input': 'input/large.json',
+            'output': 'big-results.json'}]}, output_file)
+    contests = batch.find_contests(manifest, self.output_dir)
+    self.assertEqual([(contest.name, contest.output_json)
+          for contest in contests], [
+          ('small', os.path.join(self.output_dir, 'small.json')),
+          ('big', os.path.join(self.batch_dir, 'big-results.json')),
+          ])
+    os.makedirs(self.output_dir)
+    results = batch.tabulate_batch(contests, nbr_processes=1)
+    self.assertEqual([result.outcome for result in results],
+          [batch.OUTCOME_TABULATED, batch.OUTCOME_TABULATED])
+    self.assertTrue(os.path.isfile(contests[1].output_json))
+
+  def test_batch_errors(self):
+    with self.assertRaises(errors.RcvValueError):
+      batch.find_contests(self.input_dir, self.input_dir)
@@ -0,0 +1,85 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import errors
+from sb1288 import rcv
+from sb1288.bench import generate
+from sb1288.bench import harness
+from sb1288.bench import memory
+
+import copy
+
+class TestBench(unittest.TestCase):
+  """Test the synthetic contest generator and benchmark harness"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def test_generate_is_deterministic(self):
+    for model in sorted(generate.MODEL_SET):
+      kwargs = {'nbr_ballots': 500, 'nbr_candidates': 7, 'ranking_depth': 4,
+            'model': model, 'seed': 12, 'skip_rate': 0.05,
+            'overvote_rate': 0.05, 'truncation_rate': 0.2}
+      spec = generate.generate_contest(**kwargs)
+      self.assertEqual(spec, generate.generate_contest(**kwargs))
+      self.assertEqual(sum([multiple for multiple, rankings
+            in spec['ballots']]), 500)
+      self.assertTrue(all([len(rankings) <= 4
+            for multiple, rankings in spec['ballots']]))
+      rcv.tabulate(*generate.tabulate_args(spec))
+    kwargs['seed'] = 13
+    self.assertNotEqual(spec, generate.generate_contest(**kwargs))
+
+  def test_generate_errors(self):
+    with self.assertRaises(errors.RcvValueError):
+      generate.generate_contest(10, 3, model='no such model')
+    with self.assertRaises(errors.RcvValueError):
+      generate.generate_contest(10, 3, ranking_depth=2)
+
+  def test_run_and_compare(self):
+    matrix = [{'name': 'tiny', 'nbr_ballots': 200, 'nbr_candidates': 5,
+          'nbr_seats_to_fill': 2}]
+    results = harness.run_benchmarks(matrix, repeat=2)
+    case = results['cases'][0]
+    self.assertEqual(case['name'], 'tiny')
+    self.assertEqual(sorted(case['engines'].keys()),
+          sorted(harness.ENGINE_LIST))
+    rcv_results = case['engines'][harness.ENGINE_RCV]
+    self.assertEqual(rcv_results['elected'],
+          case['engines'][harness.ENGINE_WITH_JSON]['elected'])
+    self.assertTrue(rcv_results['rounds'] >= 1)
+    self.assertEqual(harness.compare_results(results, results), [])
+    baseline = copy.deepcopy(results)
+    baseline['cases'][0]['engines'][harness.ENGINE_RCV]['elapsed'] = (
+          rcv_results['elapsed'] / 2)
+    regressions = harness.compare_results(results, baseline, threshold=0.5)
+    self.assertEqual([(regression.case, regression.engine,
+          regression.measure) for regression in regressions],
+          [('tiny', harness.ENGINE_RCV, 'elapsed')])
+    self.assertEqual(harness.compare_results(results, baseline,
+          threshold=1.5), [])
+
+  def test_memory_report(self):
+    spec = generate.generate_contest(300, 6, ranking_depth=4,
+          nbr_seats_to_fill=2, model=generate.MODEL_SPATIAL)
+    report = memory.memory_report(spec)
+    self.assertEqual(report['nbr_ballot_groups'], len(spec['ballots']))
+    self.assertEqual(sorted(report['structures'].keys()),
+          sorted(memory.STRUCTURE_LIST))
+    self.assertTrue(all([size > 0
+          for size in report['structures'].values()]))
+    self.assertTrue(report['bytes_per_ballot_group'] > 0)
+    if memory.tracemalloc is not None:
+      self.assertTrue(report['peak_memory'] > 0)
+      self.assertFalse(memory.tracemalloc.is_tracing())
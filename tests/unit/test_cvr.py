@@ -0,0 +1,144 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import batch
+from sb1288 import cvr
+from sb1288 import errors
+from sb1288 import rcv
+from sb1288 import with_json
+
+import json
+import os
+import os.path
+import shutil
+
+class TestCvr(unittest.TestCase):
+  """Test tabulating contests from a multi-contest CVR file"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+    self.cvr_dir = os.path.join('temp_output', 'cvr-test')
+    shutil.rmtree(self.cvr_dir, ignore_errors=True)
+    os.makedirs(self.cvr_dir)
+    rows = [
+          ('Ballot', 'Mayor 1', 'Mayor 2', 'Mayor 3', 'Council 1',
+                'Council 2', 'Council 3', 'Council 4'),
+          ]
+    mayor_rankings = [
+          (15, ('A', 'B', 'C')),
+          (8, ('B', 'C', 'D')),
+          (1, ('B', 'overvote', '')),
+          (1, ('', '', '')),
+          (8, ('C', 'B', 'A')),
+          (5, ('D', 'C', 'B')),
+          ]
+    council_rankings = [
+          (10, ('W', 'X', 'Y', 'Z')),
+          (9, ('X', 'W', '', 'Y')),
+          (7, ('Y', 'Z', 'W', '')),
+          (6, ('Z', 'Y', 'undervote', 'X')),
+          (6, ('', '', '', '')),
+          ]
+    mayor_list = [rankings for multiple, rankings in mayor_rankings
+          for ix in range(multiple)]
+    council_list = [rankings for multiple, rankings in council_rankings
+          for ix in range(multiple)]
+    for ix, (mayor, council) in enumerate(zip(mayor_list, council_list)):
+      rows.append((str(ix + 1),) + mayor + council)
+    with open(os.path.join(self.cvr_dir, 'cvr.csv'), 'w') as output_file:
+      for row in rows:
+        output_file.write(','.join(row) + '\n')
+    self.manifest = {
+          'cvr': 'cvr.csv',
+          'overvote_codes': ['overvote'],
+          'skipped_codes': ['undervote'],
+          'contests': [
+                {'name': 'mayor', 'description': 'Mayor',
+                      'columns': ['Mayor 1', 'Mayor 2', 'Mayor 3'],
+                      'nbr_seats_to_fill': 1, 'candidates': ' A B C D',
+                      'tie_breaker': ' A B C D'},
+                {'name': 'council', 'description': 'Council',
+                      'columns': ['Council 1', 'Council 2', 'Council 3',
+                      'Council 4'], 'omit_blank_ballots': True,
+                      'nbr_seats_to_fill': 2, 'candidates': ' W X Y Z',
+                      'tie_breaker': ' Z Y X W'},
+                ],
+          }
+    self.manifest_json = os.path.join(self.cvr_dir, 'manifest.json')
+    with open(self.manifest_json, 'w') as output_file:
+      json.dump(self.manifest, output_file)
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+    shutil.rmtree(self.cvr_dir, ignore_errors=True)
+
+  def test_read_cvr(self):
+    named_specs = cvr.read_cvr(self.manifest_json)
+    self.assertEqual([name for name, spec in named_specs],
+          ['mayor', 'council'])
+    mayor_spec = named_specs[0][1]
+    self.assertEqual(mayor_spec['max_ranking_levels'], 3)
+    self.assertEqual(mayor_spec['ballots'], [
+          [1, []],
+          [15, ['A', 'B', 'C']],
+          [1, ['B', '#']],
+          [8, ['B', 'C', 'D']],
+          [8, ['C', 'B', 'A']],
+          [5, ['D', 'C', 'B']],
+          ])
+    council_spec = named_specs[1][1]
+    self.assertEqual(sum([multiple for multiple, rankings
+          in council_spec['ballots']]), 32)
+    self.assertTrue([6, ['Z', 'Y', '', 'X']] in council_spec['ballots'])
+    self.assertEqual(rcv.tabulate(1, ' A B C D', mayor_spec['ballots'], 3,
+          ' A B C D'), rcv.tabulate(1, ' A B C D', (
+          (15, ' A B C'), (8, ' B C D'), (1, ' B #'), (1, ''),
+          (8, ' C B A'), (5, ' D C B')), 3, ' A B C D'))
+
+  def test_tabulate_cvr_matches_separate_specs(self):
+    output_dir = os.path.join(self.cvr_dir, 'results')
+    specs_dir = os.path.join(self.cvr_dir, 'specs')
+    cvr.main([self.manifest_json, output_dir, '--processes', '2',
+          '--specs-dir', specs_dir])
+    index = with_json.read_json(os.path.join(output_dir,
+          batch.INDEX_FILE_NAME))
+    self.assertEqual([(contest['name'], contest['outcome'])
+          for contest in index['contests']],
+          [('mayor', 'tabulated'), ('council', 'tabulated')])
+    for name in ('mayor', 'council'):
+      expected_json = os.path.join(self.cvr_dir, name + '-expected.json')
+      with_json.tabulate(os.path.join(specs_dir, name + '.json'),
+            expected_json)
+      self.assertEqual(with_json.read_json(os.path.join(output_dir,
+            name + '.json')), with_json.read_json(expected_json))
+
+  def test_missing_column(self):
+    self.manifest['contests'][0]['columns'][2] = 'Mayor 4'
+    with self.assertRaises(errors.RcvValueError):
+      cvr.read_cvr(self.manifest, os.path.join(self.cvr_dir, 'cvr.csv'))
+
+  def test_invalid_contest_name(self):
+    for name in ('', '..', '../mayor', '/tmp/mayor', 'a\\b', 'a\0b',
+          'index'):
+      self.manifest['contests'][0]['name'] = name
+      _test_aids.assertRaises_with_message(self, 'RcvValueError',
+            'Invalid contest name:', cvr.tabulate_cvr,
+            (self.manifest, os.path.join(self.cvr_dir, 'results'),
+            os.path.join(self.cvr_dir, 'cvr.csv'), 1))
+    self.assertFalse(os.path.exists(os.path.join(self.cvr_dir, 'results')))
+
+  def test_duplicate_contest_name(self):
+    self.manifest['contests'][1]['name'] = 'mayor'
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'Duplicate contest name:', cvr.tabulate_cvr,
+          (self.manifest, os.path.join(self.cvr_dir, 'results'),
+          os.path.join(self.cvr_dir, 'cvr.csv'), 1))
+    self.assertFalse(os.path.exists(os.path.join(self.cvr_dir, 'results')))
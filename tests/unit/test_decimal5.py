@@ -236,3 +236,11 @@ class TestBasicDecimal5(unittest.TestCase):
     self.assertEqual(decimal5.div_to_int(-7, -3, round_away=True), 3)
     self.assertEqual(decimal5.div_to_int(-8, -3), 2)
     self.assertEqual(decimal5.div_to_int(-8, -3, round_away=True), 3)
+
+  def test_votes_json(self):
+    value = D5(123456, -5)
+    self.assertEqual(decimal5.votes_to_json(value), 123456)
+    self.assertEqual(decimal5.votes_to_json(7), 7)
+    self.assertEqual(decimal5.decimal_from_json(123456), value)
+    self.assertEqual(decimal5.votes_from_json(123456, False), value)
+    self.assertEqual(decimal5.votes_from_json(7, True), 7)
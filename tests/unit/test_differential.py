@@ -0,0 +1,51 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+import _test_from_file
+
+from _src import sb1288
+from sb1288 import rcv
+from sb1288.bench import differential
+from sb1288.bench import generate
+
+import os
+import os.path
+
+def tabulate_reversed_ties(tabulation_spec):
+  """An engine that resolves ties with the tie_breaker reversed"""
+  args = list(generate.tabulate_args(tabulation_spec))
+  args[4] = list(reversed(differential._names(args[4])))
+  return rcv.Tabulation(*args).tabulate()
+
+class TestDifferential(unittest.TestCase):
+  """Test the differential equivalence harness"""
+
+  def test_engines_match(self):
+    for engine in (differential.ENGINE_SHARDS,
+          differential.ENGINE_INCREMENTAL, differential.ENGINE_RESUME):
+      self.assertEqual(differential.check_contests(engine, 12,
+            nbr_processes=1), [])
+    self.assertEqual(differential.check_contests(
+          differential.ENGINE_SHARDS, 6, 100, nbr_processes=2), [])
+
+  def test_shrink_mismatch(self):
+    mismatches = differential.check_contests(tabulate_reversed_ties, 6,
+          nbr_processes=1, output_dir='temp_output')
+    self.assertTrue(mismatches)
+    for mismatch in mismatches:
+      self.assertNotEqual(mismatch.reference_outcome,
+            mismatch.engine_outcome)
+      self.assertTrue(len(mismatch.tabulation_spec['ballots']) <= 3)
+      self.assertTrue(len(mismatch.tabulation_spec['candidates']) <= 3)
+      _test_from_file.run_test_spec(self, mismatch.file_name)
+      os.remove(mismatch.file_name)
+
+  def test_unsupported_engine(self):
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'Unsupported differential engine:', differential.get_engine,
+          ('vectorized',))
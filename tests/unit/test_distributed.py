@@ -0,0 +1,95 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import distributed
+from sb1288 import errors
+from sb1288 import rcv
+from sb1288.bench import generate
+
+class TestDistributed(unittest.TestCase):
+  """Test tabulating with ballot groups sharded across workers"""
+
+  @classmethod
+  def setUpClass(cls):
+    cls.workers = distributed.LocalWorkers(3)
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.workers.close()
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def test_same_results(self):
+    for nbr_seats_to_fill, model, options in (
+          (1, generate.MODEL_PLACKETT_LUCE, {}),
+          (1, generate.MODEL_SPATIAL, {'alternative_defeats': 'Y'}),
+          (3, generate.MODEL_SPATIAL, {}),
+          (4, generate.MODEL_UNIFORM, {'alternative_defeats': 'Y'}),
+          (2, generate.MODEL_SPATIAL, {'ranking_depth': 3}),
+          ):
+      spec = generate.generate_contest(3000, 9, ranking_depth=5,
+            nbr_seats_to_fill=nbr_seats_to_fill, model=model,
+            overvote_rate=0.01, skip_rate=0.02, options=options)
+      args = generate.tabulate_args(spec)
+      self.assertEqual(distributed.tabulate(*args,
+            workers=self.workers.addresses), rcv.tabulate(*args))
+
+  def test_round_state_resume(self):
+    spec = generate.generate_contest(500, 6, nbr_seats_to_fill=2,
+          model=generate.MODEL_SPATIAL)
+    args = generate.tabulate_args(spec)
+    expected = rcv.tabulate(*args)
+    stopped = distributed.DistributedTabulation(*args,
+          workers=self.workers.addresses)
+    stopped.tabulate(stop_at_end=2)
+    round_state = stopped.get_round_state()
+    stopped.close()
+    local = rcv.Tabulation(*args)
+    local.tabulate(stop_at_end=2)
+    self.assertEqual(round_state.ballot_states,
+          local.get_round_state().ballot_states)
+    self.assertEqual(rcv.Tabulation(*args).resume(round_state), expected)
+    resumed = distributed.DistributedTabulation(*args,
+          workers=self.workers.addresses[:2])
+    self.assertEqual(resumed.resume(local.get_round_state()), expected)
+    resumed.close()
+
+  def test_sharded(self):
+    for nbr_seats_to_fill in (1, 3):
+      spec = generate.generate_contest(2000, 8, ranking_depth=4,
+            nbr_seats_to_fill=nbr_seats_to_fill, model=generate.MODEL_SPATIAL)
+      args = generate.tabulate_args(spec)
+      expected = rcv.tabulate(*args)
+      self.assertEqual(distributed.tabulate_sharded(*args, nbr_processes=3),
+            expected)
+      tabulation = distributed.ShardedTabulation(*args, nbr_processes=2)
+      round_results = list(tabulation.iter_rounds())
+      processes = list(tabulation.processes)
+      tabulation.close()
+      self.assertEqual(round_results, list(rcv.Tabulation(*args).iter_rounds()))
+      self.assertEqual([process.is_alive() for process in processes],
+            [False, False])
+
+  def test_errors(self):
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'No shard workers:', distributed.DistributedTabulation,
+          (1, ' A B', ((1, ' A B'),), 3, ' A B'))
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'No shard workers:', distributed.ShardedTabulation,
+          (1, ' A B', ((1, ' A B'),), 3, ' A B', {}, None, 0))
+    shard = distributed.Shard()
+    self.assertTrue('error' in shard.handle({'op': 'unknown'}))
+    self.assertEqual(shard.handle({'op': distributed.OP_TALLY,
+          'tab_codes': ['A']}), {'error': "KeyError: 'A'"})
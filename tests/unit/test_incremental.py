@@ -0,0 +1,98 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import incremental
+from sb1288 import rcv
+from sb1288.bench import generate
+
+class TestIncremental(unittest.TestCase):
+  """Test incremental tabulation as batches are added and retracted"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def make_batches(self, nbr_seats_to_fill, options={}):
+    spec = generate.generate_contest(4000, 8, ranking_depth=4,
+          nbr_seats_to_fill=nbr_seats_to_fill, model=generate.MODEL_SPATIAL,
+          overvote_rate=0.01, options=options)
+    args = generate.tabulate_args(spec)
+    ballots = args[2]
+    batches = [ballots[ix::6] for ix in range(6)]
+    tabulation = incremental.IncrementalTabulation(args[0], args[1],
+          args[3], args[4], args[5])
+    return args, batches, tabulation
+
+  def assert_same(self, args, tabulation):
+    expected = rcv.tabulate(args[0], args[1], tabulation.ballots(), args[3],
+          args[4], args[5])
+    self.assertEqual(tabulation.tabulate(), expected)
+
+  def test_irv(self):
+    for options in ({}, {'alternative_defeats': 'Y'}, {'ranking_depth': 2}):
+      args, batches, tabulation = self.make_batches(1, options)
+      for ix, batch in enumerate(batches[:5]):
+        tabulation.add_batch(ix, batch)
+        self.assert_same(args, tabulation)
+      tabulation.retract_batch(2)
+      self.assert_same(args, tabulation)
+      tabulation.add_batch('2 rescanned', batches[2])
+      tabulation.add_batch(5, batches[5])
+      self.assert_same(args, tabulation)
+      tabulation.add_batch('small', [(1, ' C01 C02')])
+      self.assert_same(args, tabulation)
+      self.assertEqual(tabulation.recount_round, None)
+
+  def test_changed_decision(self):
+    tabulation = incremental.IncrementalTabulation(1, ' A B C D', 3,
+          ' A B C D')
+    tabulation.add_batch('day 1', [(10, ' A B'), (8, ' B C'), (6, ' C'),
+          (4, ' D A')])
+    self.assertEqual(tabulation.tabulate()[0], set(['A']))
+    tabulation.add_batch('day 2', [(3, ' A B')])
+    self.assertEqual(tabulation.tabulate(), rcv.tabulate(1, ' A B C D',
+          tabulation.ballots(), 3, ' A B C D'))
+    self.assertEqual(tabulation.recount_round, None)
+    tabulation.add_batch('day 3', [(4, ' D C')])
+    self.assertEqual(tabulation.tabulate(), rcv.tabulate(1, ' A B C D',
+          tabulation.ballots(), 3, ' A B C D'))
+    self.assertEqual(tabulation.recount_round, 1)
+    tabulation.retract_batch('day 3')
+    tabulation.add_batch('day 3 rescanned', [(1, ' B C')])
+    self.assertEqual(tabulation.tabulate(), rcv.tabulate(1, ' A B C D',
+          tabulation.ballots(), 3, ' A B C D'))
+    tabulation.add_batch('day 4', [(3, ' C B')])
+    self.assertEqual(tabulation.tabulate(), rcv.tabulate(1, ' A B C D',
+          tabulation.ballots(), 3, ' A B C D'))
+    self.assertEqual(tabulation.recount_round, 2)
+
+  def test_stv(self):
+    args, batches, tabulation = self.make_batches(3)
+    for ix, batch in enumerate(batches):
+      tabulation.add_batch(ix, batch)
+      self.assert_same(args, tabulation)
+    tabulation.retract_batch(0)
+    self.assert_same(args, tabulation)
+    self.assertEqual(tabulation.recount_round, 1)
+
+  def test_errors(self):
+    tabulation = incremental.IncrementalTabulation(1, ' A B', 3, ' A B')
+    tabulation.add_batch(1, [(1, ' A')])
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'Ballot batch already added:', tabulation.add_batch,
+          (1, [(1, ' B')]))
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'Unknown ballot batch:', tabulation.retract_batch, (2,))
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'Invalid ballot ranking code:', tabulation.add_batch,
+          (2, [(1, ' C')]))
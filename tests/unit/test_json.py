@@ -15,6 +15,7 @@ import sys
 import os
 import os.path
 import io
+import json
 import subprocess
 
 PYTHON_2_CMD = 'python'
@@ -162,3 +163,39 @@ class TestJson(unittest.TestCase):
     self.assertEqual(output_str2, expected_output_str)
     self.assertEqual(output_str3, expected_output_str)  
 
+
+  def test_json_stream_rounds(self):
+    input_str = _test_aids.as_unicode(
+          '{',
+          '  "description": "Simple 4-candidate, from 3rd place to winner"',
+          '  ,"nbr_seats_to_fill": 1',
+          '  ,"candidates": " A B C D"',
+          '  ,"ballots": [',
+          '        [15, " A B C"],',
+          '        [8, " D C B"],',
+          '        [1,  " D"],',
+          '        [1,  " D #"],',
+          '        [8,  " C D A"],',
+          '        [5,  " B C D"]',
+          '        ]',
+          '  ,"max_ranking_levels": 3',
+          '  ,"tie_breaker": " A B C D"',
+          '  ,"options": {}',
+          '}'
+          )
+    expected_output_str = '''\
+{"round": 1, "tally": {"A": 15, "B": 5, "C": 8, "D": 10, ":Overvotes": 0, \
+":Abstentions": 0, ":Other exhausted": 0}, "elected": [], "defeated": ["B"]}
+{"round": 2, "tally": {"A": 15, "C": 13, "D": 10, ":Overvotes": 0, \
+":Abstentions": 0, ":Other exhausted": 0}, "elected": [], "defeated": ["D"]}
+{"round": 3, "tally": {"A": 15, "C": 21, ":Overvotes": 1, \
+":Abstentions": 1, ":Other exhausted": 0}, "elected": ["C"], \
+"defeated": ["A"]}
+'''
+    input_file = io.StringIO(input_str)
+    output_file = io.StringIO()
+    result = with_json.tabulate(input_file, output_file, stream_rounds=True)
+    output_file.seek(0)
+    output_lines = output_file.read().splitlines(True)
+    self.assertEqual(''.join(output_lines[:-1]), expected_output_str)
+    self.assertEqual(json.loads(output_lines[-1])['elected'], ['C'])
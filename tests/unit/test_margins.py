@@ -0,0 +1,113 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import constants as K
+from sb1288 import margins
+from sb1288 import rcv
+from sb1288.bench import generate
+
+class TestMargins(unittest.TestCase):
+  """Test the margins of IRV tabulations"""
+
+  def test_two_candidates(self):
+    tabulation = rcv.Tabulation(1, ' A B', (
+          (10, ' A'),
+          (6, ' B A'),
+          ), 3, ' A B')
+    tabulation.tabulate()
+    self.assertEqual(margins.analyze(tabulation), margins.MarginAnalysis(
+          'A', (), 4, 2, 3, 1, True))
+
+  def test_round_margins(self):
+    tabulation = rcv.Tabulation(1, ' A B C D', (
+          (15, ' A B'),
+          (6, ' B C'),
+          (8,  ' C B'),
+          (10,  ' D A'),
+          ), 3, ' D C B A')
+    tabulation.tabulate()
+    analysis = margins.analyze(tabulation)
+    self.assertEqual(analysis.winner, 'A')
+    self.assertEqual(analysis.round_margins, ((1, 2), (2, 4)))
+    self.assertEqual(analysis.last_round_margin, 11)
+    self.assertTrue(analysis.is_complete)
+    self.assertEqual((analysis.lower_bound, analysis.upper_bound), (3, 6))
+
+  def test_bounds(self):
+    for seed, nbr_candidates, model in ((1, 5, generate.MODEL_SPATIAL),
+          (2, 8, generate.MODEL_SPATIAL), (3, 12, generate.MODEL_UNIFORM)):
+      spec = generate.generate_contest(2000, nbr_candidates,
+            ranking_depth=4, model=model, seed=seed, overvote_rate=0.01)
+      args = generate.tabulate_args(spec)
+      tabulation = rcv.Tabulation(*args)
+      tabulation.tabulate()
+      analysis = margins.analyze(tabulation)
+      self.assertTrue(analysis.is_complete)
+      self.assertTrue(0 <= analysis.lower_bound <= analysis.upper_bound)
+      truncated = margins.analyze(tabulation, 1)
+      self.assertTrue(truncated.lower_bound <= analysis.lower_bound)
+      self.assertEqual(truncated.upper_bound, analysis.upper_bound)
+      self.assertNotEqual(self.swap_finalists(args, tabulation,
+            analysis.upper_bound), analysis.winner)
+
+  def swap_finalists(self, args, tabulation, nbr_ballots):
+    """
+    Swap the winner and runner-up on ballots that count for the winner
+    in the last round, and get the new winner
+    """
+    winner = list(tabulation.elected())[0]
+    finalists = margins.rounds.continuing_by_round(tabulation.candidates,
+          margins.rounds.decisions_from_status(tabulation.status))[-1]
+    tally = margins._candidate_tally(margins._preferences(tabulation),
+          finalists)
+    while len(finalists) > 2:
+      finalists = finalists - set([min([candidate for candidate in finalists
+            if candidate != winner], key=lambda candidate: (tally[candidate],
+            tabulation.tie_breaker[candidate]))])
+      tally = margins._candidate_tally(margins._preferences(tabulation),
+            finalists)
+    runner_up = [candidate for candidate in finalists
+          if candidate != winner][0]
+    ballots = []
+    for multiple, rankings in args[2]:
+      preferred = [ranking_code for ranking_code in rankings
+            if ranking_code in finalists]
+      swapped = min(multiple, nbr_ballots) if (preferred and
+            preferred[0] == winner and K.RANKING_CODE_OVERVOTE not in rankings[:rankings.index(
+            winner)]) else 0
+      if swapped:
+        nbr_ballots -= swapped
+        ballots.append([swapped, [runner_up if ranking_code == winner else
+              winner if ranking_code == runner_up else ranking_code
+              for ranking_code in rankings]])
+      if multiple > swapped:
+        ballots.append([multiple - swapped, rankings])
+    self.assertEqual(nbr_ballots, 0)
+    tabulation = rcv.Tabulation(args[0], args[1], ballots, *args[3:])
+    tabulation.tabulate()
+    return list(tabulation.elected())[0]
+
+  def test_unsupported(self):
+    tabulation = rcv.Tabulation(2, ' A B C', (
+          (10, ' A B'),
+          (4, ' B'),
+          (3, ' C'),
+          ), 3, ' A B C')
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'Margins are only supported for IRV:', margins.analyze,
+          (tabulation,))
+    tabulation = rcv.Tabulation(1, ' A B C', (
+          (10, ' A B'),
+          (4, ' B'),
+          (3, ' C'),
+          ), 3, ' A B C')
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'The tabulation has not been tabulated:', margins.analyze,
+          (tabulation,))
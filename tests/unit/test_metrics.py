@@ -0,0 +1,111 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import errors
+from sb1288 import metrics
+from sb1288 import observe
+from sb1288 import rcv
+
+import os
+import os.path
+
+try:
+  from urllib.request import urlopen
+except ImportError:
+  # Python 2
+  from urllib2 import urlopen
+
+class TestMetrics(unittest.TestCase):
+  """Test collecting metrics from tabulations"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def get_samples(self, exposition):
+    samples = {}
+    for line in exposition.splitlines():
+      if not line.startswith('#'):
+        name, value = line.rsplit(' ', 1)
+        samples[name] = value
+    return samples
+
+  def test_tabulate(self):
+    collector = metrics.Metrics()
+    phase_timer = observe.PhaseTimer()
+    args = _test_aids.make_contest(1)
+    self.assertEqual(collector.tabulate(*args, observer=phase_timer),
+          rcv.tabulate(*args))
+    stv_phase_timer = observe.PhaseTimer()
+    collector.tabulate(*_test_aids.make_contest(2), observer=stv_phase_timer)
+    bad_args = _test_aids.make_contest(1)
+    bad_args[2] = ((1, ' A X'),)
+    with self.assertRaises(errors.RcvValueError):
+      collector.tabulate(*bad_args)
+    collector.record_cache('results', True)
+    collector.record_cache('results', False)
+    collector.record_cache('results', False)
+    exposition = collector.exposition()
+    samples = self.get_samples(exposition)
+    self.assertEqual(samples['sb1288_contests_tabulated_total'], '2')
+    self.assertEqual(samples['sb1288_ballot_groups_total'], '14')
+    self.assertEqual(int(samples['sb1288_rounds_total']),
+          len(phase_timer.rounds) + len(stv_phase_timer.rounds))
+    self.assertEqual(sorted([name for name in samples
+          if name.startswith('sb1288_validation_failures_total')]),
+          ['sb1288_validation_failures_total'
+          '{kind="ballots"}'])
+    self.assertEqual(samples['sb1288_cache_hits_total{cache="results"}'],
+          '1')
+    self.assertEqual(samples['sb1288_cache_misses_total{cache="results"}'],
+          '2')
+    self.assertEqual(samples['sb1288_tabulation_duration_seconds_count'],
+          '2')
+    self.assertEqual(samples['sb1288_phase_duration_seconds_count'
+          '{phase="validate"}'], '2')
+    self.assertEqual(samples['sb1288_phase_duration_seconds_bucket'
+          '{phase="validate",le="+Inf"}'], '2')
+    for metric, metric_type, help_text, label_name in metrics.METRIC_LIST:
+      self.assertTrue('# TYPE {} {}\n'.format(metric, metric_type)
+            in exposition)
+
+  def test_write_and_serve(self):
+    collector = metrics.Metrics()
+    collector.tabulate(*_test_aids.make_contest(1))
+    file_name = os.path.join('temp_output', 'metrics-test.prom')
+    collector.write(file_name)
+    with open(file_name) as input_file:
+      self.assertEqual(input_file.read(), collector.exposition())
+    os.remove(file_name)
+    server = collector.serve(0)
+    try:
+      response = urlopen('http://127.0.0.1:{}/metrics'.format(
+            server.server_address[1]))
+      body = response.read().decode('utf-8')
+      response.close()
+    finally:
+      server.shutdown()
+      server.server_close()
+    self.assertEqual(body, collector.exposition())
+
+  def test_validation_failure_kind(self):
+    for message, kind in (
+          ('Invalid ballot ranking code:', 'ballots'),
+          ('Invalid candidate name in tie_breaker:', 'tie_breaker'),
+          ('Invalid candidate name:', 'candidates'),
+          ('max_ranking_levels is less than 3:', 'max_ranking_levels'),
+          ('Invalid per-round option value:', 'options'),
+          ('Something else:', 'other'),
+          ):
+      self.assertEqual(metrics.validation_failure_kind(
+            errors.RcvValueError(message)), kind)
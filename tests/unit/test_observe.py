@@ -0,0 +1,73 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import observe
+from sb1288 import rcv
+
+class TestObserve(unittest.TestCase):
+  """Test observing a tabulation"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def test_irv_events(self):
+    events = []
+    args = _test_aids.make_contest(1)
+    result = rcv.Tabulation(*args, observer=events.append).tabulate()
+    self.assertEqual(result, rcv.tabulate(*args))
+    self.assertEqual([(event.kind, event.phase, event.nbr_round)
+          for event in events], [
+          ('phase', 'validate', 0),
+          ('phase', 'assign_ballots', 1),
+          ('phase', 'tally_votes', 1),
+          ('phase', 'transfer_from_defeated', 1),
+          ('round', None, 1),
+          ('phase', 'tally_votes', 2),
+          ('phase', 'transfer_from_defeated', 2),
+          ('round', None, 2),
+          ('phase', 'tally_votes', 3),
+          ('round', None, 3),
+          ('tabulation', None, 3),
+          ])
+    self.assertEqual(events[1].counters['ballots_moved'], 7)
+    self.assertEqual(events[1].counters['piles_touched'], 4)
+    self.assertEqual(events[3].counters['ballots_moved'], 3)
+    self.assertEqual(events[-1].counters['rounds'], 3)
+    self.assertEqual(events[-1].counters['ballots_moved'], 11)
+    self.assertTrue(all([event.elapsed >= 0 for event in events]))
+
+  def test_stv_phase_timer(self):
+    timer = observe.PhaseTimer()
+    rcv.Tabulation(*_test_aids.make_contest(3), observer=timer).tabulate()
+    self.assertEqual(len(timer.rounds), 2)
+    self.assertEqual(timer.counters['transfer_surplus']['ballots_moved'],
+          3)
+    self.assertTrue(
+          timer.counters['transfer_surplus']['decimal_operations'] > 0)
+    self.assertEqual(timer.total.counters['rounds'], 2)
+    self.assertEqual(sorted(timer.as_dict()['phases']),
+          sorted(observe.PHASE_LIST))
+
+  def test_progress_events(self):
+    events = []
+    tabulation = rcv.Tabulation(*_test_aids.make_contest(1),
+          observer=events.append)
+    tabulation.progress_interval = 2
+    tabulation.tabulate(stop_at_end=1)
+    progress = [event for event in events if event.kind == 'progress']
+    self.assertEqual([event.counters['ballots_moved']
+          for event in progress], [2, 4, 6, 2])
+    self.assertEqual(progress[0].phase, 'assign_ballots')
+    self.assertEqual(progress[0].counters['ballots_total'], 7)
+    self.assertEqual(progress[3].phase, 'transfer_from_defeated')
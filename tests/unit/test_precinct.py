@@ -0,0 +1,98 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import constants as K
+from sb1288 import rcv
+from sb1288 import with_json
+from sb1288.bench import generate
+
+import json
+import os
+import os.path
+
+class TestPrecinct(unittest.TestCase):
+  """Test round-by-round vote totals by precinct"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def with_precincts(self, ballots, nbr_precincts):
+    return [(multiple, rankings, 'P{}'.format(ix % nbr_precincts))
+          for ix, (multiple, rankings) in enumerate(ballots)]
+
+  def assert_consistent(self, tabulation):
+    precinct_tally = tabulation.precinct_tally
+    self.assertEqual(len(precinct_tally.rounds), tabulation.nbr_round)
+    for ix, rows in enumerate(precinct_tally.rounds):
+      for tab_code in rows:
+        self.assertEqual(sum(precinct_tally.votes(ix + 1, tab_code),
+              tabulation.zero_votes()), tabulation.tallies[tab_code][ix])
+
+  def test_irv(self):
+    ballots = (
+          (15, ' A B C', 'North'),
+          (8, ' B C D', 'South'),
+          (1,  ' B', 'North'),
+          (8,  ' C B A', 'South'),
+          (5,  ' D C B', 'North'),
+          (2,  ' D A', 'South'),
+          )
+    tabulation = rcv.Tabulation(1, ' A B C D', ballots, 3, ' A B C D')
+    results = tabulation.tabulate()
+    self.assertEqual(results, rcv.tabulate(1, ' A B C D',
+          [ballot[:2] for ballot in ballots], 3, ' A B C D'))
+    precinct_tally = tabulation.precinct_tally
+    self.assertEqual(precinct_tally.precincts, ('North', 'South'))
+    self.assertEqual(precinct_tally.votes(1, 'D'), (5, 2))
+    self.assertEqual(precinct_tally.votes(2, 'D'), None)
+    self.assertEqual(precinct_tally.votes(2, 'A'), (15, 2))
+    self.assertEqual(precinct_tally.votes(2, 'C'), (5, 8))
+    self.assertEqual(precinct_tally.totals(3)['South'],
+          {'A': 2, 'C': 16, K.LABEL_OVERVOTES: 0,
+          K.LABEL_ABSTENTIONS: 0, K.LABEL_OTHER_EXHAUSTED: 0})
+    self.assertEqual(precinct_tally.votes(3, K.LABEL_ABSTENTIONS), (1, 0))
+    self.assert_consistent(tabulation)
+
+  def test_generated(self):
+    for nbr_seats_to_fill in (1, 3):
+      spec = generate.generate_contest(3000, 9, ranking_depth=5,
+            nbr_seats_to_fill=nbr_seats_to_fill,
+            model=generate.MODEL_SPATIAL, overvote_rate=0.01)
+      args = list(generate.tabulate_args(spec))
+      expected = rcv.tabulate(*args)
+      args[2] = self.with_precincts(args[2], 25)
+      tabulation = rcv.Tabulation(*args)
+      self.assertEqual(tabulation.tabulate(), expected)
+      self.assert_consistent(tabulation)
+      stopped = rcv.Tabulation(*args)
+      stopped.tabulate(stop_at_end=2)
+      resumed = rcv.Tabulation(*args)
+      resumed.resume(stopped.get_round_state())
+      self.assertEqual(resumed.precinct_tally.rounds[:2], [None, None])
+      self.assertEqual(resumed.precinct_tally.rounds[2:],
+            tabulation.precinct_tally.rounds[2:])
+
+  def test_with_json(self):
+    spec = with_json.read_json(os.path.join('unit', 'json-001.json'))
+    spec['ballots'] = self.with_precincts(spec['ballots'], 2)
+    output_json = os.path.join('temp_output', 'precinct-out.json')
+    elected, status, tally, spec = with_json.tabulate(spec, output_json)
+    results = with_json.read_json(output_json)
+    os.remove(output_json)
+    self.assertEqual(results['precinct_tally']['precincts'], ['P0', 'P1'])
+    rounds = results['precinct_tally']['rounds']
+    self.assertEqual(len(rounds), len(tally[list(elected)[0]]))
+    for ix, round_tally in enumerate(rounds):
+      for code, votes in round_tally.items():
+        self.assertEqual(sum(votes), with_json.json_votes(tally[code][ix]))
@@ -0,0 +1,70 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import observe
+from sb1288 import profiling
+from sb1288 import rcv
+from sb1288.bench import generate
+
+import os.path
+import pstats
+import sys
+
+class TestProfiling(unittest.TestCase):
+  """Test profiling tabulations"""
+
+  def test_current_phase(self):
+    phases = []
+    def observer(event):
+      if event.kind == observe.EVENT_PHASE:
+        phases.append((event.phase,
+              profiling.current_phase(sys._getframe())))
+    rcv.Tabulation(*_test_aids.make_contest(3), observer=observer).tabulate()
+    self.assertEqual(phases[0],
+          (observe.PHASE_VALIDATE, observe.PHASE_VALIDATE))
+    self.assertTrue((observe.PHASE_TRANSFER_SURPLUS,
+          observe.PHASE_TRANSFER_SURPLUS) in phases)
+    self.assertTrue(all([event_phase == phase
+          for event_phase, phase in phases]))
+    self.assertEqual(profiling.current_phase(sys._getframe()),
+          profiling.PHASE_OTHER)
+
+  def test_sample(self):
+    sampler = profiling.SamplingProfiler()
+    def observer(event):
+      if event.kind == observe.EVENT_PHASE:
+        sampler.sample(sys._getframe())
+    rcv.Tabulation(*_test_aids.make_contest(3), observer=observer).tabulate()
+    phase_counts = sampler.phase_counts()
+    self.assertEqual(phase_counts[observe.PHASE_VALIDATE], 1)
+    self.assertEqual(sampler.nbr_samples, sum(phase_counts.values()))
+    for line in sampler.collapsed().splitlines():
+      stack, count = line.rsplit(' ', 1)
+      self.assertTrue(stack.startswith('phase:'))
+      self.assertTrue(stack.endswith('test_profiling.py:observer'))
+
+  def test_profile_call(self):
+    spec = generate.generate_contest(20000, 10, ranking_depth=5,
+          nbr_seats_to_fill=3, model=generate.MODEL_SPATIAL)
+    pstats_file = os.path.join('temp_output', 'profile-test.pstats')
+    stacks_file = os.path.join('temp_output', 'profile-test-stacks.txt')
+    args = generate.tabulate_args(spec)
+    result = profiling.profile_call(rcv.tabulate, args,
+          pstats_file=pstats_file, stacks_file=stacks_file,
+          interval=0.0005)
+    self.assertEqual(result, rcv.tabulate(*args))
+    stats = pstats.Stats(pstats_file)
+    self.assertTrue(any([function == 'tally_votes_for_assigned_ballots'
+          for file_name, line, function in stats.stats.keys()]))
+    with open(stacks_file) as input_file:
+      lines = input_file.read().splitlines()
+    self.assertTrue(all([line.startswith('phase:') for line in lines]))
+    os.remove(pstats_file)
+    os.remove(stacks_file)
@@ -13,8 +13,11 @@ from sb1288 import constants as K
 from sb1288 import validate
 from sb1288.validate import str_tuple
 
+import os.path
 import sys
 import re
+import threading
+import time
 
 class TestRcv(unittest.TestCase):
   """Test RCV routines"""
@@ -173,3 +176,160 @@ class TestRcv(unittest.TestCase):
           set(('A',)))
 
 
+  def test_round_state_resume(self):
+    for make_tabulation in (self.make_irv_02, self.make_stv_01):
+      expected = make_tabulation().tabulate()
+      stopped = make_tabulation()
+      stopped.tabulate(stop_at_end=1)
+      round_state = stopped.get_round_state()
+      self.assertEqual(round_state.nbr_round, 1)
+      resumed = make_tabulation().resume(round_state)
+      self.assertEqual(resumed, expected)
+
+  def test_round_state_mismatch(self):
+    stopped = self.make_irv_01()
+    stopped.tabulate(stop_at_end=1)
+    round_state = stopped.get_round_state()
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'Round state does not match the tabulation:',
+          self.make_irv_02().resume, (round_state,))
+
+  def test_checkpoint_resume(self):
+    checkpoint_file = 'temp_output/checkpoint-test.json.gz'
+    for make_tabulation in (self.make_irv_02, self.make_stv_01):
+      if os.path.isfile(checkpoint_file):
+        os.remove(checkpoint_file)
+      expected = make_tabulation().tabulate()
+      interrupted = make_tabulation()
+      interrupted.tabulate(checkpoint_file=checkpoint_file, stop_at_end=2)
+      self.assertTrue(os.path.isfile(checkpoint_file))
+      resumed = make_tabulation().resume_from_checkpoint(checkpoint_file)
+      self.assertEqual(resumed, expected)
+      _test_aids.assertRaises_with_message(self, 'RcvValueError',
+            'Checkpoint does not match the tabulation:',
+            self.make_irv_01().resume_from_checkpoint, (checkpoint_file,))
+    os.remove(checkpoint_file)
+
+  def test_invalid_checkpoint_file(self):
+    checkpoint_file = 'temp_output/checkpoint-invalid-test.json.gz'
+    full_file = 'temp_output/checkpoint-full-test.json.gz'
+    self.make_irv_02().tabulate(checkpoint_file=full_file, stop_at_end=1)
+    with open(full_file, 'rb') as input_file:
+      gzip_bytes = input_file.read()
+    os.remove(full_file)
+    try:
+      for contents in (b'{"format": "sb1288-checkpoint-1"}\n',
+            gzip_bytes[:len(gzip_bytes) // 2], gzip_bytes[:5]):
+        with open(checkpoint_file, 'wb') as output_file:
+          output_file.write(contents)
+        _test_aids.assertRaises_with_message(self, 'RcvValueError',
+              'Invalid checkpoint file:',
+              self.make_irv_02().resume_from_checkpoint, (checkpoint_file,))
+    finally:
+      os.remove(checkpoint_file)
+
+  def test_cancel_token(self):
+    for make_tabulation in (self.make_irv_02, self.make_stv_01):
+      expected = make_tabulation().tabulate()
+      cancel_token = threading.Event()
+      def observer(event):
+        if event.kind == 'round' and event.nbr_round == 1:
+          cancel_token.set()
+      cancelled = make_tabulation()
+      cancelled.observer = observer
+      with self.assertRaises(sb1288.errors.RcvCancelledError) as context:
+        cancelled.tabulate(cancel_token=cancel_token)
+      self.assertEqual(context.exception.message, 'Tabulation cancelled:')
+      round_state = context.exception.round_state
+      self.assertEqual(round_state.nbr_round, 1)
+      self.assertEqual(context.exception.nbr_round, 1)
+      self.assertEqual(make_tabulation().resume(round_state), expected)
+
+  def test_deadline(self):
+    test_tabulation = self.make_irv_02()
+    with self.assertRaises(sb1288.errors.RcvCancelledError) as context:
+      test_tabulation.tabulate(deadline=time.time() - 1)
+    self.assertEqual(context.exception.message, 'Tabulation deadline passed:')
+    self.assertEqual(context.exception.round_state, None)
+    self.assertEqual(context.exception.nbr_round, 0)
+    self.assertEqual(self.make_irv_02().tabulate(deadline=time.time() + 60),
+          self.make_irv_02().tabulate())
+
+  def test_cancel_while_assigning(self):
+    cancel_token = threading.Event()
+    test_tabulation = rcv.Tabulation(1, ' A B C', [(1, ' A B C')] * 30 +
+          [(1, ' B C A')] * 20 + [(1, ' C B A')] * 15, 3, ' A B C')
+    def observer(event):
+      if event.kind == 'progress':
+        cancel_token.set()
+    test_tabulation.observer = observer
+    test_tabulation.progress_interval = 10
+    save_interval = rcv.CANCEL_CHECK_INTERVAL
+    rcv.CANCEL_CHECK_INTERVAL = 10
+    try:
+      with self.assertRaises(sb1288.errors.RcvCancelledError) as context:
+        test_tabulation.tabulate(cancel_token=cancel_token)
+    finally:
+      rcv.CANCEL_CHECK_INTERVAL = save_interval
+    self.assertEqual(context.exception.round_state, None)
+
+  def test_cancel_within_round(self):
+    checkpoint_file = 'temp_output/checkpoint-cancel-test.json.gz'
+    def make_tabulation():
+      return rcv.Tabulation(1, ' A B C D', [(10, ' A'), (8, ' B'),
+            (2, ' C A'), (2, ' C B'), (2, ' C D'), (3, ' D A')], 3,
+            ' A B C D')
+    expected = make_tabulation().tabulate()
+    save_interval = rcv.CANCEL_CHECK_INTERVAL
+    rcv.CANCEL_CHECK_INTERVAL = 1
+    try:
+      for kwargs, nbr_round in (({}, None),
+            ({'checkpoint_file': checkpoint_file}, 1)):
+        cancel_token = threading.Event()
+        def observer(event):
+          if event.kind == 'progress' and event.nbr_round == 2:
+            cancel_token.set()
+        test_tabulation = make_tabulation()
+        test_tabulation.observer = observer
+        test_tabulation.progress_interval = 1
+        get_round_state = test_tabulation.get_round_state
+        nbr_snapshots = [0]
+        def counting_get_round_state():
+          nbr_snapshots[0] += 1
+          return get_round_state()
+        test_tabulation.get_round_state = counting_get_round_state
+        with self.assertRaises(sb1288.errors.RcvCancelledError) as context:
+          test_tabulation.tabulate(cancel_token=cancel_token, **kwargs)
+        round_state = context.exception.round_state
+        self.assertEqual(context.exception.nbr_round, 1)
+        if nbr_round is None:
+          self.assertEqual(round_state, None)
+          self.assertEqual(nbr_snapshots[0], 0)
+        else:
+          self.assertEqual(round_state.nbr_round, nbr_round)
+          self.assertEqual(make_tabulation().resume(round_state), expected)
+    finally:
+      rcv.CANCEL_CHECK_INTERVAL = save_interval
+      if os.path.isfile(checkpoint_file):
+        os.remove(checkpoint_file)
+
+  def test_iter_rounds(self):
+    test_tabulation = self.make_irv_02()
+    round_results = list(test_tabulation.iter_rounds())
+    elected, status, tally = self.make_irv_02().tabulate()
+    self.assertEqual([round_result.nbr_round
+          for round_result in round_results], [1, 2, 3])
+    self.assertEqual(test_tabulation.elected(), elected)
+    for round_result in round_results:
+      self.assertEqual(dict(round_result.tally), {code: votes[
+            round_result.nbr_round - 1] for code, votes in tally.items()
+            if len(votes) >= round_result.nbr_round})
+    self.assertEqual(round_results[0].defeated, frozenset(['D']))
+    self.assertEqual(round_results[2].elected, frozenset(['C']))
+    self.assertEqual(round_results[2].threshold, None)
+
+  def test_iter_rounds_stv(self):
+    round_results = list(self.make_stv_01().iter_rounds())
+    self.assertEqual(round_results[0].threshold, K.Decimal(9.5))
+    self.assertEqual(round_results[0].elected, frozenset(['A', 'B']))
+
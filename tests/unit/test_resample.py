@@ -0,0 +1,121 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import rcv
+from sb1288 import resample
+
+import json
+
+class TestResample(unittest.TestCase):
+  """Test tabulating replicates with other multiples of ballot groups"""
+
+  def test_replicates_match_separate_tabulations(self):
+    args = _test_aids.make_contest()
+    tabulation = rcv.Tabulation(*args)
+    tabulation.tabulate()
+    replicates = [
+          [15, 3, 1, 1, 8, 5, 5],
+          [0, 3, 1, 1, 8, 5, 5],
+          [2, 0, 0, 1, 8, 9, 1],
+          ]
+    args[2] = tabulation.ballots
+    results = list(resample.tabulate_replicates(*args,
+          multiples=iter(replicates), nbr_processes=1))
+    self.assertEqual([result.index for result in results], [0, 1, 2])
+    for replicate, result in zip(replicates, results):
+      ballots = [(multiple, ballot.get_rankings())
+            for multiple, ballot in zip(replicate, tabulation.ballots)
+            if multiple]
+      elected, status, tally = rcv.tabulate(args[0], args[1], ballots,
+            *args[3:])
+      self.assertEqual(result.elected, frozenset(elected))
+      self.assertEqual(result.nbr_rounds, max([len(votes)
+            for votes in tally.values()]))
+      self.assertEqual(result.error, None)
+    self.assertEqual(tabulation.ballots[0].get_multiple(), 15)
+
+  def test_replicates_in_process_pool(self):
+    args = _test_aids.make_contest()
+    replicates = list(resample.bootstrap_multiples([15, 3, 1, 1, 8, 5, 5],
+          20, seed=7))
+    serial = list(resample.tabulate_replicates(*args,
+          multiples=replicates, nbr_processes=1))
+    pooled = list(resample.tabulate_replicates(*args,
+          multiples=replicates, nbr_processes=2))
+    self.assertEqual(serial, pooled)
+
+  def test_bootstrap_multiples(self):
+    multiples = [15, 0, 1, 1, 8, 5, 5]
+    replicates = list(resample.bootstrap_multiples(multiples, 5, seed=1))
+    self.assertEqual(replicates, list(resample.bootstrap_multiples(
+          multiples, 5, seed=1)))
+    self.assertEqual(len(replicates), 5)
+    for replicate in replicates:
+      self.assertEqual(len(replicate), len(multiples))
+      self.assertEqual(sum(replicate), 35)
+      self.assertEqual(replicate[1], 0)
+    projected = list(resample.bootstrap_multiples(multiples, 3, 1000, 2))
+    self.assertEqual([sum(replicate) for replicate in projected],
+          [1000] * 3)
+    self.assertTrue(all([300 < replicate[0] < 560
+          for replicate in projected]))
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'There are no ballots to sample:', resample.bootstrap_multiples,
+          ([0, 0], 1, 10))
+
+  def test_summarize(self):
+    args = _test_aids.make_contest()
+    results = list(resample.tabulate_replicates(*args, multiples=[
+          [15, 3, 1, 1, 8, 5, 5],
+          [30, 3, 1, 1, 8, 5, 5],
+          [15, 3, 1, 1, 8, 5],
+          [15, 3, 1, -1, 8, 5, 5],
+          [15, 3, 1, 1, 8, 5, 5],
+          ], nbr_processes=1))
+    self.assertEqual(results[2].error, 'RcvValueError: '
+          'A multiples vector does not have one multiple per ballot group:')
+    self.assertEqual(results[3].error,
+          'RcvValueError: Invalid replacement multiple:')
+    frequencies = resample.summarize(results)
+    self.assertEqual(frequencies, resample.WinnerFrequencies(5, 2,
+          {'A': 1, 'C': 2}, {frozenset(['A']): 1, frozenset(['C']): 2}))
+    summary = json.loads(resample.frequencies_to_json(frequencies, 'Test'))
+    self.assertEqual(summary['description'], 'Test')
+    self.assertEqual(summary['elected'], {'A': 1, 'C': 2})
+    self.assertEqual(summary['winner_sets'], [[['C'], 2], [['A'], 1]])
+
+  def test_interleaved_serial_generators(self):
+    args = _test_aids.make_contest()
+    other_args = [1, ' A B C', ((3, ' A'), (5, ' B'), (1, ' C')), 3,
+          ' A B C', {}]
+    first = resample.tabulate_replicates(*args,
+          multiples=[[15, 3, 1, 1, 8, 5, 5], [30, 3, 1, 1, 8, 5, 5]],
+          nbr_processes=1)
+    self.assertEqual(next(first).elected, frozenset(['C']))
+    second = resample.tabulate_replicates(*other_args,
+          multiples=[[3, 5, 1]], nbr_processes=1)
+    self.assertEqual(next(second).elected, frozenset(['B']))
+    self.assertEqual(next(first).elected, frozenset(['A']))
+
+  def test_replicates_taken_in_windows(self):
+    args = _test_aids.make_contest()
+    nbr_taken = [0]
+    def replicates():
+      while True:
+        nbr_taken[0] += 1
+        yield [15, 3, 1, 1, 8, 5, 5]
+    results = resample.tabulate_replicates(*args, multiples=replicates(),
+          nbr_processes=2)
+    try:
+      for ix in range(3):
+        self.assertEqual(next(results).elected, frozenset(['C']))
+      self.assertEqual(nbr_taken[0], resample.REPLICATES_PER_PROCESS * 2)
+    finally:
+      results.close()
@@ -0,0 +1,59 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import rcv
+from sb1288 import rounds
+from sb1288.bench import generate
+
+class TestRounds(unittest.TestCase):
+  """Test tallying IRV rounds independently"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def test_round_tallies(self):
+    for options in ({}, {'alternative_defeats': 'Y'}):
+      spec = generate.generate_contest(3000, 10, ranking_depth=4,
+            model=generate.MODEL_SPATIAL, overvote_rate=0.01,
+            skip_rate=0.02, options=options)
+      tabulation = rcv.Tabulation(*generate.tabulate_args(spec))
+      elected, status, tally = tabulation.tabulate()
+      decisions = rounds.decisions_from_status(status)
+      self.assertEqual(len(decisions), tabulation.nbr_round)
+      continuing_sets = rounds.continuing_by_round(tabulation.candidates,
+            decisions)
+      expected = [{tab_code: votes[ix] for tab_code, votes in tally.items()
+            if len(votes) > ix} for ix in range(tabulation.nbr_round)]
+      for nbr_processes in (1, 2):
+        self.assertEqual(rounds.round_tallies(tabulation.ballots,
+              continuing_sets, tabulation.max_ranking_levels,
+              nbr_processes), expected)
+      self.assertEqual(rounds.round_tally(tabulation.ballots,
+            continuing_sets[-1], tabulation.max_ranking_levels),
+            expected[-1])
+
+  def test_decisions_from_status(self):
+    elected, status, tally = rcv.tabulate(1, ' A B C D', (
+          (15, ' A B C'),
+          (8, ' B C D'),
+          (8,  ' C B A'),
+          (5,  ' D C B'),
+          ), 3, ' A B C D')
+    self.assertEqual(rounds.decisions_from_status(status), [
+          (set(), set(['D'])),
+          (set(), set(['B'])),
+          (set(['C']), set(['A'])),
+          ])
+    self.assertEqual(rounds.continuing_by_round(' A B C D'.split(),
+          rounds.decisions_from_status(status))[2], frozenset(['A', 'C']))
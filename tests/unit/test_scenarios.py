@@ -0,0 +1,122 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import rcv
+from sb1288 import scenarios
+from sb1288.bench import generate
+
+import json
+
+class TestScenarios(unittest.TestCase):
+  """Test tabulating scenario variants"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def test_expand_grid(self):
+    variants = scenarios.expand_grid({'stop_at_majority': [False, True],
+          'tie_breaker': [' A B C D', ' D C B A']})
+    self.assertEqual(variants, [
+          {'stop_at_majority': False, 'tie_breaker': ' A B C D'},
+          {'stop_at_majority': False, 'tie_breaker': ' D C B A'},
+          {'stop_at_majority': True, 'tie_breaker': ' A B C D'},
+          {'stop_at_majority': True, 'tie_breaker': ' D C B A'},
+          ])
+
+  def test_validated_ballots_are_copied(self):
+    args = _test_aids.make_contest()
+    tabulation = rcv.Tabulation(*args)
+    tabulation.tabulate()
+    args[2] = tabulation.ballots
+    copied = rcv.Tabulation(*args)
+    self.assertEqual(copied.ballots, tabulation.ballots)
+    for ballot, copied_ballot in zip(tabulation.ballots, copied.ballots):
+      self.assertIsNot(ballot, copied_ballot)
+
+  def test_scenarios_match_separate_tabulations(self):
+    args = _test_aids.make_contest()
+    variants = [
+          {'alternative_defeats': 'Y'},
+          {'name': 'two seats', 'nbr_seats_to_fill': 2},
+          {'options': {'stop_at_majority': True}},
+          ]
+    results = scenarios.tabulate_scenarios(*args, variants=variants,
+          nbr_processes=1)
+    self.assertEqual([result.name for result in results],
+          ['baseline', 'alternative_defeats=Y', 'two seats',
+          'stop_at_majority=True'])
+    expected_baseline = rcv.tabulate(*args)
+    self.assertEqual(results[0].tally, expected_baseline[2])
+    self.assertEqual(results[0].first_divergent_round, None)
+    expected_two_seats = rcv.tabulate(2, *args[1:])
+    self.assertEqual(results[2].elected, expected_two_seats[0])
+    self.assertEqual(results[2].tally, expected_two_seats[2])
+    self.assertEqual(results[1].first_divergent_round, 2)
+    self.assertEqual(results[2].first_divergent_round, 1)
+
+  def test_scenarios_in_process_pool(self):
+    args = _test_aids.make_contest()
+    variants = scenarios.expand_grid({'tie_breaker':
+          [' A B C D', ' D C B A']})
+    serial = scenarios.tabulate_scenarios(*args, variants=variants,
+          nbr_processes=1)
+    pooled = scenarios.tabulate_scenarios(*args, variants=variants,
+          nbr_processes=2)
+    self.assertEqual([(result.elected, result.tally,
+          result.first_divergent_round) for result in serial],
+          [(result.elected, result.tally,
+          result.first_divergent_round) for result in pooled])
+
+  def test_ranking_depth_sweep(self):
+    spec = generate.generate_contest(3000, 8, ranking_depth=6,
+          nbr_seats_to_fill=2, model=generate.MODEL_SPATIAL, seed=3,
+          skip_rate=0.05, overvote_rate=0.02, truncation_rate=0.2)
+    args = list(generate.tabulate_args(spec))
+    args[3] = 6
+    depths = [3, 4, 5, None]
+    results = scenarios.tabulate_scenarios(*args,
+          variants=scenarios.expand_grid({'ranking_depth': depths}),
+          nbr_processes=2)
+    for depth, result in zip(depths, results[1:]):
+      truncated_args = list(args)
+      truncated_args[2] = [(multiple, rankings[:depth])
+            for multiple, rankings in args[2]]
+      truncated_args[3] = depth or args[3]
+      self.assertEqual((result.elected, result.tally),
+            rcv.tabulate(*truncated_args)[::2])
+    self.assertEqual(results[4].first_divergent_round, None)
+    self.assertNotEqual(results[1].first_divergent_round, None)
+
+  def test_scenario_error(self):
+    args = _test_aids.make_contest()
+    results = scenarios.tabulate_scenarios(*args,
+          variants=[{'alternative_defeats': 'X'}], nbr_processes=1)
+    self.assertEqual(results[1].elected, None)
+    self.assertEqual(results[1].error,
+          'RcvValueError: Invalid per-round option value:')
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'Invalid scenario variant key:',
+          scenarios.tabulate_scenarios, args + [[{'seats': 2}]])
+
+  def test_scenarios_to_json(self):
+    args = _test_aids.make_contest()
+    results = scenarios.tabulate_scenarios(*args,
+          variants=[{'tie_breaker': ' D C B A'}], nbr_processes=1)
+    comparison = json.loads(scenarios.scenarios_to_json(results, 'Test'))
+    self.assertEqual(comparison['description'], 'Test')
+    self.assertEqual([item['name'] for item in comparison['scenarios']],
+          ['baseline', 'tie_breaker= D C B A'])
+    self.assertEqual(comparison['scenarios'][1]['same_elected'], True)
+    self.assertEqual(comparison['scenarios'][1]['first_divergent_round'],
+          2)
@@ -0,0 +1,169 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import metrics
+from sb1288 import serve
+from sb1288 import with_json
+from sb1288.bench import generate
+
+import json
+import os.path
+import threading
+import time
+
+try:
+  from urllib.request import urlopen, Request
+  from urllib.error import HTTPError
+except ImportError:
+  # Python 2
+  from urllib2 import urlopen, Request, HTTPError
+
+class _UnpicklableSpec(dict):
+  """A tabulation spec that cannot be sent to a worker process"""
+
+  def __reduce_ex__(self, protocol):
+    raise TypeError('This tabulation spec cannot be pickled.')
+
+
+class TestServe(unittest.TestCase):
+  """Test serving tabulations over HTTP"""
+
+  @classmethod
+  def setUpClass(cls):
+    cls.service = serve.TabulationService(nbr_processes=2, queue_size=2)
+    cls.slow_spec = generate.generate_contest(5000, 40, ranking_depth=20,
+          nbr_seats_to_fill=9, model=generate.MODEL_SPATIAL)
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.service.close()
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def expected_json(self, tabulation_spec):
+    tabulate_args, tabulation_spec = with_json.build_tabulate_args(
+          tabulation_spec, None)
+    return with_json.results_to_json(*(sb1288.rcv.tabulate(*tabulate_args) +
+          (tabulation_spec['description'],)))
+
+  def test_http(self):
+    server = serve.make_server(self.service, port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    try:
+      tabulation_spec = with_json.read_json('unit/json-001.json')
+      response = urlopen(Request(url + '/tabulate',
+            json.dumps(tabulation_spec).encode('utf-8')))
+      body = response.read().decode('utf-8')
+      response.close()
+      self.assertEqual(body, self.expected_json(tabulation_spec))
+      tabulation_spec['ballots'] = [[1, ' A Nobody']]
+      with self.assertRaises(HTTPError) as context:
+        urlopen(Request(url + '/tabulate',
+              json.dumps(tabulation_spec).encode('utf-8')))
+      self.assertEqual(context.exception.code, 400)
+      context.exception.close()
+      response = urlopen(url + '/metrics')
+      exposition = response.read().decode('utf-8')
+      response.close()
+      self.assertTrue(
+            'sb1288_validation_failures_total{kind="ballots"} 1\n'
+            in exposition)
+    finally:
+      server.shutdown()
+      server.server_close()
+
+  def test_precincts(self):
+    tabulation_spec = with_json.read_json(os.path.join('unit',
+          'json-001.json'))
+    tabulation_spec['ballots'] = [ballot + ['P{}'.format(ix % 2)]
+          for ix, ballot in enumerate(tabulation_spec['ballots'])]
+    expected_json = os.path.join('temp_output',
+          'serve-precincts-expected.json')
+    with_json.tabulate(tabulation_spec, expected_json)
+    with open(expected_json, 'rb') as expected_file:
+      expected = expected_file.read()
+    os.remove(expected_json)
+    self.assertTrue(b'precinct_tally' in expected)
+    status, body = self.service.tabulate(tabulation_spec)
+    self.assertEqual(status, 200)
+    self.assertEqual(body.encode('utf-8'), expected)
+
+  def test_coalesce(self):
+    results = []
+    def tabulate(tabulation_spec):
+      results.append(self.service.tabulate(tabulation_spec))
+    threads = [threading.Thread(target=tabulate, args=(self.slow_spec,))
+          for ix in range(4)]
+    other_spec = dict(self.slow_spec, nbr_seats_to_fill=8)
+    threads.append(threading.Thread(target=tabulate, args=(other_spec,)))
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    expected = self.expected_json(self.slow_spec)
+    self.assertEqual(len([body for status, body in results
+          if body == expected]), 4)
+    self.assertEqual(sorted([status for status, body in results]),
+          [200] * 5)
+    counters = self.service.metrics.counters
+    self.assertEqual(counters[metrics.METRIC_CACHE_HITS][
+          serve.CACHE_COALESCE], 3)
+
+  def test_task_failure(self):
+    tabulation_spec = with_json.read_json('unit/json-001.json')
+    status, body = self.service.tabulate(
+          _UnpicklableSpec(tabulation_spec))
+    self.assertEqual(status, 500)
+    self.assertTrue(json.loads(body)['error'].startswith(
+          'The tabulation failed:'))
+    self.assertEqual(self.service.pending, {})
+    status, body = self.service.tabulate(tabulation_spec)
+    self.assertEqual((status, body), (200,
+          self.expected_json(tabulation_spec)))
+
+  def test_timeout(self):
+    result = serve._tabulate_task(self.slow_spec, time.time())
+    self.assertEqual(result['status'], 504)
+    service = serve.TabulationService(nbr_processes=1, queue_size=1,
+          timeout=0.2)
+    try:
+      status, body = service.tabulate(self.slow_spec)
+      self.assertEqual(status, 504)
+      start_time = time.time()
+      while service.pending and time.time() - start_time < 10:
+        time.sleep(0.01)
+      self.assertEqual(service.pending, {})
+      tabulation_spec = with_json.read_json('unit/json-001.json')
+      self.assertEqual(service.tabulate(tabulation_spec), (200,
+            self.expected_json(tabulation_spec)))
+    finally:
+      service.close()
+
+  def test_queue_full(self):
+    service = serve.TabulationService(nbr_processes=1, queue_size=1)
+    try:
+      thread = threading.Thread(target=service.tabulate,
+            args=(self.slow_spec,))
+      thread.start()
+      while not service.pending:
+        pass
+      status, body = service.tabulate(dict(self.slow_spec, description='x'))
+      thread.join()
+    finally:
+      service.close()
+    self.assertEqual(status, 503)
@@ -0,0 +1,86 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import rcv
+from sb1288 import spoilers
+from sb1288.bench import generate
+
+import json
+
+class TestSpoilers(unittest.TestCase):
+  """Test the leave-one-out spoiler analysis"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def test_candidate_index(self):
+    args = _test_aids.make_contest()
+    tabulation = rcv.Tabulation(*args)
+    index = spoilers.candidate_index(tabulation.ballots)
+    self.assertEqual(index, {'A': (0, 4), 'B': (0, 1, 2, 3, 4, 5, 6),
+          'C': (0, 1, 4, 5, 6), 'D': (1, 5, 6)})
+    withdrawn = spoilers.withdraw_ballots(tabulation.ballots, index, 'A')
+    self.assertIs(withdrawn[1], tabulation.ballots[1])
+    self.assertEqual(withdrawn[4].get_rankings(), ('C', 'B', ''))
+
+  def test_spoilers(self):
+    args = _test_aids.make_contest()
+    results = spoilers.analyze_spoilers(*args, nbr_processes=1)
+    self.assertEqual(results, [
+          spoilers.SpoilerResult(None, frozenset(['C']), None, None, None),
+          spoilers.SpoilerResult('A', frozenset(['B']), True, 1, None),
+          spoilers.SpoilerResult('B', frozenset(['C']), False, None, None),
+          spoilers.SpoilerResult('C', frozenset(['B']), True, 1, None),
+          spoilers.SpoilerResult('D', frozenset(['C']), False, None, None),
+          ])
+    comparison = json.loads(spoilers.spoilers_to_json(results, 'Test'))
+    self.assertEqual(comparison['description'], 'Test')
+    self.assertEqual([item['withdrawn'] for item in comparison['spoilers']],
+          [None, 'A', 'B', 'C', 'D'])
+    self.assertEqual(comparison['spoilers'][3]['winners_changed'], True)
+
+  def test_spoilers_match_separate_tabulations(self):
+    spec = generate.generate_contest(2000, 6, ranking_depth=4,
+          model=generate.MODEL_SPATIAL, nbr_seats_to_fill=2, seed=5,
+          overvote_rate=0.01)
+    args = generate.tabulate_args(spec)
+    withdrawn = spec['candidates'][:3]
+    serial = spoilers.analyze_spoilers(*args, withdrawn=withdrawn,
+          nbr_processes=1)
+    pooled = spoilers.analyze_spoilers(*args, withdrawn=withdrawn,
+          nbr_processes=2)
+    self.assertEqual(serial, pooled)
+    for result in serial[1:]:
+      candidates = [candidate for candidate in args[1]
+            if candidate != result.withdrawn]
+      ballots = [(multiple, [ranking_code
+            if ranking_code != result.withdrawn else ''
+            for ranking_code in rankings])
+            for multiple, rankings in args[2]]
+      tie_breaker = [candidate for candidate in args[4]
+            if candidate != result.withdrawn]
+      elected, status, tally = rcv.tabulate(args[0], candidates, ballots,
+            args[3], tie_breaker, args[5])
+      self.assertEqual(result.elected, frozenset(elected))
+
+  def test_errors(self):
+    args = _test_aids.make_contest()
+    args[5] = {'alternative_defeats': 'X'}
+    results = spoilers.analyze_spoilers(*args, withdrawn=['B'],
+          nbr_processes=1)
+    self.assertEqual(results[1], spoilers.SpoilerResult('B', None, None,
+          None, 'RcvValueError: Invalid per-round option value:'))
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'A withdrawn candidate is not a candidate:',
+          spoilers.analyze_spoilers, _test_aids.make_contest() + [['E']])
@@ -0,0 +1,120 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import rcv
+from sb1288 import ties
+from sb1288 import verify
+
+class TestTies(unittest.TestCase):
+  """Test tie sensitivity analysis"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def make_contest(self, nbr_seats_to_fill):
+    return [nbr_seats_to_fill, ' A B C D E', (
+          (5, ' A B'),
+          (5, ' B A'),
+          (5, ' C D'),
+          (5, ' D C'),
+          (9, ' E A'),
+          ), 3, ' A B C D E', {}]
+
+  def test_no_ties(self):
+    analysis = ties.analyze_ties(1, ' A B C', (
+          (15, ' A B C'),
+          (10, ' B C A'),
+          (8,  ' C B A'),
+          ), 3, ' A B C')
+    self.assertEqual(analysis.outcomes, {frozenset(['B']): ()})
+    self.assertEqual(analysis.nbr_branches, 1)
+    self.assertEqual(analysis.complete, True)
+
+  def test_irv_outcomes(self):
+    args = self.make_contest(1)
+    analysis = ties.analyze_ties(*args)
+    self.assertEqual(analysis.elected, rcv.tabulate(*args)[0])
+    self.assertEqual(set(analysis.outcomes), set([frozenset([candidate])
+          for candidate in 'ABCD']))
+    self.assertEqual(analysis.complete, True)
+    self.assertTrue(analysis.nbr_duplicates > 0)
+    for elected, resolutions in analysis.outcomes.items():
+      for resolution in resolutions:
+        self.assertIn(resolution.selected_candidate,
+              resolution.tied_candidates)
+
+  def test_stv_outcomes(self):
+    analysis = ties.analyze_ties(*self.make_contest(2))
+    self.assertEqual(set(analysis.outcomes), set([
+          frozenset(['B', 'D']), frozenset(['A', 'D']),
+          frozenset(['B', 'C']), frozenset(['A', 'C'])]))
+
+  def test_max_branches(self):
+    analysis = ties.analyze_ties(*self.make_contest(1), max_branches=2)
+    self.assertEqual(analysis.nbr_branches, 2)
+    self.assertEqual(analysis.complete, False)
+
+  def make_three_way_tie(self):
+    return [1, ' A B C D', (
+          (5, ' A B'),
+          (5, ' B C'),
+          (5, ' C A'),
+          (9, ' D'),
+          ), 3, ' A B C D', {}]
+
+  def test_three_way_tie(self):
+    args = self.make_three_way_tie()
+    analysis = ties.analyze_ties(*args)
+    self.assertEqual(set(analysis.outcomes), set([frozenset([candidate])
+          for candidate in 'ABC']))
+    self.assertEqual(analysis.nbr_branches, 3)
+    self.assertEqual(analysis.nbr_ties, 1)
+    first = ties._ForkingTabulation(*args)
+    first.tabulate()
+    self.assertEqual(first.journal[0].ties,
+          ((frozenset(['A', 'B', 'C']), 'A'),))
+    self.assertEqual(verify.verify(*args, journal=first.journal), None)
+    for round_state, resolutions in first.forks:
+      branch = first.branch(resolutions, set(first.state_keys))
+      branch.resume(round_state)
+      selected_candidate = resolutions[-1].selected_candidate
+      self.assertEqual(branch.journal[0].ties,
+            ((frozenset(['A', 'B', 'C']), selected_candidate),))
+      tie_breaker = [selected_candidate] + [candidate
+            for candidate in 'ABCD' if candidate != selected_candidate]
+      self.assertEqual(verify.verify(args[0], args[1], args[2], args[3],
+            tie_breaker, args[5], journal=branch.journal), None)
+
+  def test_tied_candidate_not_in_tie_breaker(self):
+    args = self.make_three_way_tie()
+    args[4] = ' A B D'
+    _test_aids.assertRaises_with_message(self, 'RcvValueError',
+          'Tied candidate not in tie_breaker:', ties.analyze_ties, args)
+
+  def test_duplicate_branches_record_no_round(self):
+    first = ties._ForkingTabulation(*self.make_contest(1))
+    first.tabulate()
+    pending = list(first.forks)
+    nbr_duplicates = 0
+    while pending:
+      round_state, resolutions = pending.pop(0)
+      branch = first.branch(resolutions, first.seen_states)
+      branch.resume(round_state)
+      rounds = [entry.nbr_round for entry in branch.journal]
+      self.assertEqual(rounds, list(range(round_state.nbr_round + 1,
+            branch.nbr_round + 1)))
+      if branch.is_duplicate:
+        nbr_duplicates += 1
+      pending.extend(branch.forks)
+    self.assertTrue(nbr_duplicates > 0)
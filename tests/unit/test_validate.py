@@ -245,8 +245,11 @@ class TestValidate(unittest.TestCase):
           'A ballot is not a list or tuple:',
           validate.ballots, ((' A B',), candidates, 3))
     _test_aids.assertRaises_with_message(self, errors.RcvValueError,
-          'A ballot is not a pair of values:',
-          validate.ballots, ([('A', 'B', 'C')], candidates, 3))
+          'A ballot is not a pair or triple of values:',
+          validate.ballots, ([(1, ' A B C', 'P1', 'P2')], candidates, 3))
+    _test_aids.assertRaises_with_message(self, errors.RcvValueError,
+          'A ballot precinct is not a str or int:',
+          validate.ballots, ([(1, ' A B C', 1.5)], candidates, 3))
     _test_aids.assertRaises_with_message(self, errors.RcvValueError,
           'A ballot multiple is not an int:',
           validate.ballots, ([(0.12,' A B C')], candidates, 3))
@@ -322,6 +325,12 @@ class TestValidate(unittest.TestCase):
     self.assertEqual(validate.options(
           {'alternative_defeats': ' y n N Y'}),
           {'alternative_defeats': ('Y', 'N', 'N', 'Y')})
+    self.assertEqual(validate.options(
+          {'ranking_depth': 3}),
+          {'ranking_depth': 3})
+    self.assertEqual(validate.options(
+          {'ranking_depth': None}),
+          {'ranking_depth': None})
 
   def test_options_invalid(self):
     _test_aids.assertRaises_with_message(self, errors.RcvValueError,
@@ -345,6 +354,14 @@ class TestValidate(unittest.TestCase):
     _test_aids.assertRaises_with_message(self, errors.RcvValueError,
           'Invalid per-round option value:',
           validate.options, ({'alternative_defeats': ' Z'},))
+    _test_aids.assertRaises_with_message(self, errors.RcvValueError,
+          'The option \'ranking_depth\' must be None or an int that is at'
+          ' least one:',
+          validate.options, ({'ranking_depth': 0},))
+    _test_aids.assertRaises_with_message(self, errors.RcvValueError,
+          'The option \'ranking_depth\' must be None or an int that is at'
+          ' least one:',
+          validate.options, ({'ranking_depth': '3'},))
     _test_aids.assertRaises_with_message(self, errors.RcvValueError,
           'Invalid option name:',
           validate.options, ({'no_skipped_rankings': True},))
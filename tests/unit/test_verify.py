@@ -0,0 +1,111 @@
+# -*- encoding=utf-8 -*-
+# Copyright 2016-2017 David Cary; licensed under the Apache License,
+#       Version 2.0
+
+from __future__ import print_function
+
+import unittest
+import _test_aids
+
+from _src import sb1288
+from sb1288 import constants as K
+from sb1288 import rcv
+from sb1288 import verify
+from sb1288.bench import generate
+
+import json
+
+class TestVerify(unittest.TestCase):
+  """Test the decision journal and verification from it"""
+
+  def setUp(self):
+    self.save_maxDiff = self.maxDiff
+    self.maxDiff = None
+
+  def tearDown(self):
+    self.maxDiff = self.save_maxDiff
+
+  def tabulate(self, nbr_seats_to_fill, options={}):
+    spec = generate.generate_contest(3000, 9, ranking_depth=5,
+          nbr_seats_to_fill=nbr_seats_to_fill, model=generate.MODEL_SPATIAL,
+          overvote_rate=0.01, options=options)
+    args = generate.tabulate_args(spec)
+    tabulation = rcv.Tabulation(*args)
+    results = tabulation.tabulate()
+    return args, tabulation, results
+
+  def test_journal(self):
+    tabulation = rcv.Tabulation(1, ' A B C D', (
+          (15, ' A B'),
+          (6, ' B C'),
+          (6,  ' C B'),
+          (10,  ' D A'),
+          ), 3, ' D C B A')
+    tabulation.tabulate()
+    self.assertEqual(tabulation.journal, [
+          rcv.JournalEntry(1, frozenset(), frozenset(['C']),
+                ((frozenset(['B', 'C']), 'C'),), None, ()),
+          rcv.JournalEntry(2, frozenset(), frozenset(['D']), (), None, ()),
+          rcv.JournalEntry(3, frozenset(['A']), frozenset(['B']), (), None,
+                ()),
+          ])
+    tabulation = rcv.Tabulation(2, ' A B C', (
+          (10, ' A B'),
+          (4, ' B'),
+          (3, ' C'),
+          ), 3, ' A B C')
+    tabulation.tabulate()
+    self.assertEqual(tabulation.journal[0].threshold, K.Decimal(566667, -5))
+    self.assertEqual(tabulation.journal[0].surplus_factors,
+          (('A', K.Decimal(43333, -5)),))
+
+  def test_verify(self):
+    for nbr_seats_to_fill, options in ((1, {}), (1,
+          {'alternative_defeats': 'Y'}), (3, {}), (3,
+          {'alternative_defeats': 'Y'})):
+      args, tabulation, results = self.tabulate(nbr_seats_to_fill, options)
+      journal = verify.journal_from_json(json.loads(json.dumps(
+            verify.journal_to_json(tabulation.journal))))
+      self.assertEqual(journal, tabulation.journal)
+      for nbr_processes in (1, 2):
+        self.assertEqual(verify.verify(*args, journal=journal,
+              tally=results[2], nbr_processes=nbr_processes), None)
+
+  def test_inconsistent(self):
+    for nbr_seats_to_fill in (1, 3):
+      args, tabulation, results = self.tabulate(nbr_seats_to_fill)
+      journal = tabulation.journal
+      self.assertTrue(len(journal) > 3)
+      entry = journal[1]
+      other = sorted(set(tabulation.candidates) - journal[0].elected -
+            journal[0].defeated - entry.elected - entry.defeated)[0]
+      wrong_journal = list(journal)
+      wrong_journal[1] = entry._replace(defeated=entry.defeated |
+            frozenset([other]))
+      self.assertEqual(verify.verify(*args, journal=wrong_journal,
+            nbr_processes=1), verify.Inconsistency(2, 'defeated',
+            wrong_journal[1].defeated, entry.defeated))
+      self.assertEqual(verify.verify(*args, journal=journal[:-1],
+            nbr_processes=1), verify.Inconsistency(len(journal),
+            'nbr_rounds', len(journal) - 1, None))
+      self.assertEqual(verify.verify(*args, journal=journal + [journal[-1]],
+            nbr_processes=1), verify.Inconsistency(len(journal) + 1,
+            'nbr_rounds', len(journal) + 1, len(journal)))
+      tally = dict(results[2])
+      candidate = [candidate for candidate in tabulation.candidates
+            if len(tally[candidate]) > 2][0]
+      tally[candidate] = list(tally[candidate])
+      tally[candidate][2] += 1 if nbr_seats_to_fill == 1 else K.ONE
+      self.assertEqual(verify.verify(*args, journal=journal, tally=tally,
+            nbr_processes=1)[:2], (3, 'tally'))
+
+  def test_inconsistent_surplus(self):
+    args, tabulation, results = self.tabulate(3)
+    journal = list(tabulation.journal)
+    ix = [ix for ix, entry in enumerate(journal)
+          if entry.surplus_factors][0]
+    candidate, factor = journal[ix].surplus_factors[0]
+    journal[ix] = journal[ix]._replace(surplus_factors=((candidate,
+          factor + K.Decimal(1, -5)),) + journal[ix].surplus_factors[1:])
+    self.assertEqual(verify.verify(*args, journal=journal,
+          nbr_processes=1)[:2], (ix + 1, 'surplus_factors'))